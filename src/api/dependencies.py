@@ -1,5 +1,6 @@
 """API依赖注入"""
 
+import asyncio
 import logging
 from typing import Annotated
 from fastapi import Depends
@@ -25,68 +26,104 @@ _embedding_service = None
 _vector_service = None
 _bm25_service = None
 
+# 每个服务一把锁，在导入时创建，避免并发首请求重复初始化
+_document_lock = asyncio.Lock()
+_search_lock = asyncio.Lock()
+_qa_lock = asyncio.Lock()
+_cache_lock = asyncio.Lock()
+_embedding_lock = asyncio.Lock()
+_vector_lock = asyncio.Lock()
+_bm25_lock = asyncio.Lock()
+
 
 async def get_document_service() -> DocumentService:
     """获取文档服务实例"""
     global _document_service
-    if _document_service is None:
-        _document_service = DocumentService()
-        # 初始化服务
-        await _document_service.embedding_service.initialize()
-        await _document_service.vector_service.initialize()
+    if _document_service is not None:
+        return _document_service
+    async with _document_lock:
+        if _document_service is None:
+            service = DocumentService()
+            # 初始化服务
+            await service.embedding_service.initialize()
+            await service.vector_service.initialize()
+            _document_service = service
     return _document_service
 
 
 async def get_search_service() -> HybridSearchService:
     """获取搜索服务实例"""
     global _search_service
-    if _search_service is None:
-        _search_service = HybridSearchService()
-        await _search_service.initialize()
+    if _search_service is not None:
+        return _search_service
+    async with _search_lock:
+        if _search_service is None:
+            service = HybridSearchService()
+            await service.initialize()
+            _search_service = service
     return _search_service
 
 
 async def get_qa_service() -> QAService:
     """获取问答服务实例"""
     global _qa_service
-    if _qa_service is None:
-        _qa_service = QAService()
-        await _qa_service.initialize()
+    if _qa_service is not None:
+        return _qa_service
+    async with _qa_lock:
+        if _qa_service is None:
+            service = QAService()
+            await service.initialize()
+            _qa_service = service
     return _qa_service
 
 
 async def get_cache_service() -> CacheService:
     """获取缓存服务实例"""
     global _cache_service
-    if _cache_service is None:
-        _cache_service = CacheService()
-        await _cache_service.initialize()
+    if _cache_service is not None:
+        return _cache_service
+    async with _cache_lock:
+        if _cache_service is None:
+            service = CacheService()
+            await service.initialize()
+            _cache_service = service
     return _cache_service
 
 
 async def get_embedding_service() -> EmbeddingService:
     """获取嵌入服务实例"""
     global _embedding_service
-    if _embedding_service is None:
-        _embedding_service = EmbeddingService()
-        await _embedding_service.initialize()
+    if _embedding_service is not None:
+        return _embedding_service
+    async with _embedding_lock:
+        if _embedding_service is None:
+            service = EmbeddingService()
+            await service.initialize()
+            _embedding_service = service
     return _embedding_service
 
 
 async def get_vector_service() -> VectorService:
     """获取向量服务实例"""
     global _vector_service
-    if _vector_service is None:
-        _vector_service = VectorService()
-        await _vector_service.initialize()
+    if _vector_service is not None:
+        return _vector_service
+    async with _vector_lock:
+        if _vector_service is None:
+            service = VectorService()
+            await service.initialize()
+            _vector_service = service
     return _vector_service
 
 
 async def get_bm25_service() -> BM25Service:
     """获取BM25服务实例"""
     global _bm25_service
-    if _bm25_service is None:
-        _bm25_service = BM25Service()
+    if _bm25_service is not None:
+        return _bm25_service
+    async with _bm25_lock:
+        if _bm25_service is None:
+            _bm25_service = BM25Service()
     return _bm25_service
 
 
@@ -100,14 +137,68 @@ VectorServiceDep = Annotated[VectorService, Depends(get_vector_service)]
 BM25ServiceDep = Annotated[BM25Service, Depends(get_bm25_service)]
 
 
+async def init_services():
+    """在应用启动时并行预热所有服务"""
+    getters = (
+        get_embedding_service,
+        get_vector_service,
+        get_bm25_service,
+        get_cache_service,
+        get_document_service,
+        get_search_service,
+        get_qa_service,
+    )
+    results = await asyncio.gather(
+        *(getter() for getter in getters), return_exceptions=True
+    )
+
+    # 单个服务初始化失败不阻止启动，首个请求时会再次尝试
+    for getter, result in zip(getters, results):
+        if isinstance(result, Exception):
+            logger.warning(f"服务预热失败 {getter.__name__}: {str(result)}")
+
+
 async def cleanup_services():
     """清理服务资源"""
     global _document_service, _search_service, _qa_service, _cache_service
     global _embedding_service, _vector_service, _bm25_service
     
-    # 这里可以添加服务清理逻辑
     logger.info("清理服务资源")
     
+    # 关闭缓存数据库连接池
+    if _cache_service is not None:
+        await _cache_service.close()
+    
+    # 关闭PDF文本提取进程池
+    if _document_service is not None:
+        _document_service.close()
+    
+    # 停止各嵌入服务实例的批处理任务（文档和搜索服务各自持有一个实例）
+    embedding_services = {
+        id(service): service
+        for service in (
+            _embedding_service,
+            _document_service and _document_service.embedding_service,
+            _search_service and _search_service.embedding_service,
+        )
+        if service is not None
+    }
+    for service in embedding_services.values():
+        await service.close()
+    
+    # 关闭各BM25服务实例的分词进程池
+    bm25_services = {
+        id(service): service
+        for service in (
+            _bm25_service,
+            _document_service and _document_service.bm25_service,
+            _search_service and _search_service.bm25_service,
+        )
+        if service is not None
+    }
+    for service in bm25_services.values():
+        service.close()
+    
     _document_service = None
     _search_service = None
     _qa_service = None
@@ -1,21 +1,23 @@
 """
 Main FastAPI application entry point.
 """
+import asyncio
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 import time
 from contextlib import asynccontextmanager
+from typing import Optional
 
 from src.config.settings import settings
-from src.utils.logger import setup_logging, get_logger
-from src.api.routes import router
-from src.api.dependencies import cleanup_services
-from src.api.middleware import (
-    request_validation_middleware,
-    rate_limiting_middleware,
-    security_headers_middleware
-)
+from src.utils.logger import setup_logging, shutdown_logging, get_logger
+from src.api.routes import router, drain_background_tasks
+from src.api.dependencies import init_services, cleanup_services
+from src.api.middleware import APIMiddleware, rate_limit_sweeper
+
+# Settings read on every request, cached as plain module constants
+APP_VERSION = settings.app_version
+DEBUG = settings.debug
 
 
 @asynccontextmanager
@@ -25,12 +27,20 @@ async def lifespan(app: FastAPI):
     setup_logging()
     logger = get_logger("startup")
     logger.info("Starting Kimi Knowledge Base API", version=settings.app_version)
-    
+
+    # Warm up all service singletons before accepting traffic
+    await init_services()
+    sweeper_task = asyncio.create_task(rate_limit_sweeper())
+
     yield
 
     # Shutdown
     logger.info("Shutting down Kimi Knowledge Base API")
+    sweeper_task.cancel()
+    # 先等待后台缓存写入完成，再关闭各服务
+    await drain_background_tasks()
     await cleanup_services()
+    shutdown_logging()
 
 
 # Create FastAPI application
@@ -39,6 +49,7 @@ app = FastAPI(
     version=settings.app_version,
     description="Local knowledge base system powered by Kimi2 API",
     debug=settings.debug,
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -54,40 +65,8 @@ app.add_middleware(
 # Include API routes
 app.include_router(router, prefix="/api/v1")
 
-# Add custom middleware
-app.middleware("http")(security_headers_middleware)
-app.middleware("http")(rate_limiting_middleware)
-app.middleware("http")(request_validation_middleware)
-
-
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    """Log all HTTP requests."""
-    logger = get_logger("http")
-    start_time = time.time()
-    
-    # Log request
-    logger.info(
-        "HTTP request",
-        method=request.method,
-        url=str(request.url),
-        client_ip=request.client.host if request.client else None
-    )
-    
-    # Process request
-    response = await call_next(request)
-    
-    # Log response
-    process_time = time.time() - start_time
-    logger.info(
-        "HTTP response",
-        method=request.method,
-        url=str(request.url),
-        status_code=response.status_code,
-        process_time=process_time
-    )
-    
-    return response
+# Add custom middleware (rate limiting, validation, security headers)
+app.add_middleware(APIMiddleware)
 
 
 @app.get("/")
@@ -95,7 +74,7 @@ async def root():
     """Root endpoint."""
     return {
         "message": "Welcome to Kimi Knowledge Base API",
-        "version": settings.app_version,
+        "version": APP_VERSION,
         "status": "running"
     }
 
@@ -106,27 +85,54 @@ async def health_check():
     return {
         "status": "healthy",
         "timestamp": time.time(),
-        "version": settings.app_version
+        "version": APP_VERSION
     }
 
 
+def _get_request_id(request: Request) -> Optional[str]:
+    """Return the correlation ID assigned by APIMiddleware, if any."""
+    return getattr(request.state, "request_id", None)
+
+
+@app.exception_handler(ValueError)
+async def value_error_handler(request: Request, exc: ValueError):
+    """Map validation errors raised by the service layer to 400 responses."""
+    request_id = _get_request_id(request)
+    logger = get_logger("error")
+    logger.warning(
+        "Invalid request",
+        error_message=str(exc),
+        path=request.url.path,
+        method=request.method,
+        request_id=request_id
+    )
+    
+    return ORJSONResponse(
+        status_code=400,
+        content={"detail": str(exc), "request_id": request_id}
+    )
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Global exception handler."""
+    request_id = _get_request_id(request)
     logger = get_logger("error")
     logger.error(
         "Unhandled exception",
         error_type=type(exc).__name__,
         error_message=str(exc),
-        url=str(request.url),
-        method=request.method
+        path=request.url.path,
+        method=request.method,
+        request_id=request_id
     )
     
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "error": "Internal server error",
-            "message": str(exc) if settings.debug else "An error occurred"
+            "message": str(exc) if DEBUG else "An error occurred",
+            "request_id": request_id
         }
     )
 
@@ -1,191 +1,213 @@
 """API中间件"""
 
+import asyncio
 import logging
 import time
-from typing import Callable
-from fastapi import Request, Response, HTTPException
-from fastapi.responses import JSONResponse
+from collections import defaultdict, deque
+from typing import Deque, Dict
+from uuid import uuid4
+from fastapi.responses import ORJSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.config.settings import get_settings
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
+# 请求路径上读取的配置在导入时缓存为常量
+ACCESS_LOG_ENABLED = settings.access_log_enabled
 
-async def request_validation_middleware(request: Request, call_next: Callable) -> Response:
-    """请求验证中间件"""
-    start_time = time.time()
-    
-    # 记录请求信息
-    logger.info(
-        f"Request: {request.method} {request.url.path}",
-        extra={
-            "method": request.method,
-            "path": request.url.path,
-            "client_ip": request.client.host if request.client else None,
-            "user_agent": request.headers.get("user-agent", "")
-        }
-    )
-    
-    try:
-        # 检查请求大小限制
-        content_length = request.headers.get("content-length")
-        if content_length:
-            content_length = int(content_length)
-            max_size = 100 * 1024 * 1024  # 100MB
-            if content_length > max_size:
-                raise HTTPException(
-                    status_code=413,
-                    detail=f"请求体过大，最大允许 {max_size // (1024*1024)}MB"
-                )
-        
-        # 处理请求
-        response = await call_next(request)
-        
-        # 记录响应信息
-        process_time = time.time() - start_time
-        logger.info(
-            f"Response: {response.status_code} - {process_time:.3f}s",
-            extra={
-                "status_code": response.status_code,
-                "process_time": process_time,
-                "path": request.url.path
-            }
-        )
-        
-        # 添加响应头
-        response.headers["X-Process-Time"] = str(process_time)
-        response.headers["X-API-Version"] = "1.0"
-        
-        return response
-        
-    except HTTPException as e:
-        # 处理HTTP异常
-        process_time = time.time() - start_time
-        logger.warning(
-            f"HTTP Exception: {e.status_code} - {e.detail}",
-            extra={
-                "status_code": e.status_code,
-                "detail": e.detail,
-                "process_time": process_time,
-                "path": request.url.path
-            }
-        )
-        
-        return JSONResponse(
-            status_code=e.status_code,
-            content={
-                "error": e.detail,
-                "status_code": e.status_code,
-                "path": request.url.path,
-                "timestamp": time.time()
-            },
-            headers={
-                "X-Process-Time": str(process_time),
-                "X-API-Version": "1.0"
-            }
-        )
-        
-    except Exception as e:
-        # 处理未预期的异常
-        process_time = time.time() - start_time
-        logger.error(
-            f"Unexpected error: {str(e)}",
-            extra={
-                "error": str(e),
-                "error_type": type(e).__name__,
-                "process_time": process_time,
-                "path": request.url.path
-            },
-            exc_info=True
-        )
-        
-        return JSONResponse(
-            status_code=500,
-            content={
-                "error": "内部服务器错误",
-                "status_code": 500,
-                "path": request.url.path,
-                "timestamp": time.time()
-            },
-            headers={
-                "X-Process-Time": str(process_time),
-                "X-API-Version": "1.0"
-            }
-        )
+# 每个响应都附带的静态头，导入时预先编码
+_STATIC_HEADERS = (
+    (b"x-api-version", b"1.0"),
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"referrer-policy", b"strict-origin-when-cross-origin"),
+    (b"content-security-policy", b"default-src 'self'"),
+)
+
+# 请求体大小限制
+MAX_REQUEST_SIZE = 100 * 1024 * 1024  # 100MB
+
+# 速率限制配置
+RATE_LIMIT_WINDOW = 60  # 1分钟窗口
+RATE_LIMIT_MAX_REQUESTS = 100  # 每分钟最多100个请求
 
+# 简单的内存存储（生产环境/多进程部署应该使用Redis的INCR+EXPIRE）
+_rate_limit_requests: Dict[str, Deque[float]] = defaultdict(deque)
 
-async def rate_limiting_middleware(request: Request, call_next: Callable) -> Response:
-    """简单的速率限制中间件"""
-    # 这里可以实现更复杂的速率限制逻辑
-    # 目前只是一个占位符
-    
-    client_ip = request.client.host if request.client else "unknown"
-    
-    # 简单的内存存储（生产环境应该使用Redis等）
-    if not hasattr(rate_limiting_middleware, "requests"):
-        rate_limiting_middleware.requests = {}
-    
+
+def _check_rate_limit(client_ip: str) -> bool:
+    """检查并记录请求，超出限制时返回False"""
     current_time = time.time()
-    window_size = 60  # 1分钟窗口
-    max_requests = 100  # 每分钟最多100个请求
-    
-    # 清理过期记录
-    rate_limiting_middleware.requests = {
-        ip: timestamps for ip, timestamps in rate_limiting_middleware.requests.items()
-        if any(t > current_time - window_size for t in timestamps)
-    }
-    
-    # 检查当前IP的请求次数
-    if client_ip not in rate_limiting_middleware.requests:
-        rate_limiting_middleware.requests[client_ip] = []
-    
-    # 过滤窗口内的请求
-    recent_requests = [
-        t for t in rate_limiting_middleware.requests[client_ip]
-        if t > current_time - window_size
-    ]
-    
-    if len(recent_requests) >= max_requests:
+    cutoff = current_time - RATE_LIMIT_WINDOW
+
+    # 只淘汰当前IP窗口外的记录
+    timestamps = _rate_limit_requests[client_ip]
+    while timestamps and timestamps[0] <= cutoff:
+        timestamps.popleft()
+
+    if len(timestamps) >= RATE_LIMIT_MAX_REQUESTS:
         logger.warning(
             f"Rate limit exceeded for IP: {client_ip}",
-            extra={"client_ip": client_ip, "request_count": len(recent_requests)}
-        )
-        
-        return JSONResponse(
-            status_code=429,
-            content={
-                "error": "请求过于频繁，请稍后再试",
-                "status_code": 429,
-                "retry_after": window_size
-            }
+            extra={"client_ip": client_ip, "request_count": len(timestamps)}
         )
-    
+        return False
+
     # 记录当前请求
-    rate_limiting_middleware.requests[client_ip] = recent_requests + [current_time]
-    
-    return await call_next(request)
-
-
-async def cors_middleware(request: Request, call_next: Callable) -> Response:
-    """CORS中间件"""
-    response = await call_next(request)
-    
-    # 添加CORS头
-    response.headers["Access-Control-Allow-Origin"] = "*"
-    response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, X-Requested-With"
-    response.headers["Access-Control-Max-Age"] = "86400"
-    
-    return response
-
-
-async def security_headers_middleware(request: Request, call_next: Callable) -> Response:
-    """安全头中间件"""
-    response = await call_next(request)
-    
-    # 添加安全头
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["X-Frame-Options"] = "DENY"
-    response.headers["X-XSS-Protection"] = "1; mode=block"
-    response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-    response.headers["Content-Security-Policy"] = "default-src 'self'"
-    
-    return response
+    timestamps.append(current_time)
+    return True
+
+
+def sweep_rate_limit_records() -> int:
+    """删除窗口内已无请求的IP记录"""
+    cutoff = time.time() - RATE_LIMIT_WINDOW
+    stale_ips = [
+        ip for ip, timestamps in _rate_limit_requests.items()
+        if not timestamps or timestamps[-1] <= cutoff
+    ]
+    for ip in stale_ips:
+        del _rate_limit_requests[ip]
+    return len(stale_ips)
+
+
+async def rate_limit_sweeper(interval: float = RATE_LIMIT_WINDOW) -> None:
+    """后台定期清理速率限制记录"""
+    while True:
+        await asyncio.sleep(interval)
+        removed = sweep_rate_limit_records()
+        if removed:
+            logger.debug(f"清理了 {removed} 个过期的速率限制记录")
+
+
+class APIMiddleware:
+    """统一的ASGI中间件：速率限制、请求验证、请求日志和安全头
+
+    直接实现ASGI接口，每个请求只包装一次send，避免多层
+    BaseHTTPMiddleware带来的协程和任务组开销。
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        method = scope["method"]
+        path = scope["path"]
+        client = scope.get("client")
+        client_ip = client[0] if client else None
+        request_headers = Headers(scope=scope)
+
+        # 关联ID：沿用客户端传入的X-Request-ID，否则生成新的
+        request_id = request_headers.get("x-request-id", "")[:64] or uuid4().hex
+        scope.setdefault("state", {})["request_id"] = request_id
+
+        # 所有响应（包括中间件直接返回的429/413）都带上处理时间、关联ID和安全头
+        wrapped_send = self._wrap_send(send, start_time, request_id)
+
+        # 速率限制
+        if not _check_rate_limit(client_ip or "unknown"):
+            response = ORJSONResponse(
+                status_code=429,
+                content={
+                    "error": "请求过于频繁，请稍后再试",
+                    "status_code": 429,
+                    "retry_after": RATE_LIMIT_WINDOW
+                }
+            )
+            await response(scope, receive, wrapped_send)
+            return
+
+        # 检查请求大小限制
+        content_length = request_headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > MAX_REQUEST_SIZE:
+            detail = f"请求体过大，最大允许 {MAX_REQUEST_SIZE // (1024*1024)}MB"
+            process_time = time.perf_counter() - start_time
+            logger.warning(
+                f"HTTP Exception: 413 - {detail}",
+                extra={
+                    "status_code": 413,
+                    "detail": detail,
+                    "process_time": process_time,
+                    "path": path,
+                    "request_id": request_id
+                }
+            )
+            response = ORJSONResponse(
+                status_code=413,
+                content={
+                    "error": detail,
+                    "status_code": 413,
+                    "path": path,
+                    "timestamp": time.time()
+                }
+            )
+            await response(scope, receive, wrapped_send)
+            return
+
+        status_code = 500
+        response_started = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, response_started
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                response_started = True
+            await wrapped_send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as exc:
+            # 外层的ServerErrorMiddleware发出的响应不经过这里的send，
+            # 在此发出500响应以带上关联ID、处理时间和安全头；
+            # 异常继续抛出，由全局异常处理器记录（响应已开始时它不会再发送）
+            if not response_started:
+                status_code = 500
+                response = ORJSONResponse(
+                    status_code=500,
+                    content={
+                        "error": "Internal server error",
+                        "message": str(exc) if settings.debug else "An error occurred",
+                        "request_id": request_id
+                    }
+                )
+                await response(scope, receive, wrapped_send)
+            raise
+        finally:
+            # 每个请求只记录一条访问日志（只记录路径，不记录可能含敏感信息的查询参数）
+            if ACCESS_LOG_ENABLED and logger.isEnabledFor(logging.INFO):
+                process_time = time.perf_counter() - start_time
+                logger.info(
+                    f"{method} {path} - {status_code} - {process_time:.3f}s",
+                    extra={
+                        "method": method,
+                        "path": path,
+                        "status_code": status_code,
+                        "process_time": process_time,
+                        "client_ip": client_ip,
+                        "user_agent": request_headers.get("user-agent", ""),
+                        "request_id": request_id
+                    }
+                )
+
+    @staticmethod
+    def _wrap_send(send: Send, start_time: float, request_id: str) -> Send:
+        """包装send，在响应开始时注入处理时间和安全头"""
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                process_time = time.perf_counter() - start_time
+                headers = MutableHeaders(scope=message)
+                # 直接追加原始字节头，跳过键名规范化和重复检查
+                headers.raw.append((b"x-process-time", f"{process_time:.6f}".encode()))
+                headers.raw.append((b"x-request-id", request_id.encode("latin-1")))
+                headers.raw.extend(_STATIC_HEADERS)
+            await send(message)
+
+        return send_with_headers
+
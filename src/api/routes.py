@@ -1,10 +1,15 @@
 """API路由定义"""
 
+import asyncio
 import logging
-from typing import List, Optional
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query as QueryParam
-from pydantic import BaseModel
+import time
+from typing import Any, Coroutine, List, Optional, Set, Union
 
+import orjson
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query as QueryParam, Response
+from pydantic import BaseModel, Field, TypeAdapter
+
+from src.models.base import NonEmptyStr
 from src.models.document import DocumentInfo
 from src.models.search import QAResponse
 from src.models.query import Query, QueryResult
@@ -22,16 +27,42 @@ logger = logging.getLogger(__name__)
 # 创建路由器
 router = APIRouter()
 
+# 持有后台任务的引用，防止任务在完成前被垃圾回收
+_background_tasks: Set[asyncio.Task] = set()
+
+# 服务层返回的对象已经过验证，直接由pydantic-core序列化，
+# 返回Response可跳过FastAPI按response_model的二次验证（response_model仅用于文档）
+_DOCUMENT_LIST_ADAPTER = TypeAdapter(List[DocumentInfo])
+
+
+def _json_response(content: Union[bytes, str]) -> Response:
+    """包装已序列化的JSON内容"""
+    return Response(content=content, media_type="application/json")
+
+
+def _spawn_background(coro: Coroutine[Any, Any, Any]) -> None:
+    """在后台运行协程，不等待其完成"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def drain_background_tasks() -> None:
+    """等待所有后台任务结束（关闭服务前调用，避免写入已关闭的服务）"""
+    while _background_tasks:
+        await asyncio.gather(*_background_tasks, return_exceptions=True)
+
 
 # 请求/响应模型
+# 用户输入只在这里校验一次，服务内部据此构建的模型跳过验证
 class SearchRequest(BaseModel):
-    query: str
-    limit: int = 10
+    query: NonEmptyStr
+    limit: int = Field(10, ge=1, le=100)
     document_ids: Optional[List[str]] = None
 
 
 class QARequest(BaseModel):
-    question: str
+    question: NonEmptyStr
     document_ids: Optional[List[str]] = None
     conversation_id: Optional[str] = None
 
@@ -44,288 +75,217 @@ class DocumentUploadResponse(BaseModel):
 # 文档管理API
 @router.post("/documents/upload", response_model=DocumentUploadResponse)
 async def upload_document(
+    document_service: DocumentServiceDep,
     file: UploadFile = File(...),
-    metadata: Optional[str] = None,
-    document_service: DocumentServiceDep = None
+    metadata: Optional[str] = None
 ):
     """上传文档"""
-    try:
-        # 解析元数据
-        import json
-        metadata_dict = {}
-        if metadata:
-            try:
-                metadata_dict = json.loads(metadata)
-            except json.JSONDecodeError:
-                logger.warning(f"无效的元数据格式: {metadata}")
-        
-        # 上传文档
-        doc_info = await document_service.upload_document(file, metadata_dict)
-        
-        return DocumentUploadResponse(
-            document_info=doc_info,
-            message="文档上传成功，正在后台处理中"
-        )
-        
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        logger.error(f"文档上传失败: {str(e)}")
-        raise HTTPException(status_code=500, detail="文档上传失败")
+    # 解析元数据
+    metadata_dict = {}
+    if metadata:
+        try:
+            metadata_dict = orjson.loads(metadata)
+        except orjson.JSONDecodeError:
+            logger.warning(f"无效的元数据格式: {metadata}")
+    
+    # 上传文档（ValueError由全局处理器转换为400）
+    doc_info = await document_service.upload_document(file, metadata_dict)
+    
+    return DocumentUploadResponse(
+        document_info=doc_info,
+        message="文档上传成功，正在后台处理中"
+    )
 
 
 @router.get("/documents", response_model=List[DocumentInfo])
 async def list_documents(
+    document_service: DocumentServiceDep,
     limit: int = QueryParam(50, ge=1, le=100),
-    offset: int = QueryParam(0, ge=0),
-    document_service: DocumentServiceDep = None
+    offset: int = QueryParam(0, ge=0)
 ):
     """列出文档"""
-    try:
-        documents = await document_service.list_documents(limit, offset)
-        return documents
-        
-    except Exception as e:
-        logger.error(f"获取文档列表失败: {str(e)}")
-        raise HTTPException(status_code=500, detail="获取文档列表失败")
+    documents = await document_service.list_documents(limit, offset)
+    return _json_response(_DOCUMENT_LIST_ADAPTER.dump_json(documents))
 
 
 @router.get("/documents/{doc_id}", response_model=DocumentInfo)
-async def get_document(doc_id: str, document_service: DocumentServiceDep = None):
+async def get_document(doc_id: str, document_service: DocumentServiceDep):
     """获取文档信息"""
-    try:
-        doc_info = await document_service.get_document_info(doc_id)
-        if not doc_info:
-            raise HTTPException(status_code=404, detail="文档不存在")
-        
-        return doc_info
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"获取文档信息失败: {str(e)}")
-        raise HTTPException(status_code=500, detail="获取文档信息失败")
+    doc_info = await document_service.get_document_info(doc_id)
+    if not doc_info:
+        raise HTTPException(status_code=404, detail="文档不存在")
+    
+    return doc_info
 
 
 @router.delete("/documents/{doc_id}")
 async def delete_document(
     doc_id: str,
-    document_service: DocumentServiceDep = None,
-    cache_service: CacheServiceDep = None
+    document_service: DocumentServiceDep,
+    cache_service: CacheServiceDep
 ):
     """删除文档"""
-    try:
-        success = await document_service.delete_document(doc_id)
-        if not success:
-            raise HTTPException(status_code=404, detail="文档不存在或删除失败")
-        
-        # 使相关缓存失效
-        await cache_service.invalidate_cache(doc_id)
-        
-        return {"message": "文档删除成功"}
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"删除文档失败: {str(e)}")
-        raise HTTPException(status_code=500, detail="删除文档失败")
+    success = await document_service.delete_document(doc_id)
+    if not success:
+        raise HTTPException(status_code=404, detail="文档不存在或删除失败")
+    
+    # 使相关缓存失效
+    await cache_service.invalidate_cache(doc_id)
+    
+    return {"message": "文档删除成功"}
 
 
 # 搜索API
 @router.post("/search", response_model=QueryResult)
-async def search_documents(request: SearchRequest, search_service: SearchServiceDep = None):
+async def search_documents(request: SearchRequest, search_service: SearchServiceDep):
     """搜索文档"""
-    try:
-        # 创建查询对象
-        query = Query(text=request.query)
-        
-        # 执行混合搜索
-        result = await search_service.search(
-            query=query,
-            document_ids=request.document_ids
-        )
-        
-        # 限制结果数量
-        if len(result.chunks) > request.limit:
-            result.chunks = result.chunks[:request.limit]
-            result.total_results = len(result.chunks)
-        
-        return result
-        
-    except Exception as e:
-        logger.error(f"搜索失败: {str(e)}")
-        raise HTTPException(status_code=500, detail="搜索失败")
+    # 创建查询对象
+    query = Query(text=request.query)
+    
+    # 执行混合搜索
+    result = await search_service.search(
+        query=query,
+        document_ids=request.document_ids,
+        limit=request.limit
+    )
+    return _json_response(result.model_dump_json())
 
 
 @router.post("/search/vector", response_model=QueryResult)
-async def vector_search(request: SearchRequest, search_service: SearchServiceDep = None):
+async def vector_search(request: SearchRequest, search_service: SearchServiceDep):
     """仅使用向量搜索"""
-    try:
-        query = Query(text=request.query)
-        result = await search_service.search_vector_only(
-            query=query,
-            limit=request.limit,
-            document_ids=request.document_ids
-        )
-        
-        return result
-        
-    except Exception as e:
-        logger.error(f"向量搜索失败: {str(e)}")
-        raise HTTPException(status_code=500, detail="向量搜索失败")
+    query = Query(text=request.query)
+    result = await search_service.search_vector_only(
+        query=query,
+        limit=request.limit,
+        document_ids=request.document_ids
+    )
+    return _json_response(result.model_dump_json())
 
 
 @router.post("/search/bm25", response_model=QueryResult)
-async def bm25_search(request: SearchRequest, search_service: SearchServiceDep = None):
+async def bm25_search(request: SearchRequest, search_service: SearchServiceDep):
     """仅使用BM25搜索"""
-    try:
-        query = Query(text=request.query)
-        result = await search_service.search_bm25_only(
-            query=query,
-            limit=request.limit,
-            document_ids=request.document_ids
-        )
-        
-        return result
-        
-    except Exception as e:
-        logger.error(f"BM25搜索失败: {str(e)}")
-        raise HTTPException(status_code=500, detail="BM25搜索失败")
+    query = Query(text=request.query)
+    result = await search_service.search_bm25_only(
+        query=query,
+        limit=request.limit,
+        document_ids=request.document_ids
+    )
+    return _json_response(result.model_dump_json())
 
 
 # 问答API
 @router.post("/qa", response_model=QAResponse)
 async def ask_question(
     request: QARequest,
-    search_service: SearchServiceDep = None,
-    qa_service: QAServiceDep = None,
-    cache_service: CacheServiceDep = None
+    search_service: SearchServiceDep,
+    qa_service: QAServiceDep,
+    cache_service: CacheServiceDep
 ):
     """问答接口"""
-    try:
-        # 检查缓存
-        cached_result = await cache_service.get_cached_result(
-            request.question, 
-            request.document_ids
-        )
-        
-        if cached_result:
-            return cached_result
-        
-        # 搜索相关文档
-        search_query = Query(text=request.question)
-        search_result = await search_service.search(
-            query=search_query,
-            document_ids=request.document_ids
-        )
-        
-        # 提取文本块 - 暂时使用空列表，后续需要完善
-        context_chunks = []
-        # TODO: 将搜索结果转换为TextChunk对象
-        
-        # 生成答案
-        qa_response = await qa_service.generate_answer(
-            question=request.question,
-            context_chunks=context_chunks,
-            conversation_id=request.conversation_id
+    # 检查缓存，命中时直接返回
+    lookup_start = time.perf_counter()
+    cached_result = await cache_service.get_cached_result(
+        request.question, 
+        request.document_ids
+    )
+    
+    if cached_result is not None:
+        performance_monitor.record_operation(
+            "qa_cache_hit", time.perf_counter() - lookup_start
         )
-        
-        # 缓存结果
-        await cache_service.cache_result(
-            request.question,
-            qa_response,
-            request.document_ids
-        )
-        
-        return qa_response
-        
-    except Exception as e:
-        logger.error(f"问答处理失败: {str(e)}")
-        raise HTTPException(status_code=500, detail="问答处理失败")
+        return _json_response(cached_result.model_dump_json())
+    
+    # 搜索相关文档
+    search_query = Query(text=request.question)
+    search_result = await search_service.search(
+        query=search_query,
+        document_ids=request.document_ids
+    )
+    
+    # 提取文本块 - 暂时使用空列表，后续需要完善
+    context_chunks = []
+    # TODO: 将搜索结果转换为TextChunk对象
+    
+    # 生成答案
+    qa_response = await qa_service.generate_answer(
+        question=request.question,
+        context_chunks=context_chunks,
+        conversation_id=request.conversation_id
+    )
+    
+    # 后台缓存结果，不阻塞响应
+    _spawn_background(cache_service.cache_result(
+        request.question,
+        qa_response,
+        request.document_ids
+    ))
+    
+    return _json_response(qa_response.model_dump_json())
 
 
 # 系统状态API
 @router.get("/system/status")
 async def get_system_status(
-    search_service: SearchServiceDep = None,
-    cache_service: CacheServiceDep = None
+    search_service: SearchServiceDep,
+    cache_service: CacheServiceDep
 ):
     """获取系统状态"""
-    try:
-        # 获取各服务状态
-        search_stats = await search_service.get_search_stats()
-        cache_stats = await cache_service.get_cache_stats()
-        
-        # 获取性能指标
-        performance_stats = performance_monitor.get_metrics()
-
-        return {
+    # 获取各服务状态
+    search_stats = await search_service.get_search_stats()
+    cache_stats = await cache_service.get_cache_stats()
+    
+    # 获取性能指标
+    performance_stats = performance_monitor.get_metrics()
+
+    # 缓存统计由pydantic-core直接序列化为JSON片段嵌入，避免先转换为dict
+    content = orjson.dumps(
+        {
             "status": "healthy",
             "services": {
                 "search": search_stats,
-                "cache": cache_stats.model_dump()
+                "cache": orjson.Fragment(cache_stats.model_dump_json())
             },
             "performance": performance_stats
-        }
-        
-    except Exception as e:
-        logger.error(f"获取系统状态失败: {str(e)}")
-        raise HTTPException(status_code=500, detail="获取系统状态失败")
+        },
+        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    )
+    return _json_response(content)
 
 
 @router.get("/system/cache/stats", response_model=CacheStats)
-async def get_cache_stats(cache_service: CacheServiceDep = None):
+async def get_cache_stats(cache_service: CacheServiceDep):
     """获取缓存统计"""
-    try:
-        return await cache_service.get_cache_stats()
-        
-    except Exception as e:
-        logger.error(f"获取缓存统计失败: {str(e)}")
-        raise HTTPException(status_code=500, detail="获取缓存统计失败")
+    return await cache_service.get_cache_stats()
 
 
 @router.post("/system/cache/cleanup")
-async def cleanup_cache(cache_service: CacheServiceDep = None):
+async def cleanup_cache(cache_service: CacheServiceDep):
     """清理过期缓存"""
-    try:
-        cleaned_count = await cache_service.cleanup_expired_cache()
-        return {
-            "message": f"清理了 {cleaned_count} 个过期缓存条目"
-        }
-        
-    except Exception as e:
-        logger.error(f"清理缓存失败: {str(e)}")
-        raise HTTPException(status_code=500, detail="清理缓存失败")
+    cleaned_count = await cache_service.cleanup_expired_cache()
+    return {
+        "message": f"清理了 {cleaned_count} 个过期缓存条目"
+    }
 
 
 @router.get("/system/performance")
 async def get_performance_metrics():
     """获取性能指标"""
-    try:
-        return performance_monitor.get_metrics()
-
-    except Exception as e:
-        logger.error(f"获取性能指标失败: {str(e)}")
-        raise HTTPException(status_code=500, detail="获取性能指标失败")
+    return performance_monitor.get_metrics()
 
 
 @router.post("/system/performance/reset")
 async def reset_performance_metrics():
     """重置性能指标"""
-    try:
-        performance_monitor.reset_metrics()
-        return {"message": "性能指标已重置"}
-
-    except Exception as e:
-        logger.error(f"重置性能指标失败: {str(e)}")
-        raise HTTPException(status_code=500, detail="重置性能指标失败")
+    performance_monitor.reset_metrics()
+    return {"message": "性能指标已重置"}
 
 
 # 健康检查API
 @router.get("/health")
 async def health_check():
     """健康检查"""
-    import time
     return {
         "status": "healthy",
         "timestamp": time.time()
@@ -1,7 +1,8 @@
 """
 Configuration settings for the Kimi Knowledge Base system.
 """
-from typing import Optional
+from functools import lru_cache
+from typing import Literal, Optional
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 import os
@@ -21,6 +22,7 @@ class Settings(BaseSettings):
     app_version: str = "0.1.0"
     debug: bool = False
     log_level: str = "INFO"
+    access_log_enabled: bool = True
     
     # Server Configuration
     host: str = "0.0.0.0"
@@ -30,6 +32,8 @@ class Settings(BaseSettings):
     qdrant_host: str = "localhost"
     qdrant_port: int = 6333
     qdrant_collection_name: str = "knowledge_base"
+    # Store int8 scalar-quantized vectors in RAM; disable for full FP32 search
+    vector_quantization_enabled: bool = True
     
     # Cache Configuration
     cache_db_path: str = "./data/cache.db"
@@ -51,6 +55,8 @@ class Settings(BaseSettings):
     # Embedding Model
     embedding_model: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
     embedding_dimension: int = 384
+    # Inference precision: fp16 needs a CUDA device, int8 uses dynamic quantization on CPU
+    embedding_precision: Literal["fp32", "fp16", "int8"] = "fp32"
     
     # Text Processing
     chunk_size: int = 500
@@ -62,9 +68,11 @@ class Settings(BaseSettings):
     request_timeout: int = 30
 
 
-# Global settings instance
-settings = Settings()
-
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
     """获取全局配置实例"""
-    return settings
\ No newline at end of file
+    return Settings()
+
+
+# Global settings instance
+settings = get_settings()
\ No newline at end of file
@@ -3,12 +3,33 @@
 Base data model definitions
 """
 
+import os
+import sys
 from datetime import datetime, timezone
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import Annotated, Any, Dict, List, Optional
 from uuid import UUID, uuid4
 
-from pydantic import BaseModel, Field, field_validator, ConfigDict
+from pydantic import AfterValidator, BaseModel, Field, field_validator, ConfigDict, StringConstraints
+
+
+# 去除首尾空白后不能为空的字符串，约束在pydantic-core中执行，各模型共享
+NonEmptyStr = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]
+
+
+def _dedup_strip(v: List[str]) -> List[str]:
+    """去除空白项和重复项，保持原有顺序"""
+    if not v:
+        # 大多数实例使用空的默认值，无需重建列表
+        return v
+    return list(dict.fromkeys(item for item in map(str.strip, v) if item))
+
+
+# 去空白、去重后的字符串列表（关键词、别名等）
+DedupStrList = Annotated[List[str], AfterValidator(_dedup_strip)]
+
+# 大量实例中重复出现的字符串（文档ID、文本块ID等），驻留后共享同一对象
+InternedStr = Annotated[str, AfterValidator(sys.intern)]
 
 
 class ProcessingStatus(str, Enum):
@@ -37,16 +58,61 @@ class BaseDataModel(BaseModel):
     model_config = ConfigDict(
         use_enum_values=True,
         validate_assignment=True,
-        str_strip_whitespace=True
+        str_strip_whitespace=True,
+        # 推迟构建验证器/序列化器到首次使用，降低导入耗时和常驻内存
+        defer_build=True
     )
     
     id: str = Field(default_factory=lambda: str(uuid4()), description="唯一标识符")
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), description="创建时间")
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), description="更新时间")
         
-    def update_timestamp(self) -> None:
-        """更新时间戳"""
-        self.updated_at = datetime.now(timezone.utc)
+    @classmethod
+    def bulk_create(
+        cls,
+        rows: List[Dict[str, Any]],
+        ts: Optional[datetime] = None
+    ) -> List["BaseDataModel"]:
+        """批量创建实例
+
+        整批共享一次时间戳，并一次性读取随机字节生成所有ID，
+        避免逐个实例调用uuid4()和datetime.now()。
+        """
+        if not rows:
+            return []
+        
+        ts = ts or datetime.now(timezone.utc)
+        raw = os.urandom(16 * len(rows))
+        
+        instances = []
+        for i, row in enumerate(rows):
+            data = {"created_at": ts, "updated_at": ts, **row}
+            if "id" not in data:
+                data["id"] = str(UUID(bytes=raw[i * 16:(i + 1) * 16], version=4))
+            instances.append(cls(**data))
+        return instances
+    
+    @classmethod
+    def construct_trusted(cls, **fields: Any) -> "BaseDataModel":
+        """跳过验证创建实例
+
+        只能用于从可信存储重建已验证过的数据，不能用于用户输入；
+        嵌套模型字段需传入模型实例。after模式的模型校验器负责维护
+        私有索引，这里会在构建后依次调用，保证派生状态一致。
+        """
+        instance = cls.model_construct(**fields)
+        for decorator in cls.__pydantic_decorators__.model_validators.values():
+            if decorator.info.mode == 'after':
+                decorator.func(instance)
+        return instance
+        
+    def update_timestamp(self, ts: Optional[datetime] = None) -> None:
+        """更新时间戳
+
+        调用方已取得当前时间时可通过ts传入，避免重复调用datetime.now()。
+        """
+        # 时间戳由内部生成，绕过赋值验证
+        object.__setattr__(self, 'updated_at', ts or datetime.now(timezone.utc))
         
     @field_validator('id')
     @classmethod
@@ -54,4 +120,31 @@ class BaseDataModel(BaseModel):
         """验证ID格式"""
         if not v or len(v.strip()) == 0:
             raise ValueError("ID不能为空")
-        return v.strip()
\ No newline at end of file
+        return v.strip()
+
+
+class BasePerfModel(BaseDataModel):
+    """高频创建/修改的数据模型基类
+
+    关闭赋值验证和字符串自动去空白，适用于文本块、实体等在批量
+    处理中大量创建和修改的模型；需要清洗的字段由各自的验证器处理。
+    """
+    
+    model_config = ConfigDict(
+        validate_assignment=False,
+        str_strip_whitespace=False
+    )
+
+
+class BaseFrozenModel(BaseDataModel):
+    """创建后不再修改的数据模型基类
+
+    适用于实体提及、消息等批量创建的值对象；冻结后无需赋值验证，
+    并拒绝额外字段。需要修改时使用model_copy(update=...)生成新实例。
+    """
+    
+    model_config = ConfigDict(
+        frozen=True,
+        extra='forbid',
+        validate_assignment=False
+    )
@@ -3,52 +3,88 @@
 Cache-related data models
 """
 
-from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Optional
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, FrozenSet, Iterable, Optional
 
-from pydantic import Field, field_validator
+import orjson
+from pydantic import Field, PrivateAttr, field_validator, model_validator
 
-from .base import BaseDataModel
+from .base import BaseDataModel, BaseFrozenModel, NonEmptyStr
 from .search import QAResponse
 
 
+# 验证器和操作分类使用的合法取值
+_VALID_EVICTION_POLICIES = frozenset({'lru', 'lfu', 'fifo', 'random'})
+# 操作类型 -> 操作类别
+_OPERATION_CATEGORIES: Dict[str, str] = {
+    'get': 'read', 'stats': 'read',
+    'set': 'write', 'delete': 'write', 'clear': 'write', 'expire': 'write',
+    'cleanup': 'maintenance', 'evict': 'maintenance'
+}
+_VALID_OPERATIONS = frozenset(_OPERATION_CATEGORIES)
+
+
 class CacheEntry(BaseDataModel):
     """缓存条目数据模型"""
     
-    key: str = Field(..., description="缓存键")
-    value: Dict[str, Any] = Field(..., description="缓存值")
+    key: NonEmptyStr = Field(..., description="缓存键")
+    value_packed: bytes = Field(..., description="缓存值（orjson序列化后的字节）")
     ttl: int = Field(..., gt=0, description="生存时间（秒）")
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), description="创建时间")
     last_accessed: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), description="最后访问时间")
     access_count: int = Field(default=0, ge=0, description="访问次数")
     size_bytes: int = Field(default=0, ge=0, description="大小（字节）")
     
-    @field_validator('key')
+    # 过期时间（Unix时间戳），created_at或ttl变化时由校验器重新计算
+    _expiry_ts: float = PrivateAttr(default=0.0)
+    # 首次读取value时解码的缓存，以及对应的字节对象
+    _value: Optional[Dict[str, Any]] = PrivateAttr(default=None)
+    _value_src: Optional[bytes] = PrivateAttr(default=None)
+    
+    @model_validator(mode='before')
     @classmethod
-    def validate_key(cls, v: str) -> str:
-        """验证缓存键"""
-        if not v or len(v.strip()) == 0:
-            raise ValueError("缓存键不能为空")
-        return v.strip()
+    def _pack_value(cls, data: Any) -> Any:
+        """接受value字典并序列化为字节存储"""
+        if isinstance(data, dict) and 'value' in data:
+            data = dict(data)
+            value = data.pop('value')
+            if not isinstance(value, dict):
+                raise ValueError("缓存值必须是字典")
+            data['value_packed'] = orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+        if isinstance(data, dict) and not data.get('size_bytes') and 'value_packed' in data:
+            data['size_bytes'] = len(data['value_packed'])
+        return data
+    
+    @model_validator(mode='after')
+    def _compute_expiry(self) -> 'CacheEntry':
+        """预先计算过期时间戳"""
+        self._expiry_ts = self.created_at.timestamp() + self.ttl
+        return self
+    
+    @property
+    def value(self) -> Dict[str, Any]:
+        """缓存值（按需解码，返回结果应视为只读）"""
+        if self._value_src is not self.value_packed:
+            self._value = orjson.loads(self.value_packed)
+            self._value_src = self.value_packed
+        return self._value
     
     def is_expired(self) -> bool:
         """检查是否过期"""
-        expiry_time = self.created_at + timedelta(seconds=self.ttl)
-        return datetime.now(timezone.utc) > expiry_time
+        return time.time() > self._expiry_ts
     
     def get_remaining_ttl(self) -> int:
         """获取剩余生存时间（秒）"""
-        if self.is_expired():
-            return 0
-        expiry_time = self.created_at + timedelta(seconds=self.ttl)
-        remaining = expiry_time - datetime.now(timezone.utc)
-        return max(0, int(remaining.total_seconds()))
+        return max(0, int(self._expiry_ts - time.time()))
     
     def update_access(self) -> None:
         """更新访问信息"""
-        self.last_accessed = datetime.now(timezone.utc)
+        now = datetime.now(timezone.utc)
+        self.last_accessed = now
         self.access_count += 1
-        self.update_timestamp()
+        self.update_timestamp(now)
     
     def extend_ttl(self, additional_seconds: int) -> None:
         """延长生存时间"""
@@ -61,39 +97,47 @@ class QueryCache(BaseDataModel):
     """查询缓存数据模型"""
     
     query_hash: str = Field(..., description="查询哈希值")
-    query_text: str = Field(..., description="查询文本")
+    query_text: NonEmptyStr = Field(..., description="查询文本")
     response: QAResponse = Field(..., description="问答响应")
     document_ids: list[str] = Field(default_factory=list, description="相关文档ID列表")
     ttl: int = Field(default=3600, gt=0, description="生存时间（秒）")
     hit_count: int = Field(default=0, ge=0, description="命中次数")
     
+    # 文档ID集合，构建时计算一次，供有效性比较使用
+    _document_ids_fs: FrozenSet[str] = PrivateAttr(default_factory=frozenset)
+    
+    @model_validator(mode='after')
+    def _cache_document_ids(self) -> 'QueryCache':
+        """缓存文档ID集合"""
+        self._document_ids_fs = frozenset(self.document_ids)
+        return self
+    
     @field_validator('query_hash')
     @classmethod
     def validate_query_hash(cls, v: str) -> str:
         """验证查询哈希值"""
-        if not v or len(v.strip()) == 0:
+        v = v.strip()
+        if not v:
             raise ValueError("查询哈希值不能为空")
-        # 简单验证哈希值格式
-        if len(v) != 64:  # SHA-256
+        # SHA-256十六进制摘要：64个字符且解码为32字节（fromhex会跳过空白）
+        try:
+            valid = len(v) == 64 and len(bytes.fromhex(v)) == 32
+        except ValueError:
+            valid = False
+        if not valid:
             raise ValueError("无效的哈希值格式")
-        return v.strip()
-    
-    @field_validator('query_text')
-    @classmethod
-    def validate_query_text(cls, v: str) -> str:
-        """验证查询文本"""
-        if not v or len(v.strip()) == 0:
-            raise ValueError("查询文本不能为空")
-        return v.strip()
+        return v.lower()
     
     def increment_hit_count(self) -> None:
         """增加命中次数"""
         self.hit_count += 1
         self.update_timestamp()
     
-    def is_valid_for_documents(self, current_document_ids: list[str]) -> bool:
+    def is_valid_for_documents(self, current_document_ids: Iterable[str]) -> bool:
         """检查对于当前文档集合是否有效"""
-        return set(self.document_ids) == set(current_document_ids)
+        if not isinstance(current_document_ids, frozenset):
+            current_document_ids = frozenset(current_document_ids)
+        return self._document_ids_fs == current_document_ids
 
 
 class CacheStats(BaseDataModel):
@@ -119,14 +163,17 @@ class CacheStats(BaseDataModel):
         return 1.0 - self.get_hit_rate()
     
     def record_hit(self) -> None:
-        """记录命中"""
+        """记录命中（高频调用，不更新时间戳，见snapshot）"""
         self.hit_count += 1
-        self.update_timestamp()
     
     def record_miss(self) -> None:
-        """记录未命中"""
+        """记录未命中（高频调用，不更新时间戳，见snapshot）"""
         self.miss_count += 1
+    
+    def snapshot(self) -> 'CacheStats':
+        """供读取方获取统计快照，此时才刷新更新时间"""
         self.update_timestamp()
+        return self
     
     def record_eviction(self) -> None:
         """记录驱逐"""
@@ -163,10 +210,9 @@ class CacheConfig(BaseDataModel):
     @classmethod
     def validate_eviction_policy(cls, v: str) -> str:
         """验证驱逐策略"""
-        valid_policies = {'lru', 'lfu', 'fifo', 'random'}
-        if v.lower() not in valid_policies:
+        if v.lower() not in _VALID_EVICTION_POLICIES:
             raise ValueError(f"无效的驱逐策略: {v}")
-        return v.lower()
+        return sys.intern(v.lower())
     
     def get_max_size_mb(self) -> float:
         """获取最大大小（MB）"""
@@ -178,11 +224,11 @@ class CacheConfig(BaseDataModel):
         self.update_timestamp()
 
 
-class CacheOperation(BaseDataModel):
+class CacheOperation(BaseFrozenModel):
     """缓存操作记录数据模型"""
     
     operation_type: str = Field(..., description="操作类型")
-    key: str = Field(..., description="缓存键")
+    key: NonEmptyStr = Field(..., description="缓存键")
     success: bool = Field(..., description="是否成功")
     execution_time: float = Field(..., ge=0.0, description="执行时间（毫秒）")
     error_message: Optional[str] = Field(None, description="错误信息")
@@ -192,22 +238,23 @@ class CacheOperation(BaseDataModel):
     @classmethod
     def validate_operation_type(cls, v: str) -> str:
         """验证操作类型"""
-        valid_operations = {
-            'get', 'set', 'delete', 'clear', 'expire', 
-            'cleanup', 'evict', 'stats'
-        }
-        if v.lower() not in valid_operations:
+        if v.lower() not in _VALID_OPERATIONS:
             raise ValueError(f"无效的操作类型: {v}")
-        return v.lower()
+        return sys.intern(v.lower())
+    
+    @property
+    def category(self) -> str:
+        """操作类别：read、write或maintenance"""
+        return _OPERATION_CATEGORIES[self.operation_type]
     
     def is_read_operation(self) -> bool:
         """是否为读操作"""
-        return self.operation_type in {'get', 'stats'}
+        return self.category == 'read'
     
     def is_write_operation(self) -> bool:
         """是否为写操作"""
-        return self.operation_type in {'set', 'delete', 'clear', 'expire'}
+        return self.category == 'write'
     
     def is_maintenance_operation(self) -> bool:
         """是否为维护操作"""
-        return self.operation_type in {'cleanup', 'evict'}
\ No newline at end of file
+        return self.category == 'maintenance'
\ No newline at end of file
@@ -3,21 +3,31 @@
 Conversation-related data models
 """
 
+import sys
+from collections import deque
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from itertools import islice
+from typing import Any, Deque, Dict, List, Optional, Set
 
-from pydantic import Field, field_validator
+from pydantic import Field, PrivateAttr, field_validator, model_validator
 
-from .base import BaseDataModel
+from .base import BaseDataModel, BaseFrozenModel, DedupStrList, NonEmptyStr
 from .search import QAResponse
 
 
-class Message(BaseDataModel):
+# 合法的消息角色
+_VALID_ROLES = frozenset({'user', 'assistant', 'system'})
+
+# 最近消息窗口大小
+RECENT_WINDOW_SIZE = 64
+
+
+class Message(BaseFrozenModel):
     """消息数据模型"""
     
     conversation_id: str = Field(..., description="对话ID")
     role: str = Field(..., description="角色（user/assistant）")
-    content: str = Field(..., description="消息内容")
+    content: NonEmptyStr = Field(..., description="消息内容")
     timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), description="时间戳")
     metadata: Dict[str, Any] = Field(default_factory=dict, description="元数据")
     
@@ -25,18 +35,9 @@ class Message(BaseDataModel):
     @classmethod
     def validate_role(cls, v: str) -> str:
         """验证角色"""
-        valid_roles = {'user', 'assistant', 'system'}
-        if v not in valid_roles:
+        if v not in _VALID_ROLES:
             raise ValueError(f"无效的角色: {v}")
-        return v
-    
-    @field_validator('content')
-    @classmethod
-    def validate_content(cls, v: str) -> str:
-        """验证内容"""
-        if not v or len(v.strip()) == 0:
-            raise ValueError("消息内容不能为空")
-        return v.strip()
+        return sys.intern(v)
     
     def is_user_message(self) -> bool:
         """是否为用户消息"""
@@ -63,13 +64,54 @@ class Conversation(BaseDataModel):
     )
     is_active: bool = Field(default=True, description="是否活跃")
     
+    # 按角色划分的消息下标（消息需通过add_message添加）
+    _user_idx: List[int] = PrivateAttr(default_factory=list)
+    # 由第一条用户消息生成的标题，消息列表重建时失效
+    _cached_title: Optional[str] = PrivateAttr(default=None)
+    _assistant_idx: List[int] = PrivateAttr(default_factory=list)
+    # 最近消息窗口
+    _recent: Deque[Message] = PrivateAttr(
+        default_factory=lambda: deque(maxlen=RECENT_WINDOW_SIZE)
+    )
+    # 上下文文档ID -> 在context_documents中的下标，用于O(1)去重和删除
+    _ctx_doc_idx: Dict[str, int] = PrivateAttr(default_factory=dict)
+    
+    @model_validator(mode='after')
+    def _build_role_index(self) -> 'Conversation':
+        """根据messages重建角色下标和最近消息窗口"""
+        self._user_idx = []
+        self._cached_title = None
+        self._assistant_idx = []
+        for idx, message in enumerate(self.messages):
+            self._index_message(idx, message)
+        self._recent = deque(self.messages[-RECENT_WINDOW_SIZE:], maxlen=RECENT_WINDOW_SIZE)
+        return self
+    
+    @model_validator(mode='after')
+    def _build_context_document_index(self) -> 'Conversation':
+        """根据context_documents构建下标索引"""
+        self._ctx_doc_idx = {doc_id: i for i, doc_id in enumerate(self.context_documents)}
+        return self
+    
+    def _index_message(self, idx: int, message: Message) -> None:
+        """记录消息下标"""
+        if message.role == 'user':
+            self._user_idx.append(idx)
+        elif message.role == 'assistant':
+            self._assistant_idx.append(idx)
+    
     def add_message(self, message: Message) -> None:
         """添加消息"""
         if message.conversation_id != self.id:
-            message.conversation_id = self.id
+            # 消息不可变，归属其他对话时复制一份
+            message = message.model_copy(update={'conversation_id': self.id})
         self.messages.append(message)
-        self.last_activity = datetime.now(timezone.utc)
-        self.update_timestamp()
+        self._index_message(len(self.messages) - 1, message)
+        self._recent.append(message)
+        now = datetime.now(timezone.utc)
+        # 绕过赋值验证：验证会重跑所有after验证器，每次都从头重建下标
+        object.__setattr__(self, 'last_activity', now)
+        self.update_timestamp(now)
     
     def get_message_count(self) -> int:
         """获取消息数量"""
@@ -81,31 +123,39 @@ class Conversation(BaseDataModel):
     
     def get_user_messages(self) -> List[Message]:
         """获取用户消息"""
-        return [msg for msg in self.messages if msg.is_user_message()]
+        messages = self.messages
+        return [messages[i] for i in self._user_idx]
     
     def get_assistant_messages(self) -> List[Message]:
         """获取助手消息"""
-        return [msg for msg in self.messages if msg.is_assistant_message()]
+        messages = self.messages
+        return [messages[i] for i in self._assistant_idx]
     
     def get_recent_messages(self, count: int = 10) -> List[Message]:
         """获取最近的消息"""
-        return self.messages[-count:] if count > 0 else []
+        if count <= 0:
+            return []
+        recent = self._recent
+        if count > len(recent) and len(self.messages) > len(recent):
+            # 超出窗口大小时回退到完整消息列表
+            return self.messages[-count:]
+        return list(islice(recent, max(0, len(recent) - count), None))
     
     def generate_title(self) -> str:
         """生成对话标题"""
         if not self.messages:
             return "新对话"
         
-        first_user_msg = next(
-            (msg for msg in self.messages if msg.is_user_message()), 
-            None
-        )
-        if first_user_msg:
-            # 取前30个字符作为标题
-            title = first_user_msg.content[:30]
-            if len(first_user_msg.content) > 30:
-                title += "..."
-            return title
+        if self._user_idx:
+            # 消息不可变且只追加，第一条用户消息确定后标题不再变化
+            if self._cached_title is None:
+                first_user_msg = self.messages[self._user_idx[0]]
+                # 取前30个字符作为标题
+                title = first_user_msg.content[:30]
+                if len(first_user_msg.content) > 30:
+                    title += "..."
+                self._cached_title = title
+            return self._cached_title
         
         return f"对话 {self.id[:8]}"
     
@@ -117,14 +167,19 @@ class Conversation(BaseDataModel):
     
     def add_context_document(self, document_id: str) -> None:
         """添加上下文文档"""
-        if document_id not in self.context_documents:
+        if document_id not in self._ctx_doc_idx:
+            self._ctx_doc_idx[document_id] = len(self.context_documents)
             self.context_documents.append(document_id)
             self.update_timestamp()
     
     def remove_context_document(self, document_id: str) -> None:
-        """移除上下文文档"""
-        if document_id in self.context_documents:
-            self.context_documents.remove(document_id)
+        """移除上下文文档（末尾元素移入空位，不保持原有顺序）"""
+        i = self._ctx_doc_idx.pop(document_id, None)
+        if i is not None:
+            last = self.context_documents.pop()
+            if i < len(self.context_documents):
+                self.context_documents[i] = last
+                self._ctx_doc_idx[last] = i
             self.update_timestamp()
     
     def deactivate(self) -> None:
@@ -137,8 +192,8 @@ class ConversationSummary(BaseDataModel):
     """对话摘要数据模型"""
     
     conversation_id: str = Field(..., description="对话ID")
-    summary: str = Field(..., description="摘要内容")
-    key_topics: List[str] = Field(default_factory=list, description="关键话题")
+    summary: NonEmptyStr = Field(..., description="摘要内容")
+    key_topics: DedupStrList = Field(default_factory=list, description="关键话题")
     mentioned_documents: List[str] = Field(
         default_factory=list, 
         description="提及的文档ID列表"
@@ -147,20 +202,6 @@ class ConversationSummary(BaseDataModel):
     start_time: datetime = Field(..., description="开始时间")
     end_time: datetime = Field(..., description="结束时间")
     
-    @field_validator('summary')
-    @classmethod
-    def validate_summary(cls, v: str) -> str:
-        """验证摘要"""
-        if not v or len(v.strip()) == 0:
-            raise ValueError("摘要不能为空")
-        return v.strip()
-    
-    @field_validator('key_topics')
-    @classmethod
-    def validate_key_topics(cls, v: List[str]) -> List[str]:
-        """验证关键话题"""
-        return list(set(topic.strip() for topic in v if topic.strip()))
-    
     def add_topic(self, topic: str) -> None:
         """添加关键话题"""
         topic = topic.strip()
@@ -189,6 +230,15 @@ class ConversationContext(BaseDataModel):
     user_intent: Optional[str] = Field(None, description="用户意图")
     last_qa_response: Optional[QAResponse] = Field(None, description="最后的问答响应")
     
+    # 与relevant_documents同步的去重集合
+    _relevant_documents_set: Set[str] = PrivateAttr(default_factory=set)
+    
+    @model_validator(mode='after')
+    def _build_relevant_document_set(self) -> 'ConversationContext':
+        """根据relevant_documents构建去重集合"""
+        self._relevant_documents_set = set(self.relevant_documents)
+        return self
+    
     def update_context_window(self, messages: List[Message], max_size: int = 10) -> None:
         """更新上下文窗口"""
         self.context_window = messages[-max_size:] if max_size > 0 else messages
@@ -196,8 +246,9 @@ class ConversationContext(BaseDataModel):
     
     def add_relevant_document(self, document_id: str) -> None:
         """添加相关文档"""
-        if document_id not in self.relevant_documents:
+        if document_id not in self._relevant_documents_set:
             self.relevant_documents.append(document_id)
+            self._relevant_documents_set.add(document_id)
             self.update_timestamp()
     
     def update_topic(self, topic: str) -> None:
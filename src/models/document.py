@@ -27,6 +27,7 @@ class DocumentInfo(BaseModel):
     upload_time: datetime = Field(default_factory=datetime.utcnow)
     status: DocumentStatus = DocumentStatus.UPLOADING
     user_id: Optional[UUID] = None
+    content_hash: Optional[str] = None
     metadata: Dict = Field(default_factory=dict)
 
 
@@ -3,32 +3,43 @@
 Entity-related data models
 """
 
-from typing import Any, Dict, List, Optional
+import sys
+from array import array
+from typing import Annotated, Any, Dict, List, Optional, Set, Tuple
 
-from pydantic import Field, field_validator
+import numpy as np
+from pydantic import AfterValidator, Field, PrivateAttr, StringConstraints, field_validator, model_validator
 
-from .base import BaseDataModel, EntityType
+from .base import (
+    BaseDataModel, BaseFrozenModel, BasePerfModel, DedupStrList, EntityType, InternedStr, NonEmptyStr
+)
 
 
-class Mention(BaseDataModel):
+# 关系类型：去除首尾空白、转为小写后非空
+RelationType = Annotated[
+    str,
+    StringConstraints(strip_whitespace=True, to_lower=True, min_length=1),
+    AfterValidator(sys.intern)
+]
+
+# 双向关系类型
+_BIDIRECTIONAL_RELATIONS = frozenset({
+    'similar_to', 'related_to', 'connected_to',
+    'associated_with', 'colleague_of'
+})
+
+
+class Mention(BaseFrozenModel):
     """实体提及"""
     
-    text: str = Field(..., description="提及文本")
+    text: NonEmptyStr = Field(..., description="提及文本")
     start_position: int = Field(..., ge=0, description="起始位置")
     end_position: int = Field(..., ge=0, description="结束位置")
-    chunk_id: str = Field(..., description="所在文本块ID")
-    document_id: str = Field(..., description="所在文档ID")
+    chunk_id: InternedStr = Field(..., description="所在文本块ID")
+    document_id: InternedStr = Field(..., description="所在文档ID")
     confidence: float = Field(..., ge=0.0, le=1.0, description="置信度")
     context: Optional[str] = Field(None, description="上下文")
     
-    @field_validator('text')
-    @classmethod
-    def validate_text(cls, v: str) -> str:
-        """验证提及文本"""
-        if not v or len(v.strip()) == 0:
-            raise ValueError("提及文本不能为空")
-        return v.strip()
-    
     @field_validator('end_position')
     @classmethod
     def validate_positions(cls, v: int, info) -> int:
@@ -48,42 +59,66 @@ class Mention(BaseDataModel):
         return (self.start_position, self.end_position)
 
 
-class Entity(BaseDataModel):
+class Entity(BasePerfModel):
     """实体数据模型"""
     
-    name: str = Field(..., description="实体名称")
+    name: NonEmptyStr = Field(..., description="实体名称")
     entity_type: EntityType = Field(..., description="实体类型")
     mentions: List[Mention] = Field(default_factory=list, description="实体提及列表")
     attributes: Dict[str, Any] = Field(default_factory=dict, description="实体属性")
-    aliases: List[str] = Field(default_factory=list, description="别名列表")
+    aliases: DedupStrList = Field(default_factory=list, description="别名列表")
     description: Optional[str] = Field(None, description="实体描述")
     confidence: float = Field(default=1.0, ge=0.0, le=1.0, description="整体置信度")
     
-    @field_validator('name')
-    @classmethod
-    def validate_name(cls, v: str) -> str:
-        """验证实体名称"""
-        if not v or len(v.strip()) == 0:
-            raise ValueError("实体名称不能为空")
-        return v.strip()
+    # 别名集合，与aliases同步，用于O(1)去重
+    _aliases_set: Set[str] = PrivateAttr(default_factory=set)
+    # 提及去重键集合（文档ID、文本块ID、起止位置）
+    _mention_keys: Set[Tuple[str, str, int, int]] = PrivateAttr(default_factory=set)
+    # 提及置信度缓冲区（与mentions一一对应，提及需通过add_mention添加），读取时转换为数组并缓存
+    _conf_buf: List[float] = PrivateAttr(default_factory=list)
+    _conf_arr: Optional[np.ndarray] = PrivateAttr(default=None)
     
-    @field_validator('aliases')
-    @classmethod
-    def validate_aliases(cls, v: List[str]) -> List[str]:
-        """验证别名列表"""
-        return list(set(alias.strip() for alias in v if alias.strip()))
+    @model_validator(mode='after')
+    def _build_alias_set(self) -> 'Entity':
+        """根据aliases构建别名集合"""
+        self._aliases_set = set(self.aliases)
+        return self
+    
+    @model_validator(mode='after')
+    def _build_mention_index(self) -> 'Entity':
+        """根据mentions构建去重键集合和置信度缓冲区"""
+        self._mention_keys = {self._mention_key(mention) for mention in self.mentions}
+        self._conf_buf = [mention.confidence for mention in self.mentions]
+        self._conf_arr = None
+        return self
+    
+    @staticmethod
+    def _mention_key(mention: Mention) -> Tuple[str, str, int, int]:
+        """提及去重键"""
+        return (mention.document_id, mention.chunk_id, mention.start_position, mention.end_position)
+    
+    def _confidence_array(self) -> np.ndarray:
+        """获取提及置信度数组"""
+        if self._conf_arr is None:
+            self._conf_arr = np.array(self._conf_buf, dtype=np.float64)
+        return self._conf_arr
     
     def add_mention(self, mention: Mention) -> None:
         """添加实体提及"""
-        if mention not in self.mentions:
+        key = self._mention_key(mention)
+        if key not in self._mention_keys:
             self.mentions.append(mention)
+            self._mention_keys.add(key)
+            self._conf_buf.append(mention.confidence)
+            self._conf_arr = None
             self.update_timestamp()
     
     def add_alias(self, alias: str) -> None:
         """添加别名"""
         alias = alias.strip()
-        if alias and alias not in self.aliases and alias != self.name:
+        if alias and alias not in self._aliases_set and alias != self.name:
             self.aliases.append(alias)
+            self._aliases_set.add(alias)
             self.update_timestamp()
     
     def get_mention_count(self) -> int:
@@ -100,17 +135,17 @@ class Entity(BaseDataModel):
     
     def calculate_average_confidence(self) -> float:
         """计算平均置信度"""
-        if not self.mentions:
+        if not self._conf_buf:
             return self.confidence
-        return sum(mention.confidence for mention in self.mentions) / len(self.mentions)
+        return float(self._confidence_array().mean())
 
 
 class Relation(BaseDataModel):
     """实体关系数据模型"""
     
-    source_entity_id: str = Field(..., description="源实体ID")
-    target_entity_id: str = Field(..., description="目标实体ID")
-    relation_type: str = Field(..., description="关系类型")
+    source_entity_id: NonEmptyStr = Field(..., description="源实体ID")
+    target_entity_id: NonEmptyStr = Field(..., description="目标实体ID")
+    relation_type: RelationType = Field(..., description="关系类型")
     confidence: float = Field(..., ge=0.0, le=1.0, description="置信度")
     evidence: List[str] = Field(default_factory=list, description="证据文本列表")
     context_chunks: List[str] = Field(
@@ -119,46 +154,39 @@ class Relation(BaseDataModel):
     )
     attributes: Dict[str, Any] = Field(default_factory=dict, description="关系属性")
     
-    @field_validator('relation_type')
-    @classmethod
-    def validate_relation_type(cls, v: str) -> str:
-        """验证关系类型"""
-        if not v or len(v.strip()) == 0:
-            raise ValueError("关系类型不能为空")
-        return v.strip().lower()
+    # 与evidence、context_chunks同步的去重集合
+    _evidence_set: Set[str] = PrivateAttr(default_factory=set)
+    _context_chunks_set: Set[str] = PrivateAttr(default_factory=set)
     
-    @field_validator('source_entity_id')
-    @classmethod
-    def validate_source_entity_id(cls, v: str) -> str:
-        """验证源实体ID"""
-        if not v or len(v.strip()) == 0:
-            raise ValueError("源实体ID不能为空")
-        return v.strip()
+    @model_validator(mode='after')
+    def _build_dedup_sets(self) -> 'Relation':
+        """根据列表构建去重集合"""
+        self._evidence_set = set(self.evidence)
+        self._context_chunks_set = set(self.context_chunks)
+        return self
     
     @field_validator('target_entity_id')
     @classmethod
     def validate_target_entity_id(cls, v: str, info) -> str:
         """验证目标实体ID"""
-        if not v or len(v.strip()) == 0:
-            raise ValueError("目标实体ID不能为空")
-        if info.data:
-            source_id = info.data.get('source_entity_id')
-            if source_id and v.strip() == source_id:
-                raise ValueError("源实体和目标实体不能相同")
-        return v.strip()
+        if info.data and v == info.data.get('source_entity_id'):
+            raise ValueError("源实体和目标实体不能相同")
+        return v
     
     def add_evidence(self, evidence: str) -> None:
         """添加证据"""
         evidence = evidence.strip()
-        if evidence and evidence not in self.evidence:
+        if evidence and evidence not in self._evidence_set:
             self.evidence.append(evidence)
+            self._evidence_set.add(evidence)
             self.update_timestamp()
     
     def add_context_chunk(self, chunk_id: str) -> None:
         """添加相关文本块"""
         chunk_id = chunk_id.strip()
-        if chunk_id and chunk_id not in self.context_chunks:
+        if chunk_id and chunk_id not in self._context_chunks_set:
             self.context_chunks.append(chunk_id)
+            self._context_chunks_set.add(chunk_id)
             self.update_timestamp()
     
     def get_evidence_count(self) -> int:
@@ -167,11 +195,7 @@ class Relation(BaseDataModel):
     
     def is_bidirectional(self) -> bool:
         """判断是否为双向关系"""
-        bidirectional_relations = {
-            'similar_to', 'related_to', 'connected_to', 
-            'associated_with', 'colleague_of'
-        }
-        return self.relation_type in bidirectional_relations
+        return self.relation_type in _BIDIRECTIONAL_RELATIONS
 
 
 class KnowledgeGraph(BaseDataModel):
@@ -181,6 +205,49 @@ class KnowledgeGraph(BaseDataModel):
     relations: List[Relation] = Field(default_factory=list, description="关系列表")
     document_ids: List[str] = Field(default_factory=list, description="相关文档ID列表")
     
+    # 邻接索引：实体ID -> relations中的下标（关系需通过add_relation添加）
+    _adj: Dict[str, List[int]] = PrivateAttr(default_factory=dict)
+    # 列式存储的关系两端实体编号和置信度，与relations下标一一对应
+    _entity_codes: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _code_ids: List[str] = PrivateAttr(default_factory=list)
+    _sources: array = PrivateAttr(default_factory=lambda: array('i'))
+    _targets: array = PrivateAttr(default_factory=lambda: array('i'))
+    _confidences: array = PrivateAttr(default_factory=lambda: array('d'))
+    
+    @model_validator(mode='after')
+    def _build_relation_index(self) -> 'KnowledgeGraph':
+        """根据relations重建邻接索引和列式数组"""
+        self._adj = {}
+        self._entity_codes = {}
+        self._code_ids = []
+        self._sources = array('i')
+        self._targets = array('i')
+        self._confidences = array('d')
+        for relation in self.relations:
+            self._index_relation(relation)
+        return self
+    
+    def _entity_code(self, entity_id: str) -> int:
+        """获取实体编号，不存在时分配新编号"""
+        code = self._entity_codes.get(entity_id)
+        if code is None:
+            code = len(self._code_ids)
+            self._entity_codes[entity_id] = code
+            self._code_ids.append(entity_id)
+        return code
+    
+    def _index_relation(self, relation: Relation) -> None:
+        """将relations末尾的关系加入索引"""
+        idx = len(self._sources)
+        source_id = relation.source_entity_id
+        target_id = relation.target_entity_id
+        self._sources.append(self._entity_code(source_id))
+        self._targets.append(self._entity_code(target_id))
+        self._confidences.append(relation.confidence)
+        self._adj.setdefault(source_id, []).append(idx)
+        if target_id != source_id:
+            self._adj.setdefault(target_id, []).append(idx)
+    
     def add_entity(self, entity: Entity) -> None:
         """添加实体"""
         self.entities[entity.id] = entity
@@ -194,6 +261,7 @@ class KnowledgeGraph(BaseDataModel):
             raise ValueError("关系中的实体不存在于知识图谱中")
         
         self.relations.append(relation)
+        self._index_relation(relation)
         self.update_timestamp()
     
     def get_entity(self, entity_id: str) -> Optional[Entity]:
@@ -202,20 +270,47 @@ class KnowledgeGraph(BaseDataModel):
     
     def get_entity_relations(self, entity_id: str) -> List[Relation]:
         """获取实体的所有关系"""
-        return [
-            rel for rel in self.relations 
-            if rel.source_entity_id == entity_id or rel.target_entity_id == entity_id
-        ]
+        relations = self.relations
+        return [relations[i] for i in self._adj.get(entity_id, ())]
     
     def get_related_entities(self, entity_id: str) -> List[str]:
         """获取相关实体ID列表"""
+        indices = self._adj.get(entity_id)
+        if not indices:
+            return []
+        
+        # 直接遍历列式数组，避免访问Relation对象属性
+        code = self._entity_codes[entity_id]
+        sources = self._sources
+        targets = self._targets
         related = set()
-        for relation in self.get_entity_relations(entity_id):
-            if relation.source_entity_id == entity_id:
-                related.add(relation.target_entity_id)
-            else:
-                related.add(relation.source_entity_id)
-        return list(related)
+        for i in indices:
+            related.add(targets[i] if sources[i] == code else sources[i])
+        code_ids = self._code_ids
+        return [code_ids[c] for c in related]
+    
+    def get_relation_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """获取关系的列式数组（源实体编号、目标实体编号、置信度）
+
+        实体编号可通过get_entity_id_by_code转换回实体ID，供图算法批量计算使用。
+        """
+        return (
+            np.array(self._sources, dtype=np.int32),
+            np.array(self._targets, dtype=np.int32),
+            np.array(self._confidences, dtype=np.float64)
+        )
+    
+    def get_entity_id_by_code(self, code: int) -> str:
+        """根据实体编号获取实体ID"""
+        return self._code_ids[code]
+    
+    def filter_relations(self, min_confidence: float) -> List[Relation]:
+        """获取置信度不低于阈值的关系"""
+        if not self.relations:
+            return []
+        confidences = np.frombuffer(self._confidences, dtype=np.float64)
+        relations = self.relations
+        return [relations[i] for i in np.flatnonzero(confidences >= min_confidence)]
     
     def get_entity_count(self) -> int:
         """获取实体数量"""
@@ -229,9 +324,11 @@ class KnowledgeGraph(BaseDataModel):
         """移除实体及其相关关系"""
         if entity_id in self.entities:
             del self.entities[entity_id]
-            # 移除相关关系
-            self.relations = [
-                rel for rel in self.relations 
-                if rel.source_entity_id != entity_id and rel.target_entity_id != entity_id
-            ]
+            # 通过邻接索引定位相关关系，重新赋值时由校验器重建索引
+            removed = self._adj.get(entity_id)
+            if removed:
+                removed = set(removed)
+                self.relations = [
+                    rel for i, rel in enumerate(self.relations) if i not in removed
+                ]
             self.update_timestamp()
\ No newline at end of file
@@ -1,19 +1,30 @@
 """查询相关数据模型"""
 
+import sys
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set
 from uuid import uuid4
 
-from pydantic import Field, field_validator
+import numpy as np
+from pydantic import Field, PrivateAttr, field_validator, model_validator
 
-from .base import BaseDataModel
+from .base import BaseDataModel, NonEmptyStr
 from .search import QAResponse
 
 
+# 结果块数量超过该阈值时使用NumPy排序，较小列表直接用list.sort
+NUMPY_SORT_THRESHOLD = 512
+
+# 验证器使用的合法取值
+_VALID_QUERY_TYPES = frozenset({'vector', 'bm25', 'hybrid'})
+_VALID_RETRIEVAL_METHODS = frozenset({'vector', 'bm25', 'hybrid'})
+_VALID_SUGGESTION_TYPES = frozenset({'spelling', 'synonym', 'expansion', 'refinement'})
+
+
 class Query(BaseDataModel):
     """查询数据模型"""
     
-    text: str = Field(..., description="查询文本")
+    text: NonEmptyStr = Field(..., description="查询文本")
     query_type: str = Field(default="hybrid", description="查询类型")
     filters: Dict[str, Any] = Field(default_factory=dict, description="过滤条件")
     limit: int = Field(default=10, ge=1, le=100, description="返回结果数量")
@@ -21,22 +32,13 @@ class Query(BaseDataModel):
     user_id: Optional[str] = Field(None, description="用户ID")
     session_id: Optional[str] = Field(None, description="会话ID")
     
-    @field_validator('text')
-    @classmethod
-    def validate_text(cls, v: str) -> str:
-        """验证查询文本"""
-        if not v or len(v.strip()) == 0:
-            raise ValueError("查询文本不能为空")
-        return v.strip()
-    
     @field_validator('query_type')
     @classmethod
     def validate_query_type(cls, v: str) -> str:
         """验证查询类型"""
-        valid_types = {'vector', 'bm25', 'hybrid'}
-        if v not in valid_types:
+        if v not in _VALID_QUERY_TYPES:
             raise ValueError(f"无效的查询类型: {v}")
-        return v
+        return sys.intern(v)
     
     def add_filter(self, key: str, value: Any) -> None:
         """添加过滤条件"""
@@ -65,10 +67,9 @@ class QueryResult(BaseDataModel):
     @classmethod
     def validate_retrieval_method(cls, v: str) -> str:
         """验证检索方法"""
-        valid_methods = {'vector', 'bm25', 'hybrid'}
-        if v not in valid_methods:
+        if v not in _VALID_RETRIEVAL_METHODS:
             raise ValueError(f"无效的检索方法: {v}")
-        return v
+        return sys.intern(v)
     
     def get_result_count(self) -> int:
         """获取结果数量"""
@@ -86,7 +87,18 @@ class QueryResult(BaseDataModel):
     
     def sort_by_score(self, reverse: bool = True) -> None:
         """按分数排序"""
-        self.chunks.sort(key=lambda x: x.get('score', 0.0), reverse=reverse)
+        chunks = self.chunks
+        if len(chunks) < NUMPY_SORT_THRESHOLD:
+            chunks.sort(key=lambda x: x.get('score', 0.0), reverse=reverse)
+        else:
+            scores = np.fromiter(
+                (chunk.get('score', 0.0) for chunk in chunks),
+                dtype=np.float64,
+                count=len(chunks)
+            )
+            # 稳定排序，与list.sort相同分数时保持原有顺序
+            order = np.argsort(-scores if reverse else scores, kind='stable')
+            chunks[:] = [chunks[i] for i in order]
         self.update_timestamp()
 
 
@@ -128,10 +140,20 @@ class QueryAnalytics(BaseDataModel):
     user_feedback: Optional[str] = Field(None, description="用户反馈")
     satisfaction_score: Optional[float] = Field(None, ge=0.0, le=5.0, description="满意度评分")
     
+    # 与clicked_results同步的去重集合
+    _clicked_set: Set[str] = PrivateAttr(default_factory=set)
+    
+    @model_validator(mode='after')
+    def _build_clicked_set(self) -> 'QueryAnalytics':
+        """根据clicked_results构建去重集合"""
+        self._clicked_set = set(self.clicked_results)
+        return self
+    
     def add_click(self, result_id: str) -> None:
         """添加点击记录"""
-        if result_id not in self.clicked_results:
+        if result_id not in self._clicked_set:
             self.clicked_results.append(result_id)
+            self._clicked_set.add(result_id)
             self.update_timestamp()
     
     def set_feedback(self, feedback: str, score: Optional[float] = None) -> None:
@@ -149,8 +171,8 @@ class QueryAnalytics(BaseDataModel):
 class QuerySuggestion(BaseDataModel):
     """查询建议数据模型"""
     
-    original_query: str = Field(..., description="原始查询")
-    suggested_query: str = Field(..., description="建议查询")
+    original_query: NonEmptyStr = Field(..., description="原始查询")
+    suggested_query: NonEmptyStr = Field(..., description="建议查询")
     suggestion_type: str = Field(..., description="建议类型")
     confidence: float = Field(default=0.0, ge=0.0, le=1.0, description="置信度")
     reason: Optional[str] = Field(None, description="建议原因")
@@ -159,15 +181,6 @@ class QuerySuggestion(BaseDataModel):
     @classmethod
     def validate_suggestion_type(cls, v: str) -> str:
         """验证建议类型"""
-        valid_types = {'spelling', 'synonym', 'expansion', 'refinement'}
-        if v not in valid_types:
+        if v not in _VALID_SUGGESTION_TYPES:
             raise ValueError(f"无效的建议类型: {v}")
-        return v
-    
-    @field_validator('original_query', 'suggested_query')
-    @classmethod
-    def validate_query(cls, v: str) -> str:
-        """验证查询文本"""
-        if not v or len(v.strip()) == 0:
-            raise ValueError("查询文本不能为空")
-        return v.strip()
+        return sys.intern(v)
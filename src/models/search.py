@@ -3,19 +3,31 @@
 Search-related data models
 """
 
+import sys
 from typing import Any, Dict, List, Optional
 
 from pydantic import Field, field_validator
 
-from .base import BaseDataModel
+from .base import BaseDataModel, BaseFrozenModel, NonEmptyStr
 
 
-class SearchResult(BaseDataModel):
-    """搜索结果数据模型"""
+# 合法的搜索查询类型
+_VALID_QUERY_TYPES = frozenset({'vector', 'keyword', 'hybrid'})
+
+
+def _preview(text: str, max_length: int) -> str:
+    """截断文本用于预览，未超长时直接返回原字符串"""
+    if len(text) <= max_length:
+        return text
+    return f"{text[:max_length]}..."
+
+
+class SearchResult(BaseFrozenModel):
+    """搜索结果数据模型（创建后不可修改）"""
     
-    chunk_id: str = Field(..., description="文本块ID")
-    document_id: str = Field(..., description="文档ID")
-    content: str = Field(..., description="文本内容")
+    chunk_id: NonEmptyStr = Field(..., description="文本块ID")
+    document_id: NonEmptyStr = Field(..., description="文档ID")
+    content: NonEmptyStr = Field(..., description="文本内容")
     score: float = Field(..., ge=0.0, description="相关性评分")
     metadata: Dict[str, Any] = Field(default_factory=dict, description="元数据")
     highlight: Optional[str] = Field(None, description="高亮文本")
@@ -23,35 +35,9 @@ class SearchResult(BaseDataModel):
     page_number: Optional[int] = Field(None, ge=1, description="页码")
     section_title: Optional[str] = Field(None, description="章节标题")
     
-    @field_validator('content')
-    @classmethod
-    def validate_content(cls, v: str) -> str:
-        """验证内容"""
-        if not v or len(v.strip()) == 0:
-            raise ValueError("搜索结果内容不能为空")
-        return v.strip()
-    
-    @field_validator('chunk_id')
-    @classmethod
-    def validate_chunk_id(cls, v: str) -> str:
-        """验证文本块ID"""
-        if not v or len(v.strip()) == 0:
-            raise ValueError("文本块ID不能为空")
-        return v.strip()
-    
-    @field_validator('document_id')
-    @classmethod
-    def validate_document_id(cls, v: str) -> str:
-        """验证文档ID"""
-        if not v or len(v.strip()) == 0:
-            raise ValueError("文档ID不能为空")
-        return v.strip()
-    
     def get_content_preview(self, max_length: int = 200) -> str:
         """获取内容预览"""
-        if len(self.content) <= max_length:
-            return self.content
-        return self.content[:max_length] + "..."
+        return _preview(self.content, max_length)
     
     def has_highlight(self) -> bool:
         """是否有高亮文本"""
@@ -61,7 +47,7 @@ class SearchResult(BaseDataModel):
 class SearchQuery(BaseDataModel):
     """搜索查询数据模型"""
     
-    query_text: str = Field(..., description="查询文本")
+    query_text: NonEmptyStr = Field(..., description="查询文本")
     query_type: str = Field(default="hybrid", description="查询类型")
     filters: Dict[str, Any] = Field(default_factory=dict, description="过滤条件")
     top_k: int = Field(default=10, ge=1, le=100, description="返回结果数量")
@@ -69,22 +55,13 @@ class SearchQuery(BaseDataModel):
     include_metadata: bool = Field(default=True, description="是否包含元数据")
     highlight_query: bool = Field(default=True, description="是否高亮查询词")
     
-    @field_validator('query_text')
-    @classmethod
-    def validate_query_text(cls, v: str) -> str:
-        """验证查询文本"""
-        if not v or len(v.strip()) == 0:
-            raise ValueError("查询文本不能为空")
-        return v.strip()
-    
     @field_validator('query_type')
     @classmethod
     def validate_query_type(cls, v: str) -> str:
         """验证查询类型"""
-        valid_types = {'vector', 'keyword', 'hybrid'}
-        if v not in valid_types:
+        if v not in _VALID_QUERY_TYPES:
             raise ValueError(f"无效的查询类型: {v}")
-        return v
+        return sys.intern(v)
     
     def add_filter(self, key: str, value: Any) -> None:
         """添加过滤条件"""
@@ -125,55 +102,38 @@ class SearchResponse(BaseDataModel):
         return [result for result in self.results if result.score >= min_score]
 
 
-class Citation(BaseDataModel):
-    """引用数据模型"""
+class Citation(BaseFrozenModel):
+    """引用数据模型（创建后不可修改）"""
     
     document_id: str = Field(..., description="文档ID")
-    document_title: str = Field(..., description="文档标题")
+    document_title: NonEmptyStr = Field(..., description="文档标题")
     chunk_id: str = Field(..., description="文本块ID")
     page_number: Optional[int] = Field(None, ge=1, description="页码")
     section_title: Optional[str] = Field(None, description="章节标题")
-    quoted_text: str = Field(..., description="引用文本")
+    quoted_text: NonEmptyStr = Field(..., description="引用文本")
     context: Optional[str] = Field(None, description="上下文")
     relevance_score: float = Field(..., ge=0.0, le=1.0, description="相关性评分")
     
-    @field_validator('document_title')
-    @classmethod
-    def validate_document_title(cls, v: str) -> str:
-        """验证文档标题"""
-        if not v or len(v.strip()) == 0:
-            raise ValueError("文档标题不能为空")
-        return v.strip()
-    
-    @field_validator('quoted_text')
-    @classmethod
-    def validate_quoted_text(cls, v: str) -> str:
-        """验证引用文本"""
-        if not v or len(v.strip()) == 0:
-            raise ValueError("引用文本不能为空")
-        return v.strip()
-    
     def get_citation_format(self) -> str:
         """获取格式化的引用"""
-        citation = f"《{self.document_title}》"
+        # 收集各部分后一次拼接，避免逐段+=产生中间字符串
+        parts = ["《", self.document_title, "》"]
         if self.page_number:
-            citation += f", 第{self.page_number}页"
+            parts.append(f", 第{self.page_number}页")
         if self.section_title:
-            citation += f", {self.section_title}"
-        return citation
+            parts.extend((", ", self.section_title))
+        return "".join(parts)
     
     def get_quoted_preview(self, max_length: int = 100) -> str:
         """获取引用文本预览"""
-        if len(self.quoted_text) <= max_length:
-            return self.quoted_text
-        return self.quoted_text[:max_length] + "..."
+        return _preview(self.quoted_text, max_length)
 
 
 class QAResponse(BaseDataModel):
     """问答响应数据模型"""
     
-    question: str = Field(..., description="用户问题")
-    answer: str = Field(..., description="回答内容")
+    question: NonEmptyStr = Field(..., description="用户问题")
+    answer: NonEmptyStr = Field(..., description="回答内容")
     sources: List[Citation] = Field(default_factory=list, description="来源引用")
     confidence: float = Field(default=0.0, ge=0.0, le=1.0, description="置信度")
     processing_time: float = Field(default=0.0, ge=0.0, description="处理时间（秒）")
@@ -182,22 +142,6 @@ class QAResponse(BaseDataModel):
     has_context: bool = Field(default=True, description="是否基于文档内容")
     api_usage: Dict[str, Any] = Field(default_factory=dict, description="API使用情况")
     
-    @field_validator('question')
-    @classmethod
-    def validate_question(cls, v: str) -> str:
-        """验证问题"""
-        if not v or len(v.strip()) == 0:
-            raise ValueError("问题不能为空")
-        return v.strip()
-    
-    @field_validator('answer')
-    @classmethod
-    def validate_answer(cls, v: str) -> str:
-        """验证回答"""
-        if not v or len(v.strip()) == 0:
-            raise ValueError("回答不能为空")
-        return v.strip()
-    
     def get_source_count(self) -> int:
         """获取来源数量"""
         return len(self.sources)
@@ -219,6 +163,4 @@ class QAResponse(BaseDataModel):
     
     def get_answer_preview(self, max_length: int = 200) -> str:
         """获取回答预览"""
-        if len(self.answer) <= max_length:
-            return self.answer
-        return self.answer[:max_length] + "..."
\ No newline at end of file
+        return _preview(self.answer, max_length)
\ No newline at end of file
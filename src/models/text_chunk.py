@@ -3,39 +3,61 @@
 Text chunk related data models
 """
 
-from typing import Any, Dict, List, Optional
+from datetime import datetime, timezone
+from typing import Annotated, Any, Dict, List, Optional, Sequence, Union
 
-from pydantic import Field, field_validator
+import numpy as np
+from pydantic import ConfigDict, Field, PlainSerializer, PlainValidator, StringConstraints, WithJsonSchema, field_validator
 
-from .base import BaseDataModel
+from .base import BaseDataModel, BaseFrozenModel, BasePerfModel, DedupStrList
 
 
-class TextChunk(BaseDataModel):
+# 文本块内容：去除首尾空白后非空，且不超过10000个字符（避免过长的文本块）
+ChunkContent = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1, max_length=10000)]
+
+
+# 支持的向量维度
+SUPPORTED_EMBEDDING_DIMENSIONS = frozenset({384, 512, 768, 1024, 1536})
+
+
+def to_embedding_array(v: Any) -> np.ndarray:
+    """将向量转换为连续的一维float32数组
+
+    已经是C连续float32数组时直接返回原数组，不复制。
+    """
+    arr = np.ascontiguousarray(v, dtype=np.float32)
+    if arr.ndim != 1:
+        raise ValueError("向量必须是一维数组")
+    return arr
+
+
+# 向量表示：内部存储为float32数组，序列化时转换为列表
+EmbeddingArray = Annotated[
+    np.ndarray,
+    PlainValidator(to_embedding_array),
+    PlainSerializer(lambda v: v.tolist(), return_type=List[float]),
+    WithJsonSchema({'type': 'array', 'items': {'type': 'number'}})
+]
+
+
+class TextChunk(BasePerfModel):
     """文本块数据模型"""
     
+    # 向量在创建后才写入，不能冻结；拒绝额外字段
+    model_config = ConfigDict(extra='forbid')
+    
     document_id: str = Field(..., description="所属文档ID")
-    content: str = Field(..., description="文本内容")
+    content: ChunkContent = Field(..., description="文本内容")
     chunk_index: int = Field(..., ge=0, description="块索引")
     start_position: int = Field(..., ge=0, description="在原文档中的起始位置")
     end_position: int = Field(..., ge=0, description="在原文档中的结束位置")
     metadata: Dict[str, Any] = Field(default_factory=dict, description="元数据")
-    embedding: Optional[List[float]] = Field(None, description="向量表示")
+    embedding: Optional[EmbeddingArray] = Field(None, description="向量表示")
     token_count: Optional[int] = Field(None, ge=0, description="Token数量")
     language: str = Field(default="zh", description="语言")
     page_number: Optional[int] = Field(None, ge=1, description="页码")
     section_title: Optional[str] = Field(None, description="章节标题")
     
-    @field_validator('content')
-    @classmethod
-    def validate_content(cls, v: str) -> str:
-        """验证文本内容"""
-        if not v or len(v.strip()) == 0:
-            raise ValueError("文本内容不能为空")
-        # 检查内容长度（避免过长的文本块）
-        if len(v) > 10000:
-            raise ValueError("文本块长度不能超过10000个字符")
-        return v.strip()
-    
     @field_validator('end_position')
     @classmethod
     def validate_positions(cls, v: int, info) -> int:
@@ -48,13 +70,13 @@ class TextChunk(BaseDataModel):
     
     @field_validator('embedding')
     @classmethod
-    def validate_embedding(cls, v: Optional[List[float]]) -> Optional[List[float]]:
+    def validate_embedding(cls, v: Optional[np.ndarray]) -> Optional[np.ndarray]:
         """验证向量表示"""
         if v is not None:
             if len(v) == 0:
                 raise ValueError("向量不能为空列表")
-            # 检查向量维度（假设使用768维的向量）
-            if len(v) not in [384, 512, 768, 1024, 1536]:
+            # 检查向量维度
+            if len(v) not in SUPPORTED_EMBEDDING_DIMENSIONS:
                 raise ValueError(f"不支持的向量维度: {len(v)}")
         return v
     
@@ -70,33 +92,50 @@ class TextChunk(BaseDataModel):
         """是否有向量表示"""
         return self.embedding is not None and len(self.embedding) > 0
     
-    def set_embedding(self, embedding: List[float]) -> None:
-        """设置向量表示"""
-        if not embedding:
+    def set_embedding(self, embedding: Union[List[float], np.ndarray]) -> None:
+        """设置向量表示
+
+        传入C连续的float32数组时直接持有该数组（不复制），调用方之后不应再修改它。
+        """
+        if embedding is None or len(embedding) == 0:
             raise ValueError("向量不能为空")
-        self.embedding = embedding
+        # 模型不做赋值验证，这里显式转换并检查维度
+        arr = to_embedding_array(embedding)
+        if len(arr) not in SUPPORTED_EMBEDDING_DIMENSIONS:
+            raise ValueError(f"不支持的向量维度: {len(arr)}")
+        self.embedding = arr
         self.update_timestamp()
     
+    @staticmethod
+    def set_embeddings(chunks: Sequence["TextChunk"], matrix: np.ndarray) -> None:
+        """批量设置向量：每个文本块持有矩阵对应行的视图，不逐行复制"""
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        if matrix.ndim != 2 or matrix.shape[0] != len(chunks):
+            raise ValueError("向量矩阵的行数必须与文本块数量一致")
+        if matrix.shape[1] not in SUPPORTED_EMBEDDING_DIMENSIONS:
+            raise ValueError(f"不支持的向量维度: {matrix.shape[1]}")
+        now = datetime.now(timezone.utc)
+        for chunk, row in zip(chunks, matrix):
+            chunk.embedding = row
+            chunk.update_timestamp(now)
+    
     def calculate_similarity(self, other_embedding: List[float]) -> float:
         """计算与另一个向量的相似度（余弦相似度）"""
         if not self.has_embedding():
             raise ValueError("当前文本块没有向量表示")
-        if not other_embedding:
+        if other_embedding is None or len(other_embedding) == 0:
             raise ValueError("比较向量不能为空")
         if len(self.embedding) != len(other_embedding):
             raise ValueError("向量维度不匹配")
         
         # 计算余弦相似度
-        import math
-        
-        dot_product = sum(a * b for a, b in zip(self.embedding, other_embedding))
-        norm_a = math.sqrt(sum(a * a for a in self.embedding))
-        norm_b = math.sqrt(sum(b * b for b in other_embedding))
-        
-        if norm_a == 0 or norm_b == 0:
+        a = self.embedding
+        b = np.asarray(other_embedding, dtype=np.float32)
+        denom = np.linalg.norm(a) * np.linalg.norm(b)
+        if denom == 0:
             return 0.0
         
-        return dot_product / (norm_a * norm_b)
+        return float(np.dot(a, b) / denom)
 
 
 class ChunkMetadata(BaseDataModel):
@@ -108,8 +147,8 @@ class ChunkMetadata(BaseDataModel):
         default_factory=list, 
         description="章节层次结构"
     )
-    keywords: List[str] = Field(default_factory=list, description="关键词")
-    entities: List[str] = Field(default_factory=list, description="实体列表")
+    keywords: DedupStrList = Field(default_factory=list, description="关键词")
+    entities: DedupStrList = Field(default_factory=list, description="实体列表")
     sentiment: Optional[str] = Field(None, description="情感倾向")
     importance_score: Optional[float] = Field(
         None, 
@@ -118,18 +157,6 @@ class ChunkMetadata(BaseDataModel):
         description="重要性评分"
     )
     
-    @field_validator('keywords')
-    @classmethod
-    def validate_keywords(cls, v: List[str]) -> List[str]:
-        """验证关键词"""
-        return list(set(kw.strip() for kw in v if kw.strip()))
-    
-    @field_validator('entities')
-    @classmethod
-    def validate_entities(cls, v: List[str]) -> List[str]:
-        """验证实体列表"""
-        return list(set(entity.strip() for entity in v if entity.strip()))
-    
     def add_keyword(self, keyword: str) -> None:
         """添加关键词"""
         keyword = keyword.strip()
@@ -145,19 +172,19 @@ class ChunkMetadata(BaseDataModel):
             self.update_timestamp()
 
 
-class Vector(BaseDataModel):
-    """向量数据模型"""
+class Vector(BaseFrozenModel):
+    """向量数据模型（创建后不可修改）"""
     
     chunk_id: str = Field(..., description="文本块ID")
-    embedding: List[float] = Field(..., description="向量表示")
+    embedding: EmbeddingArray = Field(..., description="向量表示")
     dimension: int = Field(..., ge=1, description="向量维度")
     model_name: str = Field(..., description="生成向量的模型名称")
     
     @field_validator('embedding')
     @classmethod
-    def validate_embedding(cls, v: List[float]) -> List[float]:
+    def validate_embedding(cls, v: np.ndarray) -> np.ndarray:
         """验证向量"""
-        if not v:
+        if len(v) == 0:
             raise ValueError("向量不能为空")
         return v
     
@@ -166,19 +193,18 @@ class Vector(BaseDataModel):
     def validate_dimension(cls, v: int, info) -> int:
         """验证向量维度"""
         if info.data:
-            embedding = info.data.get('embedding', [])
-            if embedding and len(embedding) != v:
+            embedding = info.data.get('embedding')
+            if embedding is not None and len(embedding) != v:
                 raise ValueError("向量维度与实际长度不匹配")
         return v
     
     def get_norm(self) -> float:
         """计算向量的模长"""
-        import math
-        return math.sqrt(sum(x * x for x in self.embedding))
+        return float(np.linalg.norm(self.embedding))
     
     def normalize(self) -> List[float]:
         """归一化向量"""
-        norm = self.get_norm()
+        norm = np.linalg.norm(self.embedding)
         if norm == 0:
-            return self.embedding
-        return [x / norm for x in self.embedding]
\ No newline at end of file
+            return self.embedding.tolist()
+        return (self.embedding / norm).tolist()
\ No newline at end of file
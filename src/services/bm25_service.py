@@ -1,21 +1,365 @@
 """BM25关键词检索服务"""
 
+import copy
+import functools
 import logging
-import pickle
-from typing import List, Dict, Optional, Tuple
+import os
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Iterable, List, Dict, Optional, Tuple
 import jieba
 import jieba.analyse
-from rank_bm25 import BM25Okapi
+import numpy as np
+import orjson
+import scipy.sparse as sp
+from pydantic import TypeAdapter
 from pathlib import Path
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from src.models.text_chunk import TextChunk
 from src.config.settings import get_settings
+from src.utils.performance import create_process_pool
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# 批量验证文本块：整批交给pydantic-core一次处理，避免逐个调用TextChunk(**row)
+_TEXT_CHUNK_LIST_ADAPTER = TypeAdapter(List[TextChunk])
+
+# 查询分词结果缓存条目数
+QUERY_TOKEN_CACHE_SIZE = 4096
+
+# 搜索结果缓存条目数和有效期（秒）
+SEARCH_CACHE_SIZE = 2048
+SEARCH_CACHE_TTL = 300
+
+# 索引文件格式标识和版本，格式变化时递增版本，旧文件会被拒绝加载
+# （v2：每个数组一个.npy文件，可内存映射；清单文件指向当前这一代文件；
+#   v3：清单记录写入的数组，权重矩阵为可选项）
+INDEX_FORMAT_MAGIC = "kb-bm25"
+INDEX_FORMAT_VERSION = 3
+
+# 分词保留的最短词长
+_MIN_TOKEN_LEN = 2
+
+# 自定义词典路径
+CUSTOM_DICT_PATH = Path("data/custom_dict.txt")
+
+# 文档数达到该值时用多进程并行分词，较少时进程启动开销不划算
+PARALLEL_TOKENIZE_MIN_DOCS = 512
+# 每次发给分词子进程的文档数
+TOKENIZE_CHUNKSIZE = 64
+
+# 简单的停用词列表
+_STOPWORDS = frozenset({
+    '的', '了', '在', '是', '我', '有', '和', '就', '不', '人',
+    '都', '一', '一个', '上', '也', '很', '到', '说', '要', '去',
+    '你', '会', '着', '没有', '看', '好', '自己', '这', '那', '他',
+    '她', '它', '们', '这个', '那个', '什么', '怎么', '为什么'
+})
+
+
+def _tokenize(text: str) -> List[str]:
+    """文本分词"""
+    # 使用jieba进行中文分词，单次遍历过滤停用词和短词
+    # （strip后的词不含首尾空白，长度达标即非纯空白）
+    return [
+        token for token in map(str.strip, jieba.cut(text, cut_all=False))
+        if len(token) >= _MIN_TOKEN_LEN and token not in _STOPWORDS
+    ]
+
+
+def _init_tokenize_worker() -> None:
+    """分词子进程初始化：每个进程只加载一次jieba词典和自定义词典"""
+    jieba.initialize()
+    if CUSTOM_DICT_PATH.exists():
+        jieba.load_userdict(str(CUSTOM_DICT_PATH))
+
+
+def tokenize_many(texts: List[str], pool: Optional[ProcessPoolExecutor] = None) -> List[List[str]]:
+    """批量分词，给出进程池且文档较多时在多个进程中并行执行"""
+    if pool is None or len(texts) < PARALLEL_TOKENIZE_MIN_DOCS or (os.cpu_count() or 1) < 2:
+        return [_tokenize(text) for text in texts]
+    
+    return list(pool.map(_tokenize, texts, chunksize=TOKENIZE_CHUNKSIZE))
+
+
+def _accumulate_columns(
+    matrix: sp.csc_matrix,
+    columns: np.ndarray,
+    factors: np.ndarray
+) -> np.ndarray:
+    """按列累加CSC矩阵：返回 sum(matrix[:, columns[k]] * factors[k])
+
+    直接从indptr切出各列的非零项，一次gather加一次bincount完成，
+    不构造列切片的中间稀疏矩阵，也没有Python层的逐项循环。
+    """
+    n_rows = matrix.shape[0]
+    starts = matrix.indptr[columns]
+    lengths = matrix.indptr[columns + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(n_rows)
+    
+    # 各列非零项在data/indices中的位置拼接成一个下标数组
+    out_starts = np.cumsum(lengths) - lengths
+    gather = np.arange(total) + np.repeat(starts - out_starts, lengths)
+    return np.bincount(
+        matrix.indices[gather],
+        weights=matrix.data[gather] * np.repeat(factors, lengths),
+        minlength=n_rows
+    )
+
+
+class SparseBM25:
+    """基于稀疏矩阵的BM25评分器
+
+    评分公式与rank_bm25.BM25Okapi一致（含负IDF的epsilon平滑）。把每个
+    词项在每个文档中的BM25权重预先算入CSC矩阵，查询时只取查询词对应的
+    列做一次稀疏矩阵-向量乘法，代价与查询词的倒排列表长度成正比。
+
+    增删文档时只增量维护词频矩阵、文档长度和文档频率并重算IDF；权重矩阵
+    依赖全局的avgdl，标记为失效后在下一次查询时才重新计算，连续多次修改
+    只需计算一次。
+    """
+    
+    def __init__(
+        self,
+        tf: sp.csr_matrix,
+        vocab: Dict[str, int],
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25
+    ):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        
+        # 词表和原始词频矩阵（文档 x 词项）
+        self.vocab = vocab
+        self.tf = tf
+        self.corpus_size = self.tf.shape[0]
+        self.doc_len = np.asarray(self.tf.sum(axis=1), dtype=np.float64).ravel()
+        self.df = np.bincount(self.tf.indices, minlength=self.tf.shape[1])
+        self._weights: Optional[sp.csc_matrix] = None
+        self._update_stats()
+    
+    @staticmethod
+    def _tf_rows(tokenized_docs: Iterable[List[str]], vocab: Dict[str, int]) -> sp.csr_matrix:
+        """把分词后的文档转换为词频矩阵的行，新词项追加到词表末尾"""
+        indptr = [0]
+        indices: List[int] = []
+        data: List[int] = []
+        for tokens in tokenized_docs:
+            for term, count in Counter(tokens).items():
+                indices.append(vocab.setdefault(term, len(vocab)))
+                data.append(count)
+            indptr.append(len(indices))
+        
+        return sp.csr_matrix(
+            (
+                np.asarray(data, dtype=np.float64),
+                np.asarray(indices, dtype=np.int32),
+                np.asarray(indptr, dtype=np.int64)
+            ),
+            shape=(len(indptr) - 1, len(vocab))
+        )
+    
+    @classmethod
+    def from_tokenized(cls, tokenized_docs: Iterable[List[str]], **params) -> "SparseBM25":
+        """从分词后的文档构建"""
+        vocab: Dict[str, int] = {}
+        tf = cls._tf_rows(tokenized_docs, vocab)
+        return cls(tf, vocab, **params)
+    
+    def _clone(self) -> "SparseBM25":
+        """浅复制：增删文档时数组总是整体替换，只有词表需要独立的副本"""
+        index = copy.copy(self)
+        index.vocab = dict(self.vocab)
+        return index
+    
+    def append_documents(self, tokenized_docs: Iterable[List[str]]) -> "SparseBM25":
+        """返回在末尾追加了文档的新索引，只处理新增的行；原索引保持不变"""
+        index = self._clone()
+        new_rows = self._tf_rows(tokenized_docs, index.vocab)
+        n_terms = len(index.vocab)
+        # 旧矩阵按扩展后的词表宽度重新包装，列下标不变
+        old = sp.csr_matrix(
+            (self.tf.data, self.tf.indices, self.tf.indptr),
+            shape=(self.tf.shape[0], n_terms)
+        )
+        index.tf = sp.vstack([old, new_rows], format="csr")
+        
+        # 文档频率：新词项补零后加上新增行的贡献
+        df = np.zeros(n_terms, dtype=self.df.dtype)
+        df[:len(self.df)] = self.df
+        df += np.bincount(new_rows.indices, minlength=n_terms)
+        index.df = df
+        
+        new_len = np.asarray(new_rows.sum(axis=1), dtype=np.float64).ravel()
+        index.doc_len = np.concatenate([self.doc_len, new_len])
+        index.corpus_size = index.tf.shape[0]
+        index._update_stats()
+        return index
+    
+    def keep_documents(self, keep_mask: np.ndarray) -> "SparseBM25":
+        """返回只保留掩码为True的文档行的新索引；原索引保持不变
+
+        删除后不再出现在任何文档中的词项会从词表和矩阵中移除：否则这些
+        df为0的词项IDF偏大，抬高epsilon下限，评分与重新构建的索引不一致，
+        词表也会随删除无限增长。
+        """
+        index = copy.copy(self)
+        dropped = self.tf[~keep_mask]
+        df = self.df - np.bincount(dropped.indices, minlength=self.tf.shape[1])
+        tf = self.tf[keep_mask]
+        
+        live = df > 0
+        if live.all():
+            index.vocab = dict(self.vocab)
+        else:
+            # 保留的词项按原顺序重新编号，列下标单调映射，各行内仍有序
+            new_ids = np.cumsum(live) - 1
+            tf = sp.csr_matrix(
+                (tf.data, new_ids[tf.indices].astype(np.int32), tf.indptr),
+                shape=(tf.shape[0], int(live.sum()))
+            )
+            df = df[live]
+            index.vocab = {
+                term: int(new_ids[i]) for term, i in self.vocab.items() if live[i]
+            }
+        
+        index.tf = tf
+        index.df = df
+        index.doc_len = self.doc_len[keep_mask]
+        index.corpus_size = tf.shape[0]
+        index._update_stats()
+        return index
+    
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """导出为可逐个写入.npy文件的数组（不依赖pickle）
+
+        所有数组都可以直接以只读内存映射的方式使用。权重矩阵只在已经算好时
+        导出，保存时不为此计算；未导出时加载后在首次查询时再计算。
+        """
+        terms = sorted(self.vocab, key=self.vocab.__getitem__)
+        arrays = {
+            "tf_data": self.tf.data,
+            "tf_indices": self.tf.indices,
+            "tf_indptr": self.tf.indptr,
+            "df": self.df,
+            "idf": self.idf,
+            "doc_len": self.doc_len,
+            "vocab": np.asarray(terms, dtype=np.str_)
+        }
+        weights = self._weights
+        if weights is not None:
+            arrays["w_data"] = weights.data
+            arrays["w_indices"] = weights.indices
+            arrays["w_indptr"] = weights.indptr
+        return arrays
+    
+    def get_params(self) -> Dict:
+        """导出标量参数（与to_arrays配套）"""
+        return {
+            "shape": [int(n) for n in self.tf.shape],
+            "k1": self.k1,
+            "b": self.b,
+            "epsilon": self.epsilon,
+            "avgdl": self.avgdl
+        }
+    
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], params: Dict) -> "SparseBM25":
+        """从to_arrays/get_params导出的数据恢复
+
+        数组可以是只读内存映射：这里不复制也不重算，多个进程映射同一组
+        文件时由操作系统共享物理页。增删文档总是生成新数组，不会写入映射。
+        """
+        self = cls.__new__(cls)
+        self.k1 = float(params["k1"])
+        self.b = float(params["b"])
+        self.epsilon = float(params["epsilon"])
+        
+        shape = tuple(params["shape"])
+        self.vocab = {str(term): i for i, term in enumerate(arrays["vocab"])}
+        self.tf = sp.csr_matrix(
+            (arrays["tf_data"], arrays["tf_indices"], arrays["tf_indptr"]),
+            shape=shape
+        )
+        self.corpus_size = shape[0]
+        self.doc_len = arrays["doc_len"]
+        self.df = arrays["df"]
+        self.idf = arrays["idf"]
+        self.avgdl = float(params["avgdl"])
+        self._weights = None
+        if "w_data" in arrays:
+            self._weights = sp.csc_matrix(
+                (arrays["w_data"], arrays["w_indices"], arrays["w_indptr"]),
+                shape=shape
+            )
+        return self
+    
+    def _update_stats(self) -> None:
+        """根据文档频率和文档长度重算IDF与avgdl（O(V)），并使权重矩阵失效"""
+        idf = np.log(self.corpus_size - self.df + 0.5) - np.log(self.df + 0.5)
+        if len(idf):
+            eps = self.epsilon * idf.mean()
+            idf[idf < 0] = eps
+        self.idf = idf
+        self.avgdl = float(self.doc_len.mean()) if self.corpus_size else 0.0
+        self._weights = None
+    
+    @property
+    def weights(self) -> sp.csc_matrix:
+        """BM25权重矩阵（按需计算）"""
+        if self._weights is None:
+            self._weights = self._compute_weights()
+        return self._weights
+    
+    def _compute_weights(self) -> sp.csc_matrix:
+        """逐个非零项计算BM25权重"""
+        length_norm = self.k1 * (1 - self.b + self.b * self.doc_len / (self.avgdl or 1.0))
+        rows = np.repeat(np.arange(self.corpus_size), np.diff(self.tf.indptr))
+        tf = self.tf.data
+        weights = self.idf[self.tf.indices] * tf * (self.k1 + 1) / (tf + length_norm[rows])
+        return sp.csr_matrix(
+            (weights, self.tf.indices, self.tf.indptr),
+            shape=self.tf.shape
+        ).tocsc()
+    
+    def get_scores(self, query_tokens: List[str]) -> np.ndarray:
+        """计算查询对所有文档的BM25分数"""
+        term_ids = []
+        term_counts = []
+        for term, count in Counter(query_tokens).items():
+            term_id = self.vocab.get(term)
+            if term_id is not None:
+                term_ids.append(term_id)
+                term_counts.append(count)
+        
+        if not term_ids:
+            return np.zeros(self.corpus_size)
+        
+        # 重复的查询词按出现次数累加，与BM25Okapi逐词累加一致
+        return _accumulate_columns(
+            self.weights,
+            np.asarray(term_ids, dtype=np.int64),
+            np.asarray(term_counts, dtype=np.float64)
+        )
+    
+    def get_matched_terms(self, rows: np.ndarray, query_tokens: List[str]) -> List[List[str]]:
+        """从词频矩阵的行中找出各文档包含的查询词（保持查询词顺序）"""
+        known = [term for term in query_tokens if term in self.vocab]
+        if not known or not len(rows):
+            return [[] for _ in rows]
+        
+        # 只取返回结果的行和查询词的列
+        term_ids = [self.vocab[term] for term in known]
+        present = self.tf[rows][:, term_ids].toarray() > 0
+        return [[known[j] for j in np.flatnonzero(row)] for row in present]
+
 
 class BM25Service:
     """BM25关键词检索服务"""
@@ -23,20 +367,40 @@ class BM25Service:
     def __init__(self):
         self.bm25_index = None
         self.documents = []  # 存储文档内容和元数据
-        self.index_file = Path("data/bm25_index.pkl")
-        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.index_dir = Path("data/bm25_index")
+        self.manifest_file = self.index_dir / "manifest.json"
+        # 索引构建/更新使用专用线程池；查询走asyncio.to_thread的默认线程池
+        self.executor = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 4) * 2))
+        # 并行分词的常驻进程池，每个子进程只加载一次jieba词典
+        self._tokenize_pool = create_process_pool(
+            max_workers=os.cpu_count(),
+            initializer=_init_tokenize_worker
+        )
         self._index_lock = asyncio.Lock()
+        # 查询分词缓存：热门/重复查询不再重复调用jieba
+        self._tokenize_query = functools.lru_cache(maxsize=QUERY_TOKEN_CACHE_SIZE)(
+            self._tokenize_to_tuple
+        )
+        # 搜索结果缓存：键包含索引版本，索引变化后旧条目不会再命中
+        self._search_cache: "OrderedDict[tuple, Tuple[float, List[Dict]]]" = OrderedDict()
+        self._index_version = 0
+        # document_id -> 文档行号，用于按文档过滤时直接定位候选行
+        self._rows_by_doc: Dict[str, List[int]] = {}
         
         # 初始化jieba
         jieba.initialize()
         # 设置自定义词典（如果有的话）
         self._setup_custom_dict()
     
+    def close(self) -> None:
+        """关闭分词进程池和索引线程池"""
+        self._tokenize_pool.shutdown(wait=False, cancel_futures=True)
+        self.executor.shutdown(wait=False)
+    
     def _setup_custom_dict(self):
         """设置自定义词典"""
-        custom_dict_path = Path("data/custom_dict.txt")
-        if custom_dict_path.exists():
-            jieba.load_userdict(str(custom_dict_path))
+        if CUSTOM_DICT_PATH.exists():
+            jieba.load_userdict(str(CUSTOM_DICT_PATH))
             logger.info("加载自定义词典")
     
     async def build_index(self, chunks: List[TextChunk]):
@@ -46,12 +410,13 @@ class BM25Service:
                 logger.info(f"开始构建BM25索引，文档数量: {len(chunks)}")
                 
                 # 在线程池中执行分词和索引构建
-                loop = asyncio.get_event_loop()
-                await loop.run_in_executor(
+                loop = asyncio.get_running_loop()
+                documents, bm25_index = await loop.run_in_executor(
                     self.executor,
                     self._build_index_sync,
                     chunks
                 )
+                self._swap_index(documents, bm25_index, self._document_rows(documents))
                 
                 # 保存索引
                 await self._save_index()
@@ -62,61 +427,43 @@ class BM25Service:
                 logger.error(f"构建BM25索引失败: {str(e)}")
                 raise
     
-    def _build_index_sync(self, chunks: List[TextChunk]):
-        """同步构建索引"""
-        # 准备文档数据
-        self.documents = []
-        tokenized_docs = []
+    async def build_index_from_dicts(self, rows: List[Dict[str, Any]]):
+        """从原始字典构建BM25索引，整批验证为TextChunk"""
+        chunks = await asyncio.to_thread(_TEXT_CHUNK_LIST_ADAPTER.validate_python, rows)
+        await self.build_index(chunks)
+    
+    def _build_index_sync(self, chunks: List[TextChunk]) -> Tuple[List[Dict], SparseBM25]:
+        """同步构建索引，返回文档列表和索引（由调用方在事件循环中替换）"""
+        # 分词（文档多时多进程并行），稀疏矩阵在当前进程中组装
+        tokenized_docs = tokenize_many([chunk.content for chunk in chunks], self._tokenize_pool)
         
+        # 准备文档数据
+        documents = []
         for chunk in chunks:
-            # 分词
-            tokens = self._tokenize_text(chunk.content)
-            tokenized_docs.append(tokens)
-            
             # 存储文档元数据
             doc_info = {
                 "id": str(chunk.id),
                 "document_id": str(chunk.document_id),
                 "content": chunk.content,
-                "tokens": tokens,
                 "metadata": {
-                    "chunk_index": chunk.metadata.chunk_index,
-                    "page_number": chunk.metadata.page_number,
-                    "section_title": chunk.metadata.section_title,
-                    "language": chunk.metadata.language
+                    "chunk_index": chunk.metadata.get("chunk_index"),
+                    "page_number": chunk.metadata.get("page_number"),
+                    "section_title": chunk.metadata.get("section_title"),
+                    "language": chunk.metadata.get("language")
                 }
             }
-            self.documents.append(doc_info)
+            documents.append(doc_info)
         
         # 构建BM25索引
-        self.bm25_index = BM25Okapi(tokenized_docs)
+        return documents, SparseBM25.from_tokenized(tokenized_docs)
     
     def _tokenize_text(self, text: str) -> List[str]:
         """文本分词"""
-        # 使用jieba进行中文分词
-        tokens = list(jieba.cut(text, cut_all=False))
-        
-        # 过滤停用词和短词
-        filtered_tokens = []
-        for token in tokens:
-            token = token.strip()
-            if (len(token) > 1 and 
-                not token.isspace() and 
-                not self._is_stopword(token)):
-                filtered_tokens.append(token)
-        
-        return filtered_tokens
-    
-    def _is_stopword(self, word: str) -> bool:
-        """判断是否为停用词"""
-        # 简单的停用词列表
-        stopwords = {
-            '的', '了', '在', '是', '我', '有', '和', '就', '不', '人',
-            '都', '一', '一个', '上', '也', '很', '到', '说', '要', '去',
-            '你', '会', '着', '没有', '看', '好', '自己', '这', '那', '他',
-            '她', '它', '们', '这个', '那个', '什么', '怎么', '为什么'
-        }
-        return word in stopwords
+        return _tokenize(text)
+    
+    def _tokenize_to_tuple(self, text: str) -> Tuple[str, ...]:
+        """文本分词，返回不可变元组（供查询缓存使用）"""
+        return tuple(self._tokenize_text(text))
     
     async def search(
         self,
@@ -131,21 +478,38 @@ class BM25Service:
                 logger.warning("BM25索引未构建")
                 return []
         
+        # 搜索在线程中执行且不持有索引锁：一次性取出相互一致的文档列表、索引和行号映射，
+        # 增删文档只会整体替换它们，不会修改这里取到的对象
+        documents, bm25_index, rows_by_doc = self.documents, self.bm25_index, self._rows_by_doc
+        
         try:
-            # 查询分词
-            query_tokens = self._tokenize_text(query)
-            if not query_tokens:
+            # 查询分词（带缓存）
+            token_key = self._tokenize_query(query)
+            if not token_key:
                 return []
             
-            # 在线程池中执行搜索
-            loop = asyncio.get_event_loop()
-            results = await loop.run_in_executor(
-                self.executor,
+            # 分词结果完全决定搜索结果，相同分词的查询共享缓存
+            cache_key = (
+                token_key,
+                limit,
+                tuple(sorted(document_ids)) if document_ids else None,
+                self._index_version
+            )
+            cached = self._get_cached_results(cache_key)
+            if cached is not None:
+                return cached
+            
+            # 在线程中执行搜索（评分在NumPy/SciPy中进行，会释放GIL）
+            results = await asyncio.to_thread(
                 self._search_sync,
-                query_tokens,
+                documents,
+                bm25_index,
+                rows_by_doc,
+                list(token_key),
                 limit,
                 document_ids
             )
+            self._cache_results(cache_key, results)
             
             logger.info(f"BM25搜索完成，查询: '{query}', 返回 {len(results)} 个结果")
             return results
@@ -154,84 +518,167 @@ class BM25Service:
             logger.error(f"BM25搜索失败: {str(e)}")
             return []
     
+    def _get_cached_results(self, key: tuple) -> Optional[List[Dict]]:
+        """读取搜索结果缓存，返回副本（调用方会修改结果字典）"""
+        entry = self._search_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, results = entry
+        if expires_at <= time.monotonic():
+            del self._search_cache[key]
+            return None
+        self._search_cache.move_to_end(key)
+        return [dict(result) for result in results]
+    
+    def _cache_results(self, key: tuple, results: List[Dict]) -> None:
+        """写入搜索结果缓存，超出容量时淘汰最久未使用的条目"""
+        if key[-1] != self._index_version:
+            # 搜索期间索引已变化，结果已过期
+            return
+        self._search_cache[key] = (
+            time.monotonic() + SEARCH_CACHE_TTL,
+            [dict(result) for result in results]
+        )
+        self._search_cache.move_to_end(key)
+        while len(self._search_cache) > SEARCH_CACHE_SIZE:
+            self._search_cache.popitem(last=False)
+    
+    def _invalidate_search_cache(self) -> None:
+        """索引变化后使搜索结果缓存失效"""
+        self._index_version += 1
+        self._search_cache.clear()
+    
+    def _swap_index(
+        self,
+        documents: List[Dict],
+        bm25_index: Optional[SparseBM25],
+        rows_by_doc: Dict[str, List[int]]
+    ) -> None:
+        """一次性替换文档列表、索引和行号映射，并使搜索结果缓存失效
+
+        三者只整体替换、从不原地修改；替换过程中不让出事件循环，
+        搜索取到的始终是相互一致的一组。
+        """
+        self.documents = documents
+        self.bm25_index = bm25_index
+        self._rows_by_doc = rows_by_doc
+        self._invalidate_search_cache()
+    
+    @staticmethod
+    def _document_rows(
+        documents: List[Dict],
+        start: int = 0,
+        base: Optional[Dict[str, List[int]]] = None
+    ) -> Dict[str, List[int]]:
+        """建立document_id到行号的映射
+
+        给出base时在其副本上只追加start之后的新行，base本身及其中的列表都不修改。
+        """
+        new_rows: Dict[str, List[int]] = {}
+        for row in range(start, len(documents)):
+            new_rows.setdefault(documents[row]["document_id"], []).append(row)
+        
+        rows_by_doc = dict(base) if base else {}
+        for doc_id, rows in new_rows.items():
+            rows_by_doc[doc_id] = rows_by_doc.get(doc_id, []) + rows
+        return rows_by_doc
+    
+    @staticmethod
+    def _rows_for_documents(
+        rows_by_doc: Dict[str, List[int]],
+        document_ids: List[str]
+    ) -> np.ndarray:
+        """指定文档的全部行号（升序、去重）"""
+        row_lists = [
+            rows_by_doc[doc_id] for doc_id in set(document_ids)
+            if doc_id in rows_by_doc
+        ]
+        if not row_lists:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(row_lists))
+    
     def _search_sync(
         self,
+        documents: List[Dict],
+        bm25_index: SparseBM25,
+        rows_by_doc: Dict[str, List[int]],
         query_tokens: List[str],
         limit: int,
         document_ids: Optional[List[str]] = None
     ) -> List[Dict]:
-        """同步执行搜索"""
-        # 获取BM25分数
-        scores = self.bm25_index.get_scores(query_tokens)
+        """同步执行搜索，只使用调用方取出的文档列表、索引和行号映射"""
+        if limit <= 0:
+            return []
         
-        # 创建结果列表
-        results = []
-        for i, score in enumerate(scores):
-            if i >= len(self.documents):
-                continue
-                
-            doc = self.documents[i]
-            
-            # 如果指定了文档ID过滤
-            if document_ids and doc["document_id"] not in document_ids:
-                continue
-            
-            if score > 0:  # 只返回有相关性的结果
-                result = {
-                    "id": doc["id"],
-                    "document_id": doc["document_id"],
-                    "content": doc["content"],
-                    "score": float(score),
-                    "metadata": doc["metadata"],
-                    "matched_terms": self._get_matched_terms(query_tokens, doc["tokens"])
-                }
-                results.append(result)
+        # 获取BM25分数（索引的行与documents一一对应）
+        scores = np.asarray(bm25_index.get_scores(query_tokens), dtype=np.float64)
+        
+        # 只保留有相关性的文档；指定了文档ID过滤时只检查这些文档的行
+        if document_ids:
+            rows = self._rows_for_documents(rows_by_doc, document_ids)
+            candidates = rows[scores[rows] > 0]
+        else:
+            candidates = np.flatnonzero(scores > 0)
+        
+        # 部分选择前limit个，再仅对它们排序
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+            candidates.sort()
+        top = candidates[np.argsort(-scores[candidates], kind='stable')]
         
-        # 按分数排序并限制结果数量
-        results.sort(key=lambda x: x["score"], reverse=True)
-        return results[:limit]
-    
-    def _get_matched_terms(self, query_tokens: List[str], doc_tokens: List[str]) -> List[str]:
-        """获取匹配的词项"""
-        doc_token_set = set(doc_tokens)
-        matched = []
-        for token in query_tokens:
-            if token in doc_token_set:
-                matched.append(token)
-        return matched
+        # 只为最终结果构建字典，匹配词也只对这些行计算
+        matched_terms = bm25_index.get_matched_terms(top, query_tokens)
+        results = []
+        for i, matched in zip(top, matched_terms):
+            doc = documents[i]
+            results.append({
+                "id": doc["id"],
+                "document_id": doc["document_id"],
+                "content": doc["content"],
+                "score": float(scores[i]),
+                "metadata": doc["metadata"],
+                "matched_terms": matched
+            })
+        return results
     
     async def add_documents(self, chunks: List[TextChunk]):
         """增量添加文档"""
         async with self._index_lock:
             try:
+                # 在线程池中分词，避免阻塞事件循环
+                loop = asyncio.get_running_loop()
+                new_tokenized_docs = await loop.run_in_executor(
+                    self.executor,
+                    tokenize_many,
+                    [chunk.content for chunk in chunks],
+                    self._tokenize_pool
+                )
+                
                 # 处理新文档
                 new_docs = []
-                new_tokenized_docs = []
-                
                 for chunk in chunks:
-                    tokens = self._tokenize_text(chunk.content)
-                    new_tokenized_docs.append(tokens)
-                    
                     doc_info = {
                         "id": str(chunk.id),
                         "document_id": str(chunk.document_id),
                         "content": chunk.content,
-                        "tokens": tokens,
                         "metadata": {
-                            "chunk_index": chunk.metadata.chunk_index,
-                            "page_number": chunk.metadata.page_number,
-                            "section_title": chunk.metadata.section_title,
-                            "language": chunk.metadata.language
+                            "chunk_index": chunk.metadata.get("chunk_index"),
+                            "page_number": chunk.metadata.get("page_number"),
+                            "section_title": chunk.metadata.get("section_title"),
+                            "language": chunk.metadata.get("language")
                         }
                     }
                     new_docs.append(doc_info)
                 
-                # 更新文档列表
-                self.documents.extend(new_docs)
-                
-                # 重建索引（BM25Okapi不支持增量更新）
-                all_tokenized_docs = [doc["tokens"] for doc in self.documents]
-                self.bm25_index = BM25Okapi(all_tokenized_docs)
+                # 先构建新的文档列表、索引和行号映射，再一次性替换
+                start = len(self.documents)
+                documents = self.documents + new_docs
+                if self.bm25_index is None:
+                    bm25_index = SparseBM25.from_tokenized(new_tokenized_docs)
+                else:
+                    bm25_index = self.bm25_index.append_documents(new_tokenized_docs)
+                rows_by_doc = self._document_rows(documents, start, self._rows_by_doc)
+                self._swap_index(documents, bm25_index, rows_by_doc)
                 
                 # 保存索引
                 await self._save_index()
@@ -247,21 +694,24 @@ class BM25Service:
         async with self._index_lock:
             try:
                 # 过滤掉要删除的文档
-                original_count = len(self.documents)
-                self.documents = [
-                    doc for doc in self.documents 
-                    if doc["document_id"] not in document_ids
-                ]
-                
-                removed_count = original_count - len(self.documents)
+                removed_ids = set(document_ids)
+                keep_mask = np.fromiter(
+                    (doc["document_id"] not in removed_ids for doc in self.documents),
+                    dtype=bool,
+                    count=len(self.documents)
+                )
+                removed_count = len(self.documents) - int(keep_mask.sum())
                 
                 if removed_count > 0:
-                    # 重建索引
-                    if self.documents:
-                        all_tokenized_docs = [doc["tokens"] for doc in self.documents]
-                        self.bm25_index = BM25Okapi(all_tokenized_docs)
+                    # 先构建新的文档列表和索引（从词频矩阵中删除对应的行），再一次性替换
+                    documents = [
+                        doc for doc, keep in zip(self.documents, keep_mask) if keep
+                    ]
+                    if documents and self.bm25_index is not None:
+                        bm25_index = self.bm25_index.keep_documents(keep_mask)
                     else:
-                        self.bm25_index = None
+                        bm25_index = None
+                    self._swap_index(documents, bm25_index, self._document_rows(documents))
                     
                     # 保存索引
                     await self._save_index()
@@ -272,38 +722,114 @@ class BM25Service:
                 logger.error(f"删除文档失败: {str(e)}")
                 raise
     
+    def _remove_stale_generations(self, keep: Optional[str] = None) -> None:
+        """删除不再被清单引用的旧文件
+
+        其他进程可能仍映射着旧文件；POSIX下删除目录项不影响已有映射，
+        删除失败（如Windows上文件被占用）时留到下次保存再清理。
+        """
+        for path in self.index_dir.iterdir():
+            if path == self.manifest_file or (keep and path.name.startswith(f"{keep}.")):
+                continue
+            if path.suffix in (".npy", ".json", ".npz"):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+    
     async def _save_index(self):
-        """保存索引到文件"""
+        """保存索引到文件
+
+        在索引线程池中导出和写入，不阻塞事件循环；调用方持有索引锁，
+        保存的是当前这一组文档列表和索引（它们只整体替换，不会被原地修改）。
+        """
         try:
-            self.index_file.parent.mkdir(parents=True, exist_ok=True)
-            
-            index_data = {
-                "bm25_index": self.bm25_index,
-                "documents": self.documents
-            }
-            
-            with open(self.index_file, 'wb') as f:
-                pickle.dump(index_data, f)
-                
-            logger.info("BM25索引已保存")
-            
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(
+                self.executor,
+                self._save_index_sync,
+                self.documents,
+                self.bm25_index
+            )
         except Exception as e:
             logger.error(f"保存BM25索引失败: {str(e)}")
     
+    def _save_index_sync(self, documents: List[Dict], bm25_index: Optional[SparseBM25]) -> None:
+        """同步保存索引
+
+        每个数组写入一个.npy文件（不使用pickle），文档元数据写入JSON。
+        新一代文件全部写完后再原子替换清单文件，读取方不会看到写了一半
+        的索引，已映射旧文件的进程也不受影响。
+        """
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        
+        if bm25_index is None:
+            self.manifest_file.unlink(missing_ok=True)
+            self._remove_stale_generations()
+            logger.info("BM25索引为空，已删除索引文件")
+            return
+        
+        generation = f"{time.time_ns():x}"
+        arrays = bm25_index.to_arrays()
+        for name, array in arrays.items():
+            np.save(self.index_dir / f"{generation}.{name}.npy", array)
+        (self.index_dir / f"{generation}.docs.json").write_bytes(orjson.dumps(documents))
+        
+        manifest = {
+            "magic": INDEX_FORMAT_MAGIC,
+            "version": INDEX_FORMAT_VERSION,
+            "generation": generation,
+            "arrays": list(arrays),
+            "document_count": len(documents),
+            **bm25_index.get_params()
+        }
+        tmp_manifest = self.manifest_file.with_suffix(".tmp")
+        tmp_manifest.write_bytes(orjson.dumps(manifest))
+        os.replace(tmp_manifest, self.manifest_file)
+        
+        self._remove_stale_generations(keep=generation)
+        logger.info("BM25索引已保存")
+    
     async def _load_index(self):
-        """从文件加载索引"""
+        """从文件加载索引
+
+        数组以只读内存映射方式打开，多个工作进程加载同一索引时共享物理内存，
+        启动时也无需读取和反序列化整个索引。
+        """
         try:
-            if self.index_file.exists():
-                with open(self.index_file, 'rb') as f:
-                    index_data = pickle.load(f)
-                
-                self.bm25_index = index_data.get("bm25_index")
-                self.documents = index_data.get("documents", [])
-                
-                logger.info("BM25索引已加载")
-            else:
+            if not self.manifest_file.exists():
                 logger.info("BM25索引文件不存在")
-                
+                return
+            
+            manifest = orjson.loads(self.manifest_file.read_bytes())
+            magic = manifest.get("magic")
+            version = manifest.get("version")
+            if magic != INDEX_FORMAT_MAGIC or version != INDEX_FORMAT_VERSION:
+                logger.warning(
+                    f"BM25索引文件格式不兼容（{magic} v{version}），需要重新构建索引"
+                )
+                return
+            
+            generation = manifest["generation"]
+            arrays = {
+                name: np.load(
+                    self.index_dir / f"{generation}.{name}.npy",
+                    mmap_mode="r",
+                    allow_pickle=False
+                )
+                for name in manifest["arrays"]
+            }
+            bm25_index = SparseBM25.from_arrays(arrays, manifest)
+            
+            documents = orjson.loads((self.index_dir / f"{generation}.docs.json").read_bytes())
+            if len(documents) != bm25_index.corpus_size:
+                logger.warning("BM25索引与文档元数据不一致，需要重新构建索引")
+                return
+            
+            self._swap_index(documents, bm25_index, self._document_rows(documents))
+            
+            logger.info("BM25索引已加载")
+            
         except Exception as e:
             logger.error(f"加载BM25索引失败: {str(e)}")
     
@@ -315,6 +841,6 @@ class BM25Service:
         return {
             "document_count": len(self.documents) if self.documents else 0,
             "index_exists": self.bm25_index is not None,
-            "index_file_exists": self.index_file.exists(),
-            "total_tokens": sum(len(doc["tokens"]) for doc in self.documents) if self.documents else 0
+            "index_file_exists": self.manifest_file.exists(),
+            "total_tokens": int(self.bm25_index.doc_len.sum()) if self.bm25_index is not None else 0
         }
\ No newline at end of file
@@ -2,13 +2,18 @@
 
 import logging
 import asyncio
+import os
+import queue
 import sqlite3
-import json
 import hashlib
 import time
-from typing import Optional, Dict, Any, List
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, suppress
+from typing import Callable, FrozenSet, Iterator, Optional, Dict, Any, List, Set, Tuple, TypeVar
 from pathlib import Path
-from datetime import datetime, timezone
+
+from pydantic import TypeAdapter
 
 from src.config.settings import get_settings
 from src.models.cache import CacheEntry, QueryCache, CacheStats, CacheConfig
@@ -17,6 +22,100 @@ from src.models.search import QAResponse
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+T = TypeVar("T")
+
+# 连接池大小：长期持有的连接保留各自的页缓存，避免每次操作重新打开数据库
+CACHE_POOL_SIZE = min(8, os.cpu_count() or 1)
+
+# 缓存表结构版本（记录在PRAGMA user_version中）
+# v1：created_at/last_accessed改为Unix时间戳（REAL），过期判断在SQL中完成
+# v2：新增query_cache_docs表记录缓存条目引用的文档，按文档失效走索引
+# v3：写入时计算expires_at，过期清理和LRU驱逐都走索引范围扫描
+# v4：response_data改为BLOB，直接存取UTF-8编码的JSON字节
+# v5：移除query_cache.document_ids（JSON字符串），文档引用只记录在query_cache_docs中
+CACHE_SCHEMA_VERSION = 5
+
+# 统计操作与cache_stats表中计数列的对应关系
+_STAT_COLUMNS = {
+    'hit': 'hit_count',
+    'miss': 'miss_count',
+    'eviction': 'eviction_count',
+    'expired': 'expired_count',
+}
+
+# 响应序列化器：直接输出JSON字节，省去str中转
+_QA_RESPONSE_ADAPTER = TypeAdapter(QAResponse)
+
+# 进程内缓存层的容量：热点查询命中时不访问SQLite
+MEMORY_CACHE_SIZE = 1024
+
+# 命中/未命中等统计先在内存中累计，按时间间隔或累计次数批量写入数据库
+STATS_FLUSH_INTERVAL = 5.0
+STATS_FLUSH_THRESHOLD = 256
+
+# 每个连接建立后执行的PRAGMA：WAL允许读写并发，NORMAL同步在WAL下
+# 只在检查点时fsync；其余为临时表、页缓存（64MB）、内存映射和锁等待设置，
+# 外键约束用于删除缓存条目时级联删除其文档引用
+_CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=10737418240",
+    "PRAGMA busy_timeout=3000",
+    "PRAGMA foreign_keys=ON",
+)
+
+# 每个连接的预编译语句缓存容量（sqlite3默认128）
+CACHE_STATEMENT_CACHE_SIZE = 256
+
+# 运行期SQL语句：模块级常量保证每次执行使用同一字符串，命中连接的预编译语句缓存
+_SQL_GET = '''
+    SELECT response_data, expires_at
+    FROM query_cache
+    WHERE query_hash = ? AND expires_at > ?
+'''
+_SQL_UPSERT = '''
+    INSERT OR REPLACE INTO query_cache
+    (query_hash, query_text, response_data, created_at, ttl, expires_at, hit_count, last_accessed)
+    VALUES (?, ?, ?, ?, ?, ?, 0, ?)
+'''
+_SQL_INSERT_DOC_REF = '''
+    INSERT OR IGNORE INTO query_cache_docs (document_id, query_hash)
+    VALUES (?, ?)
+'''
+_SQL_INVALIDATE = '''
+    DELETE FROM query_cache
+    WHERE query_hash IN (
+        SELECT query_hash FROM query_cache_docs WHERE document_id = ?
+    )
+'''
+_SQL_DELETE_EXPIRED = 'DELETE FROM query_cache WHERE expires_at <= ?'
+_SQL_COUNT = 'SELECT COUNT(*) FROM query_cache'
+_SQL_EVICT = '''
+    DELETE FROM query_cache
+    WHERE query_hash IN (
+        SELECT query_hash FROM query_cache
+        ORDER BY last_accessed ASC
+        LIMIT ?
+    )
+'''
+_SQL_GET_STATS = 'SELECT * FROM cache_stats WHERE id = 1'
+_SQL_UPDATE_STATS = '''
+    UPDATE cache_stats
+    SET hit_count = hit_count + ?,
+        miss_count = miss_count + ?,
+        eviction_count = eviction_count + ?,
+        expired_count = expired_count + ?,
+        last_updated = ?
+    WHERE id = 1
+'''
+_SQL_RECORD_ACCESS = '''
+    UPDATE query_cache
+    SET hit_count = hit_count + ?, last_accessed = ?
+    WHERE query_hash = ?
+'''
+
 
 class CacheService:
     """SQLite缓存服务"""
@@ -32,6 +131,109 @@ class CacheService:
         
         self._db_lock = asyncio.Lock()
         self._initialized = False
+        
+        # 连接会在线程池的不同线程中使用，由连接池保证同一时刻只有一个线程持有
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(CACHE_POOL_SIZE):
+            self._pool.put(self._connect())
+        
+        # 专用线程：SQLite同一时刻只允许一个写入者，写操作由单个写线程串行执行，
+        # 读操作使用独立的读线程池；都不占用事件循环的默认线程池
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-writer")
+        self._readers = ThreadPoolExecutor(
+            max_workers=CACHE_POOL_SIZE, thread_name_prefix="cache-reader"
+        )
+        # 已提交到线程池、尚未完成的数据库操作；关闭后不再接受新操作
+        self._inflight: Set[asyncio.Future] = set()
+        self._closed = False
+        
+        # 待写入的统计增量和缓存条目访问记录（query_hash -> [命中次数, 最后访问时间]）
+        self._stat_deltas = dict.fromkeys(_STAT_COLUMNS, 0)
+        self._pending_accesses: Dict[str, List[Any]] = {}
+        self._pending_count = 0
+        self._flush_task: Optional[asyncio.Task] = None
+        self._threshold_flush: Optional[asyncio.Task] = None
+        
+        # 进程内LRU缓存层（query_hash -> (过期时间, 响应, 引用的文档ID)），
+        # 只在事件循环线程中访问；失效时递增版本号，丢弃失效前发起的回填
+        self._memory: "OrderedDict[str, Tuple[float, QAResponse, FrozenSet[str]]]" = OrderedDict()
+        self._memory_version = 0
+    
+    def _connect(self) -> sqlite3.Connection:
+        """打开数据库连接并应用PRAGMA设置"""
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            cached_statements=CACHE_STATEMENT_CACHE_SIZE
+        )
+        for pragma in _CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    @contextmanager
+    def _acquire(self) -> Iterator[sqlite3.Connection]:
+        """从连接池借出连接，用完归还；出错时回滚未提交的事务"""
+        conn = self._pool.get()
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.put(conn)
+    
+    def _submit(self, executor: ThreadPoolExecutor, func: Callable[[], T]) -> "asyncio.Future[T]":
+        """把数据库操作提交到线程池，并记录到未完成操作中"""
+        if self._closed:
+            raise RuntimeError("缓存服务已关闭")
+        future = asyncio.get_running_loop().run_in_executor(executor, func)
+        self._inflight.add(future)
+        future.add_done_callback(self._inflight.discard)
+        return future
+    
+    async def _run_write(self, func: Callable[[], T]) -> T:
+        """在写线程中执行数据库写操作"""
+        return await self._submit(self._writer, func)
+    
+    async def _run_read(self, func: Callable[[], T]) -> T:
+        """在读线程池中执行只读数据库操作"""
+        return await self._submit(self._readers, func)
+    
+    async def close(self) -> None:
+        """写入剩余统计，关闭数据库线程和连接池中的所有连接
+
+        先停止后台写入并等待已提交的数据库操作完成，之后的操作直接报错，
+        线程池关闭时所有连接都已归还到连接池。
+        """
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._flush_task
+            self._flush_task = None
+        if self._threshold_flush is not None:
+            await asyncio.gather(self._threshold_flush, return_exceptions=True)
+            self._threshold_flush = None
+        
+        self._closed = True
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        
+        deltas, accesses = self._take_pending_stats()
+        if any(deltas.values()) or accesses:
+            self._writer.submit(self._write_stats_sync, deltas, accesses)
+        # 等待写线程和读线程池退出（包括调用方已取消等待、仍在执行的操作），不阻塞事件循环
+        await asyncio.to_thread(self._shutdown_executors)
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+    
+    def _shutdown_executors(self) -> None:
+        """关闭写线程和读线程池，等待其中的操作执行完毕"""
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
     
     async def initialize(self):
         """初始化缓存数据库"""
@@ -41,6 +243,7 @@ class CacheService:
                     try:
                         await self._create_tables()
                         await self._cleanup_expired_cache()
+                        self._flush_task = asyncio.create_task(self._flush_stats_periodically())
                         self._initialized = True
                         logger.info("缓存服务初始化完成")
                         
@@ -51,23 +254,52 @@ class CacheService:
     async def _create_tables(self):
         """创建缓存表"""
         def create_tables_sync():
-            conn = sqlite3.connect(self.db_path)
-            try:
+            with self._acquire() as conn:
                 cursor = conn.cursor()
                 
+                # 旧版本的表结构不兼容；缓存内容可以丢弃，直接重建查询缓存表
+                schema_version = cursor.execute('PRAGMA user_version').fetchone()[0]
+                if schema_version < CACHE_SCHEMA_VERSION:
+                    cursor.execute('DROP TABLE IF EXISTS query_cache_docs')
+                    cursor.execute('DROP TABLE IF EXISTS query_cache')
+                
                 # 创建查询缓存表
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS query_cache (
                         query_hash TEXT PRIMARY KEY,
                         query_text TEXT NOT NULL,
-                        response_data TEXT NOT NULL,
-                        document_ids TEXT NOT NULL,
-                        created_at TIMESTAMP NOT NULL,
+                        response_data BLOB NOT NULL,
+                        created_at REAL NOT NULL,
                         ttl INTEGER NOT NULL,
+                        expires_at REAL NOT NULL,
                         hit_count INTEGER DEFAULT 0,
-                        last_accessed TIMESTAMP NOT NULL
+                        last_accessed REAL NOT NULL
                     )
                 ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_query_cache_expires_at
+                    ON query_cache(expires_at)
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_query_cache_last_accessed
+                    ON query_cache(last_accessed)
+                ''')
+                
+                # 缓存条目与文档的引用关系：主键按document_id在前，按文档失效时
+                # 直接走主键范围查找；query_hash索引供级联删除使用
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS query_cache_docs (
+                        document_id TEXT NOT NULL,
+                        query_hash TEXT NOT NULL
+                            REFERENCES query_cache(query_hash) ON DELETE CASCADE,
+                        PRIMARY KEY (document_id, query_hash)
+                    ) WITHOUT ROWID
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_query_cache_docs_hash
+                    ON query_cache_docs(query_hash)
+                ''')
+                cursor.execute(f'PRAGMA user_version = {CACHE_SCHEMA_VERSION}')
                 
                 # 创建缓存统计表
                 cursor.execute('''
@@ -78,7 +310,7 @@ class CacheService:
                         miss_count INTEGER DEFAULT 0,
                         eviction_count INTEGER DEFAULT 0,
                         expired_count INTEGER DEFAULT 0,
-                        last_updated TIMESTAMP NOT NULL
+                        last_updated REAL NOT NULL
                     )
                 ''')
                 
@@ -86,24 +318,20 @@ class CacheService:
                 cursor.execute('''
                     INSERT OR IGNORE INTO cache_stats (id, last_updated)
                     VALUES (1, ?)
-                ''', (datetime.now(timezone.utc),))
+                ''', (time.time(),))
                 
                 conn.commit()
-                
-            finally:
-                conn.close()
         
-        # 在线程池中执行数据库操作
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, create_tables_sync)
+        await self._run_write(create_tables_sync)
     
     def _generate_query_hash(self, query_text: str, document_ids: List[str] = None) -> str:
-        """生成查询哈希值"""
-        content = query_text
-        if document_ids:
-            content += "|" + "|".join(sorted(document_ids))
-        
-        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+        """生成查询哈希值
+
+        缓存键不需要密码学强度，使用比SHA-256更快的BLAKE2b；
+        摘要长度保持32字节，与QueryCache.query_hash的格式一致。
+        """
+        content = "|".join([query_text, *sorted(document_ids or ())])
+        return hashlib.blake2b(content.encode('utf-8'), digest_size=32).hexdigest()
     
     async def get_cached_result(self, query_text: str, document_ids: List[str] = None) -> Optional[QAResponse]:
         """获取缓存的查询结果"""
@@ -112,61 +340,35 @@ class CacheService:
         try:
             query_hash = self._generate_query_hash(query_text, document_ids)
             
-            def get_cache_sync() -> Optional[Dict]:
-                conn = sqlite3.connect(self.db_path)
-                try:
-                    cursor = conn.cursor()
-                    
-                    # 查询缓存
-                    cursor.execute('''
-                        SELECT response_data, created_at, ttl, hit_count
-                        FROM query_cache
-                        WHERE query_hash = ?
-                    ''', (query_hash,))
-                    
-                    result = cursor.fetchone()
-                    if not result:
-                        return None
-                    
-                    response_data, created_at, ttl, hit_count = result
-                    
-                    # 检查是否过期
-                    created_time = datetime.fromisoformat(created_at)
-                    if (datetime.now(timezone.utc) - created_time).total_seconds() > ttl:
-                        # 删除过期缓存
-                        cursor.execute('DELETE FROM query_cache WHERE query_hash = ?', (query_hash,))
-                        conn.commit()
-                        return None
-                    
-                    # 更新访问统计
-                    cursor.execute('''
-                        UPDATE query_cache
-                        SET hit_count = hit_count + 1, last_accessed = ?
-                        WHERE query_hash = ?
-                    ''', (datetime.now(timezone.utc), query_hash))
-                    
-                    conn.commit()
-                    
-                    return {
-                        'response_data': response_data,
-                        'hit_count': hit_count + 1
-                    }
-                    
-                finally:
-                    conn.close()
+            # 先查进程内缓存层
+            response = self._get_from_memory(query_hash)
+            if response is not None:
+                self._record_access(query_hash)
+                await self._update_stats('hit')
+                logger.info(f"缓存命中: {query_hash[:8]}...")
+                return response
+            
+            def get_cache_sync() -> Optional[Tuple[bytes, float]]:
+                with self._acquire() as conn:
+                    # 单条只读查询，过期判断在SQL中完成；过期条目由定期清理删除
+                    return conn.execute(_SQL_GET, (query_hash, time.time())).fetchone()
             
-            # 在线程池中执行数据库操作
-            loop = asyncio.get_event_loop()
-            cache_data = await loop.run_in_executor(None, get_cache_sync)
+            memory_version = self._memory_version
+            row = await self._run_read(get_cache_sync)
             
-            if cache_data:
+            if row is not None:
+                response_data, expires_at = row
+                
                 # 更新统计
+                self._record_access(query_hash)
                 await self._update_stats('hit')
                 
-                # 反序列化响应数据
-                response_dict = json.loads(cache_data['response_data'])
-                response = QAResponse(**response_dict)
-                response.cached = True
+                # 反序列化响应数据：pydantic-core直接解析BLOB字节，一次完成JSON解析和嵌套Citation构建，
+                # 比orjson.loads加逐层model_construct更快，且datetime字段能正确还原
+                response = QAResponse.model_validate_json(response_data)
+                # 缓存标记由内部设置，绕过validate_assignment的整模型重新验证
+                object.__setattr__(response, 'cached', True)
+                self._put_in_memory(query_hash, expires_at, response, document_ids, memory_version)
                 
                 logger.info(f"缓存命中: {query_hash[:8]}...")
                 return response
@@ -192,48 +394,52 @@ class CacheService:
         try:
             query_hash = self._generate_query_hash(query_text, document_ids)
             ttl = ttl or self.config.default_ttl
+            memory_version = self._memory_version
+            now = time.time()
+            expires_at = now + ttl
             
-            def cache_result_sync() -> bool:
-                conn = sqlite3.connect(self.db_path)
-                try:
+            def cache_result_sync() -> int:
+                with self._acquire() as conn:
                     cursor = conn.cursor()
                     
-                    # 序列化响应数据
-                    response_dict = result.model_dump()
-                    response_data = json.dumps(response_dict, ensure_ascii=False)
+                    # 序列化响应数据（pydantic-core直接输出JSON字节，可处理datetime字段）
+                    response_data = _QA_RESPONSE_ADAPTER.dump_json(result)
                     
                     # 插入或更新缓存
-                    cursor.execute('''
-                        INSERT OR REPLACE INTO query_cache
-                        (query_hash, query_text, response_data, document_ids, created_at, ttl, hit_count, last_accessed)
-                        VALUES (?, ?, ?, ?, ?, ?, 0, ?)
-                    ''', (
+                    cursor.execute(_SQL_UPSERT, (
                         query_hash,
                         query_text,
                         response_data,
-                        json.dumps(document_ids or []),
-                        datetime.now(timezone.utc),
+                        now,
                         ttl,
-                        datetime.now(timezone.utc)
+                        expires_at,
+                        now
                     ))
                     
-                    conn.commit()
-                    return True
+                    # 记录文档引用（相同query_hash对应相同的文档集合）
+                    if document_ids:
+                        cursor.executemany(
+                            _SQL_INSERT_DOC_REF,
+                            [(document_id, query_hash) for document_id in set(document_ids)]
+                        )
                     
-                finally:
-                    conn.close()
+                    # 超出容量时在同一事务中驱逐旧条目，只提交一次
+                    evicted_count = self._evict_excess_sync(conn)
+                    conn.commit()
+                    return evicted_count
             
-            # 在线程池中执行数据库操作
-            loop = asyncio.get_event_loop()
-            success = await loop.run_in_executor(None, cache_result_sync)
+            evicted_count = await self._run_write(cache_result_sync)
+            # 缓存层持有副本，避免调用方之后修改原响应
+            cached_response = result.model_copy()
+            object.__setattr__(cached_response, 'cached', True)
+            self._put_in_memory(query_hash, expires_at, cached_response, document_ids, memory_version)
+            logger.info(f"结果已缓存: {query_hash[:8]}...")
             
-            if success:
-                logger.info(f"结果已缓存: {query_hash[:8]}...")
-                
-                # 检查是否需要清理缓存
-                await self._check_and_cleanup()
+            if evicted_count > 0:
+                await self._update_stats('eviction', evicted_count)
+                logger.info(f"驱逐了 {evicted_count} 个旧缓存条目")
             
-            return success
+            return True
             
         except Exception as e:
             logger.error(f"缓存结果失败: {str(e)}")
@@ -244,38 +450,22 @@ class CacheService:
         await self.initialize()
         
         try:
+            # 先清理进程内缓存层，并使进行中的回填作废
+            self._memory_version += 1
+            for query_hash in [
+                key for key, (_, _, doc_ids) in self._memory.items() if document_id in doc_ids
+            ]:
+                del self._memory[query_hash]
+            
             def invalidate_sync() -> int:
-                conn = sqlite3.connect(self.db_path)
-                try:
-                    cursor = conn.cursor()
-                    
-                    # 查找包含指定文档ID的缓存
-                    cursor.execute('SELECT query_hash, document_ids FROM query_cache')
-                    rows = cursor.fetchall()
-                    
-                    to_delete = []
-                    for query_hash, document_ids_json in rows:
-                        try:
-                            document_ids = json.loads(document_ids_json)
-                            if document_id in document_ids:
-                                to_delete.append(query_hash)
-                        except json.JSONDecodeError:
-                            continue
-                    
-                    # 删除相关缓存
-                    if to_delete:
-                        placeholders = ','.join(['?'] * len(to_delete))
-                        cursor.execute(f'DELETE FROM query_cache WHERE query_hash IN ({placeholders})', to_delete)
-                        conn.commit()
-                    
-                    return len(to_delete)
+                with self._acquire() as conn:
+                    # 通过引用表的主键查找相关缓存，引用记录随缓存条目级联删除
+                    cursor = conn.execute(_SQL_INVALIDATE, (document_id,))
+                    conn.commit()
                     
-                finally:
-                    conn.close()
+                    return cursor.rowcount
             
-            # 在线程池中执行数据库操作
-            loop = asyncio.get_event_loop()
-            deleted_count = await loop.run_in_executor(None, invalidate_sync)
+            deleted_count = await self._run_write(invalidate_sync)
             
             logger.info(f"文档 {document_id} 相关的 {deleted_count} 个缓存已失效")
             return True
@@ -290,16 +480,15 @@ class CacheService:
         
         try:
             def get_stats_sync() -> Dict:
-                conn = sqlite3.connect(self.db_path)
-                try:
+                with self._acquire() as conn:
                     cursor = conn.cursor()
                     
                     # 获取统计信息
-                    cursor.execute('SELECT * FROM cache_stats WHERE id = 1')
+                    cursor.execute(_SQL_GET_STATS)
                     stats_row = cursor.fetchone()
                     
                     # 获取当前缓存条目数
-                    cursor.execute('SELECT COUNT(*) FROM query_cache')
+                    cursor.execute(_SQL_COUNT)
                     current_entries = cursor.fetchone()[0]
                     
                     if stats_row:
@@ -318,13 +507,12 @@ class CacheService:
                             'eviction_count': 0,
                             'expired_count': 0
                         }
-                        
-                finally:
-                    conn.close()
             
-            # 在线程池中执行数据库操作
-            loop = asyncio.get_event_loop()
-            stats_data = await loop.run_in_executor(None, get_stats_sync)
+            stats_data = await self._run_read(get_stats_sync)
+            
+            # 加上尚未写入数据库的增量
+            for operation, column in _STAT_COLUMNS.items():
+                stats_data[column] += self._stat_deltas[operation]
             
             return CacheStats(**stats_data)
             
@@ -338,28 +526,18 @@ class CacheService:
         
         try:
             def cleanup_sync() -> int:
-                conn = sqlite3.connect(self.db_path)
-                try:
+                with self._acquire() as conn:
                     cursor = conn.cursor()
                     
-                    # 删除过期缓存
-                    current_time = datetime.now(timezone.utc)
-                    cursor.execute('''
-                        DELETE FROM query_cache
-                        WHERE datetime(created_at, '+' || ttl || ' seconds') < ?
-                    ''', (current_time,))
+                    # 删除过期缓存（expires_at索引范围扫描）
+                    cursor.execute(_SQL_DELETE_EXPIRED, (time.time(),))
                     
                     deleted_count = cursor.rowcount
                     conn.commit()
                     
                     return deleted_count
-                    
-                finally:
-                    conn.close()
             
-            # 在线程池中执行数据库操作
-            loop = asyncio.get_event_loop()
-            deleted_count = await loop.run_in_executor(None, cleanup_sync)
+            deleted_count = await self._run_write(cleanup_sync)
             
             if deleted_count > 0:
                 await self._update_stats('expired', deleted_count)
@@ -375,92 +553,108 @@ class CacheService:
         """内部清理过期缓存"""
         await self.cleanup_expired_cache()
     
-    async def _check_and_cleanup(self):
-        """检查并清理缓存"""
-        stats = await self.get_cache_stats()
-        
-        if stats.total_entries > self.config.max_entries:
-            # 删除最旧的缓存条目
-            await self._evict_old_entries(stats.total_entries - self.config.max_entries)
+    def _get_from_memory(self, query_hash: str) -> Optional[QAResponse]:
+        """从进程内缓存层读取未过期的响应（多次命中共享同一实例，调用方不应修改）"""
+        entry = self._memory.get(query_hash)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del self._memory[query_hash]
+            return None
+        self._memory.move_to_end(query_hash)
+        return entry[1]
     
-    async def _evict_old_entries(self, count: int):
-        """驱逐旧的缓存条目"""
-        try:
-            def evict_sync() -> int:
-                conn = sqlite3.connect(self.db_path)
-                try:
-                    cursor = conn.cursor()
-                    
-                    # 删除最旧的条目
-                    cursor.execute('''
-                        DELETE FROM query_cache
-                        WHERE query_hash IN (
-                            SELECT query_hash FROM query_cache
-                            ORDER BY last_accessed ASC
-                            LIMIT ?
-                        )
-                    ''', (count,))
-                    
-                    evicted_count = cursor.rowcount
-                    conn.commit()
-                    
-                    return evicted_count
-                    
-                finally:
-                    conn.close()
-            
-            # 在线程池中执行数据库操作
-            loop = asyncio.get_event_loop()
-            evicted_count = await loop.run_in_executor(None, evict_sync)
-            
-            if evicted_count > 0:
-                await self._update_stats('eviction', evicted_count)
-                logger.info(f"驱逐了 {evicted_count} 个旧缓存条目")
-            
-        except Exception as e:
-            logger.error(f"驱逐缓存条目失败: {str(e)}")
+    def _put_in_memory(
+        self,
+        query_hash: str,
+        expires_at: float,
+        response: QAResponse,
+        document_ids: Optional[List[str]],
+        version: int
+    ) -> None:
+        """写入进程内缓存层，超出容量时淘汰最久未使用的条目"""
+        if version != self._memory_version:
+            # 读写期间发生过失效，结果可能已过期
+            return
+        self._memory[query_hash] = (expires_at, response, frozenset(document_ids or ()))
+        self._memory.move_to_end(query_hash)
+        while len(self._memory) > MEMORY_CACHE_SIZE:
+            self._memory.popitem(last=False)
+    
+    def _evict_excess_sync(self, conn: sqlite3.Connection) -> int:
+        """条目数超出上限时删除最久未访问的条目，在调用方的事务中执行"""
+        total_entries = conn.execute(_SQL_COUNT).fetchone()[0]
+        excess = total_entries - self.config.max_entries
+        if excess <= 0:
+            return 0
+        
+        # 按last_accessed索引顺序读取，无需排序
+        cursor = conn.execute(_SQL_EVICT, (excess,))
+        return cursor.rowcount
     
     async def _update_stats(self, operation: str, count: int = 1):
-        """更新统计信息"""
+        """更新统计信息（在内存中累计，批量写入）"""
+        self._stat_deltas[operation] += count
+        self._note_pending()
+    
+    def _record_access(self, query_hash: str) -> None:
+        """记录缓存条目的一次命中（批量写入hit_count和last_accessed）"""
+        access = self._pending_accesses.get(query_hash)
+        now = time.time()
+        if access is None:
+            self._pending_accesses[query_hash] = [1, now]
+        else:
+            access[0] += 1
+            access[1] = now
+        self._note_pending()
+    
+    def _note_pending(self) -> None:
+        """累计次数达到阈值时立即安排一次写入"""
+        self._pending_count += 1
+        if self._pending_count >= STATS_FLUSH_THRESHOLD and (
+            self._threshold_flush is None or self._threshold_flush.done()
+        ):
+            self._threshold_flush = asyncio.get_running_loop().create_task(self.flush_stats())
+    
+    def _take_pending_stats(self) -> Tuple[Dict[str, int], Dict[str, List[Any]]]:
+        """取出并清空待写入的统计增量和访问记录"""
+        deltas = self._stat_deltas
+        accesses = self._pending_accesses
+        self._stat_deltas = dict.fromkeys(_STAT_COLUMNS, 0)
+        self._pending_accesses = {}
+        self._pending_count = 0
+        return deltas, accesses
+    
+    def _write_stats_sync(self, deltas: Dict[str, int], accesses: Dict[str, List[Any]]) -> None:
+        """在一个事务中写入统计增量和访问记录"""
+        with self._acquire() as conn:
+            if any(deltas.values()):
+                conn.execute(_SQL_UPDATE_STATS, (
+                    deltas['hit'],
+                    deltas['miss'],
+                    deltas['eviction'],
+                    deltas['expired'],
+                    time.time()
+                ))
+            if accesses:
+                conn.executemany(
+                    _SQL_RECORD_ACCESS,
+                    [(count, ts, query_hash) for query_hash, (count, ts) in accesses.items()]
+                )
+            conn.commit()
+    
+    async def flush_stats(self) -> None:
+        """把内存中累计的统计写入数据库"""
+        deltas, accesses = self._take_pending_stats()
+        if not any(deltas.values()) and not accesses:
+            return
         try:
-            def update_stats_sync():
-                conn = sqlite3.connect(self.db_path)
-                try:
-                    cursor = conn.cursor()
-                    
-                    if operation == 'hit':
-                        cursor.execute('''
-                            UPDATE cache_stats
-                            SET hit_count = hit_count + ?, last_updated = ?
-                            WHERE id = 1
-                        ''', (count, datetime.now(timezone.utc)))
-                    elif operation == 'miss':
-                        cursor.execute('''
-                            UPDATE cache_stats
-                            SET miss_count = miss_count + ?, last_updated = ?
-                            WHERE id = 1
-                        ''', (count, datetime.now(timezone.utc)))
-                    elif operation == 'eviction':
-                        cursor.execute('''
-                            UPDATE cache_stats
-                            SET eviction_count = eviction_count + ?, last_updated = ?
-                            WHERE id = 1
-                        ''', (count, datetime.now(timezone.utc)))
-                    elif operation == 'expired':
-                        cursor.execute('''
-                            UPDATE cache_stats
-                            SET expired_count = expired_count + ?, last_updated = ?
-                            WHERE id = 1
-                        ''', (count, datetime.now(timezone.utc)))
-                    
-                    conn.commit()
-                    
-                finally:
-                    conn.close()
-            
-            # 在线程池中执行数据库操作
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, update_stats_sync)
-            
+            await self._run_write(lambda: self._write_stats_sync(deltas, accesses))
         except Exception as e:
             logger.error(f"更新统计信息失败: {str(e)}")
+    
+    async def _flush_stats_periodically(self) -> None:
+        """后台定期写入统计"""
+        while True:
+            await asyncio.sleep(STATS_FLUSH_INTERVAL)
+            await self.flush_stats()
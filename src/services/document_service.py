@@ -2,24 +2,88 @@
 
 import logging
 import asyncio
+import contextlib
 import hashlib
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Optional, Any
-from datetime import datetime
+from datetime import datetime, timezone
+from uuid import UUID
 import aiofiles
 import mimetypes
+import numpy as np
 
 from fastapi import UploadFile
 from src.config.settings import get_settings
 from src.models.document import Document, DocumentInfo, DocumentStatus
-from src.models.text_chunk import TextChunk, ChunkMetadata
+from src.models.text_chunk import TextChunk
 from src.services.embedding_service import EmbeddingService
 from src.services.vector_service import VectorService
 from src.services.bm25_service import BM25Service
+from src.utils.performance import create_process_pool
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# 上传文件时每次读取的字节数
+UPLOAD_CHUNK_SIZE = 1 << 16  # 64KB
+
+# 空白字符查找表：下标为码位，值为str.isspace()（与正则\s一致）；
+# 所有空白字符都不超过U+3000，更大的码位截断到最后一个（非空白）元素
+_MAX_SPACE_CODEPOINT = 0x3000
+_IS_SPACE = np.array(
+    [chr(c).isspace() for c in range(_MAX_SPACE_CODEPOINT + 1)] + [False],
+    dtype=bool
+)
+
+# 页数达到该值时在多个进程中并行提取PDF文本
+PARALLEL_PDF_MIN_PAGES = 32
+# 每个子进程任务提取的页数（每个任务需要重新打开一次PDF）
+PDF_PAGES_PER_TASK = 16
+
+
+def _word_spans(content: str) -> np.ndarray:
+    """返回所有单词（连续的非空白字符）的(start, end)字符偏移，形状为(n, 2)
+
+    按UTF-32解码为码位数组，查表得到空白掩码，单词边界即掩码变化的位置；
+    全程为向量化操作，不在Python层逐个匹配单词。
+    """
+    codes = np.frombuffer(content.encode('utf-32-le'), dtype=np.uint32)
+    is_word = np.zeros(len(codes) + 2, dtype=bool)
+    is_word[1:-1] = ~_IS_SPACE[np.minimum(codes, _MAX_SPACE_CODEPOINT + 1)]
+    # 相邻元素不同的位置依次为单词的起点和终点（不含）
+    return np.flatnonzero(is_word[1:] != is_word[:-1]).reshape(-1, 2)
+
+
+def _extract_pdf_pages(file_path: str, start: int, stop: int) -> List[str]:
+    """提取PDF中[start, stop)范围内各页的文本"""
+    import PyPDF2
+    
+    with open(file_path, 'rb') as file:
+        pages = PyPDF2.PdfReader(file).pages
+        return [pages[i].extract_text() for i in range(start, stop)]
+
+
+def extract_pdf_text(file_path: Path, pool: Optional[ProcessPoolExecutor] = None) -> str:
+    """提取PDF全文，给出进程池且页数较多时按页范围在多个进程中并行执行"""
+    import PyPDF2
+    
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        page_count = len(pdf_reader.pages)
+        if pool is None or page_count < PARALLEL_PDF_MIN_PAGES or (os.cpu_count() or 1) < 2:
+            page_texts = [page.extract_text() for page in pdf_reader.pages]
+            return "\n".join(page_texts).strip()
+    
+    starts = range(0, page_count, PDF_PAGES_PER_TASK)
+    stops = [min(start + PDF_PAGES_PER_TASK, page_count) for start in starts]
+    batches = pool.map(_extract_pdf_pages, [str(file_path)] * len(starts), starts, stops)
+    page_texts = list(itertools.chain.from_iterable(batches))
+    
+    return "\n".join(page_texts).strip()
+
 
 class DocumentService:
     """文档处理服务"""
@@ -33,6 +97,9 @@ class DocumentService:
         self.vector_service = VectorService()
         self.bm25_service = BM25Service()
         
+        # 并行提取PDF文本的常驻进程池
+        self._pdf_pool = create_process_pool(max_workers=os.cpu_count())
+        
         # 支持的文件类型
         self.supported_types = {
             'application/pdf': '.pdf',
@@ -43,12 +110,28 @@ class DocumentService:
             'text/plain': '.txt',
             'text/markdown': '.md'
         }
+        
+        # MIME类型到解析方法的分派表
+        self._parsers = {
+            'text/plain': self._parse_text_file,
+            'text/markdown': self._parse_text_file,
+            'application/pdf': self._parse_pdf_file,
+            'application/vnd.openxmlformats-officedocument.wordprocessingml.document': self._parse_word_file,
+            'application/msword': self._parse_word_file,
+            'application/vnd.openxmlformats-officedocument.presentationml.presentation': self._parse_ppt_file,
+            'application/vnd.ms-powerpoint': self._parse_ppt_file
+        }
+    
+    def close(self) -> None:
+        """关闭PDF文本提取进程池"""
+        self._pdf_pool.shutdown(wait=False, cancel_futures=True)
     
     async def upload_document(self, file: UploadFile, metadata: Optional[Dict] = None) -> DocumentInfo:
         """上传文档"""
         try:
             # 验证文件类型
-            if file.content_type not in self.supported_types:
+            file_extension = self.supported_types.get(file.content_type)
+            if file_extension is None:
                 raise ValueError(f"不支持的文件类型: {file.content_type}")
             
             # 创建文档信息
@@ -61,16 +144,21 @@ class DocumentService:
             )
             
             # 生成文件路径
-            file_extension = self.supported_types[file.content_type]
             file_path = self.upload_dir / f"{doc_info.id}{file_extension}"
             
-            # 保存文件
-            content = await file.read()
+            # 分块流式保存文件，避免将整个文件读入内存；
+            # 同一遍循环中增量计算内容哈希，供识别重复上传使用
+            file_size = 0
+            digest = hashlib.blake2b(digest_size=32)
             async with aiofiles.open(file_path, 'wb') as f:
-                await f.write(content)
-            
-            # 更新文件大小
-            doc_info.file_size = len(content)
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    await f.write(chunk)
+                    digest.update(chunk)
+                    file_size += len(chunk)
+            
+            # 更新文件大小和内容哈希
+            doc_info.file_size = file_size
+            doc_info.content_hash = digest.hexdigest()
             doc_info.status = DocumentStatus.PROCESSING
             
             logger.info(f"文档上传成功: {doc_info.filename} ({doc_info.file_size} bytes)")
@@ -93,14 +181,25 @@ class DocumentService:
             # 分割文本
             chunks = await self.split_text(content, doc_info)
             
-            # 生成嵌入向量
-            chunks_with_embeddings = await self.embedding_service.embed_chunks(chunks)
-            
-            # 存储到向量数据库
-            await self.vector_service.store_chunks(chunks_with_embeddings)
-            
-            # 更新BM25索引
-            await self.bm25_service.add_documents(chunks_with_embeddings)
+            # BM25索引只需要文本内容，与向量生成和存储并行执行
+            bm25_task = asyncio.create_task(self.bm25_service.add_documents(chunks))
+            try:
+                # 生成嵌入向量
+                chunks_with_embeddings = await self.embedding_service.embed_chunks(chunks)
+                
+                # 存储到向量数据库
+                await self.vector_service.store_chunks(chunks_with_embeddings)
+            except Exception:
+                # 向量分支失败：等待BM25任务结束（其错误不覆盖原始异常），
+                # 再从关键词索引中撤回该文档，避免检索到没有向量的文本块
+                with contextlib.suppress(Exception):
+                    await bm25_task
+                try:
+                    await self.bm25_service.remove_documents([str(doc_info.id)])
+                except Exception as e:
+                    logger.error(f"撤回BM25索引失败: {str(e)}")
+                raise
+            await bm25_task
             
             # 更新文档状态
             doc_info.status = DocumentStatus.COMPLETED
@@ -114,17 +213,11 @@ class DocumentService:
     async def parse_document(self, file_path: Path, mime_type: str) -> str:
         """解析文档内容"""
         try:
-            if mime_type == 'text/plain' or mime_type == 'text/markdown':
-                return await self._parse_text_file(file_path)
-            elif mime_type == 'application/pdf':
-                return await self._parse_pdf_file(file_path)
-            elif mime_type in ['application/vnd.openxmlformats-officedocument.wordprocessingml.document', 'application/msword']:
-                return await self._parse_word_file(file_path)
-            elif mime_type in ['application/vnd.openxmlformats-officedocument.presentationml.presentation', 'application/vnd.ms-powerpoint']:
-                return await self._parse_ppt_file(file_path)
-            else:
+            parser = self._parsers.get(mime_type)
+            if parser is None:
                 raise ValueError(f"不支持的文件类型: {mime_type}")
-                
+            return await parser(file_path)
+            
         except Exception as e:
             logger.error(f"文档解析失败: {str(e)}")
             raise
@@ -137,15 +230,8 @@ class DocumentService:
     async def _parse_pdf_file(self, file_path: Path) -> str:
         """解析PDF文件"""
         try:
-            import PyPDF2
-            
-            text = ""
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-            
-            return text.strip()
+            # 文本提取是CPU密集的同步操作，放到线程中执行，不阻塞事件循环
+            return await asyncio.to_thread(extract_pdf_text, file_path, self._pdf_pool)
             
         except ImportError:
             logger.error("PyPDF2 未安装，无法解析PDF文件")
@@ -196,48 +282,55 @@ class DocumentService:
             raise
     
     async def split_text(self, content: str, doc_info: DocumentInfo) -> List[TextChunk]:
-        """分割文本为块"""
+        """分割文本为块
+
+        一次扫描得到所有单词的字符偏移，块边界由偏移数组切片计算，
+        每个块只做一次原文切片；文本块由内部生成，跳过字段验证。
+        """
         try:
-            chunks = []
             chunk_size = settings.chunk_size
             chunk_overlap = settings.chunk_overlap
             
-            # 简单的文本分割策略
-            words = content.split()
+            # 每个单词的(start, end)字符偏移
+            spans = _word_spans(content)
+            word_count = len(spans)
             
-            for i in range(0, len(words), chunk_size - chunk_overlap):
-                chunk_words = words[i:i + chunk_size]
-                chunk_content = " ".join(chunk_words)
-                
-                if not chunk_content.strip():
-                    continue
-                
-                # 创建文本块
-                chunk = TextChunk(
-                    document_id=str(doc_info.id),
-                    content=chunk_content,
-                    chunk_index=len(chunks),
-                    start_position=i,
-                    end_position=min(i + chunk_size, len(words)),
-                    metadata=ChunkMetadata(
-                        chunk_id="",  # 将在创建后设置
-                        document_title=doc_info.filename,
-                        chunk_index=len(chunks),
-                        total_chunks=0,  # 将在最后更新
-                        page_number=1,
-                        section_title="",
-                        language="zh",
-                        confidence_score=1.0
-                    )
-                )
-                
-                # 设置chunk_id
-                chunk.metadata.chunk_id = str(chunk.id)
-                chunks.append(chunk)
+            # 滑动窗口的起止单词位置，及对应的原文字符范围
+            starts = np.arange(0, word_count, chunk_size - chunk_overlap)
+            ends = np.minimum(starts + chunk_size, word_count)
+            char_starts = spans[starts, 0].tolist()
+            char_ends = spans[ends - 1, 1].tolist()
             
-            # 更新总块数
-            for chunk in chunks:
-                chunk.metadata.total_chunks = len(chunks)
+            document_id = str(doc_info.id)
+            total_chunks = len(starts)
+            now = datetime.now(timezone.utc)
+            raw = os.urandom(16 * total_chunks)
+            
+            chunks = []
+            for i, (start, end, char_start, char_end) in enumerate(
+                zip(starts.tolist(), ends.tolist(), char_starts, char_ends)
+            ):
+                chunk_id = str(UUID(bytes=raw[i * 16:(i + 1) * 16], version=4))
+                chunks.append(TextChunk.construct_trusted(
+                    id=chunk_id,
+                    created_at=now,
+                    updated_at=now,
+                    document_id=document_id,
+                    content=content[char_start:char_end],
+                    chunk_index=i,
+                    start_position=start,
+                    end_position=end,
+                    metadata={
+                        "chunk_id": chunk_id,
+                        "document_title": doc_info.filename,
+                        "chunk_index": i,
+                        "total_chunks": total_chunks,
+                        "page_number": 1,
+                        "section_title": "",
+                        "language": "zh",
+                        "confidence_score": 1.0
+                    }
+                ))
             
             logger.info(f"文本分割完成: {len(chunks)} 个块")
             return chunks
@@ -2,18 +2,34 @@
 
 import logging
 import asyncio
-from typing import List, Optional, Union
+import contextlib
+import os
+from typing import List, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+import torch
 
 from sentence_transformers import SentenceTransformer
 from src.config.settings import get_settings
 from src.models.text_chunk import TextChunk
-from src.utils.performance import monitor_performance, BatchProcessor
+from src.utils.performance import monitor_performance
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# 动态批处理：并发的单文本编码请求合并为一次encode调用，每批最多的文本数
+EMBED_BATCH_MAX_SIZE = 32
+
+# 每次encode内部送入模型的批大小，整批数据一次拷贝到设备
+ENCODE_BATCH_SIZE = 64
+
+
+def _fail_futures(batch: List[Tuple[str, asyncio.Future]], error: BaseException) -> None:
+    """让批次中尚未完成的请求以异常结束（调用方可能已取消等待）"""
+    for _, future in batch:
+        if not future.done():
+            future.set_exception(error)
+
 
 class EmbeddingService:
     """嵌入向量生成服务"""
@@ -22,11 +38,20 @@ class EmbeddingService:
         self.model = None
         self.model_name = settings.embedding_model
         self.dimension = settings.embedding_dimension
-        self.executor = ThreadPoolExecutor(max_workers=2)
+        
+        # GPU上只用一个推理线程，避免多个线程争用同一CUDA上下文，
+        # 并发请求由批处理队列合并；CPU上保留部分线程给其他工作
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        if self.device == "cuda":
+            workers = 1
+        else:
+            workers = max(1, (os.cpu_count() or 2) // 2)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embedding")
         self._model_lock = asyncio.Lock()
 
-        # 批处理器用于优化批量嵌入
-        self.batch_processor = BatchProcessor(batch_size=32, max_wait_time=0.1)
+        # 单文本编码请求队列及合并批次的后台任务（首次使用时启动）
+        self._pending: Optional["asyncio.Queue[Tuple[str, asyncio.Future]]"] = None
+        self._batch_task: Optional[asyncio.Task] = None
     
     async def initialize(self):
         """初始化嵌入模型"""
@@ -36,12 +61,9 @@ class EmbeddingService:
                     try:
                         logger.info(f"正在加载嵌入模型: {self.model_name}")
                         
-                        # 在线程池中加载模型以避免阻塞
-                        loop = asyncio.get_event_loop()
-                        self.model = await loop.run_in_executor(
-                            self.executor,
-                            self._load_model_sync
-                        )
+                        # 在独立线程中加载模型，避免阻塞事件循环，
+                        # 也不占用推理线程池
+                        self.model = await asyncio.to_thread(self._load_model_sync)
                         
                         logger.info("嵌入模型加载完成")
                         
@@ -50,82 +72,173 @@ class EmbeddingService:
                         raise
     
     def _load_model_sync(self) -> SentenceTransformer:
-        """同步加载模型"""
-        return SentenceTransformer(self.model_name)
+        """同步加载模型，并按配置切换推理精度"""
+        model = SentenceTransformer(self.model_name, device=self.device)
+        on_gpu = self.device == "cuda"
+        precision = settings.embedding_precision
+        
+        if precision == "fp16":
+            if on_gpu:
+                # 半精度权重：显存占用减半，使用Tensor Core计算
+                model.half()
+            else:
+                logger.warning("FP16推理需要GPU，继续使用FP32")
+        elif precision == "int8":
+            if on_gpu:
+                logger.warning("INT8动态量化只支持CPU推理，继续使用FP32")
+            else:
+                # 动态量化：Linear层权重转为int8，激活在推理时量化，无需校准数据
+                model = torch.quantization.quantize_dynamic(
+                    model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+        
+        return model
     
-    @monitor_performance("embed_single_text")
     async def embed_text(self, text: str) -> List[float]:
         """生成单个文本的嵌入向量"""
+        return (await self.embed_text_np(text)).tolist()
+    
+    @monitor_performance("embed_single_text")
+    async def embed_text_np(self, text: str) -> np.ndarray:
+        """生成单个文本的嵌入向量，返回float32数组（已L2归一化）"""
         await self.initialize()
         
         try:
             if not text or not text.strip():
                 logger.warning("输入文本为空")
-                return [0.0] * self.dimension
-            
-            # 在线程池中执行嵌入生成
-            loop = asyncio.get_event_loop()
-            embedding = await loop.run_in_executor(
-                self.executor,
-                self._embed_text_sync,
-                text.strip()
-            )
+                return np.zeros(self.dimension, dtype=np.float32)
             
-            return embedding.tolist()
+            # 加入批处理队列，与其他并发请求合并编码
+            self._ensure_batch_task()
+            future = asyncio.get_running_loop().create_future()
+            self._pending.put_nowait((text.strip(), future))
+            return await future
             
         except Exception as e:
             logger.error(f"文本嵌入生成失败: {str(e)}")
             # 返回零向量作为fallback
-            return [0.0] * self.dimension
+            return np.zeros(self.dimension, dtype=np.float32)
+    
+    def _ensure_batch_task(self) -> None:
+        """确保当前事件循环上有批处理任务在运行
+
+        任务已结束或属于其他事件循环（例如原循环已停止）时，
+        重新创建队列和任务，避免请求等待一个不会再被处理的future。
+        """
+        loop = asyncio.get_running_loop()
+        task = self._batch_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._pending = asyncio.Queue()
+            self._batch_task = loop.create_task(self._batch_loop(self._pending))
+    
+    async def _batch_loop(self, pending: "asyncio.Queue[Tuple[str, asyncio.Future]]") -> None:
+        """合并排队的单文本请求，每批只调用一次encode
+
+        取到第一个请求后让出一次事件循环，让同一轮中的其他请求入队；
+        编码进行期间到达的请求会在下一批中一起处理，空闲时不增加延迟。
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await pending.get()]
+            await asyncio.sleep(0)
+            while len(batch) < EMBED_BATCH_MAX_SIZE and not pending.empty():
+                batch.append(pending.get_nowait())
+            
+            try:
+                embeddings = await loop.run_in_executor(
+                    self.executor,
+                    self._embed_texts_sync,
+                    [text for text, _ in batch]
+                )
+            except asyncio.CancelledError:
+                # 服务关闭：正在编码的请求以异常结束，不让调用方一直等待
+                _fail_futures(batch, RuntimeError("嵌入服务已关闭"))
+                raise
+            except Exception as e:
+                _fail_futures(batch, e)
+                continue
+            
+            for (_, future), embedding in zip(batch, embeddings):
+                # 调用方可能已取消等待
+                if not future.done():
+                    future.set_result(embedding)
     
-    def _embed_text_sync(self, text: str) -> np.ndarray:
-        """同步生成文本嵌入"""
-        return self.model.encode(text, normalize_embeddings=True)
+    async def close(self) -> None:
+        """停止批处理任务，排队中的请求以异常结束，并关闭推理线程池"""
+        task, pending = self._batch_task, self._pending
+        self._batch_task = None
+        self._pending = None
+        
+        # 属于其他事件循环的任务和请求无法在当前循环中等待或结束，直接丢弃
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            if not task.done():
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+            batch = []
+            while not pending.empty():
+                batch.append(pending.get_nowait())
+            _fail_futures(batch, RuntimeError("嵌入服务已关闭"))
+        
+        self.executor.shutdown(wait=False)
     
     @monitor_performance("embed_batch_texts")
     async def embed_texts(self, texts: List[str]) -> List[List[float]]:
-        """批量生成文本嵌入向量"""
+        """批量生成文本嵌入向量（列表格式，用于需要JSON序列化的场景）"""
+        return (await self.embed_texts_np(texts)).tolist()
+    
+    async def embed_texts_np(self, texts: List[str]) -> np.ndarray:
+        """批量生成文本嵌入向量，返回形状为(len(texts), dimension)的C连续float32矩阵
+
+        空文本对应的行为零向量。
+        """
         await self.initialize()
         
         try:
             if not texts:
-                return []
+                return np.empty((0, self.dimension), dtype=np.float32)
             
-            # 过滤空文本
-            valid_texts = [text.strip() for text in texts if text and text.strip()]
-            if not valid_texts:
+            # 过滤空文本，记录有效文本所在的行
+            stripped = [text.strip() if text else "" for text in texts]
+            valid_rows = [i for i, text in enumerate(stripped) if text]
+            if not valid_rows:
                 logger.warning("所有输入文本都为空")
-                return [[0.0] * self.dimension] * len(texts)
+                return np.zeros((len(texts), self.dimension), dtype=np.float32)
             
             # 在线程池中执行批量嵌入生成
-            loop = asyncio.get_event_loop()
+            loop = asyncio.get_running_loop()
             embeddings = await loop.run_in_executor(
                 self.executor,
                 self._embed_texts_sync,
-                valid_texts
+                [stripped[i] for i in valid_rows]
             )
             
-            # 转换为列表格式
-            result = []
-            valid_idx = 0
-            for text in texts:
-                if text and text.strip():
-                    result.append(embeddings[valid_idx].tolist())
-                    valid_idx += 1
-                else:
-                    result.append([0.0] * self.dimension)
+            # 全部有效时直接返回编码结果，否则按行填入零矩阵
+            if len(valid_rows) < len(texts):
+                result = np.zeros((len(texts), embeddings.shape[1]), dtype=np.float32)
+                result[valid_rows] = embeddings
+                embeddings = result
             
             logger.info(f"批量生成 {len(texts)} 个文本的嵌入向量")
-            return result
+            return embeddings
             
         except Exception as e:
             logger.error(f"批量文本嵌入生成失败: {str(e)}")
             # 返回零向量作为fallback
-            return [[0.0] * self.dimension] * len(texts)
+            return np.zeros((len(texts), self.dimension), dtype=np.float32)
     
     def _embed_texts_sync(self, texts: List[str]) -> np.ndarray:
         """同步批量生成文本嵌入"""
-        return self.model.encode(texts, normalize_embeddings=True)
+        return np.ascontiguousarray(
+            self.model.encode(
+                texts,
+                batch_size=ENCODE_BATCH_SIZE,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            ),
+            dtype=np.float32
+        )
     
     async def embed_chunks(self, chunks: List[TextChunk]) -> List[TextChunk]:
         """为文本块生成嵌入向量"""
@@ -134,11 +247,10 @@ class EmbeddingService:
             texts = [chunk.content for chunk in chunks]
             
             # 批量生成嵌入向量
-            embeddings = await self.embed_texts(texts)
+            embeddings = await self.embed_texts_np(texts)
             
-            # 将嵌入向量赋值给文本块
-            for chunk, embedding in zip(chunks, embeddings):
-                chunk.embedding = embedding
+            # 每个文本块持有矩阵对应行的视图，不逐行复制
+            TextChunk.set_embeddings(chunks, embeddings)
             
             logger.info(f"为 {len(chunks)} 个文本块生成嵌入向量")
             return chunks
@@ -161,15 +273,11 @@ class EmbeddingService:
     async def compute_similarity(self, text1: str, text2: str) -> float:
         """计算两个文本的相似度"""
         try:
-            embedding1 = await self.embed_text(text1)
-            embedding2 = await self.embed_text(text2)
-            
-            # 计算余弦相似度
-            vec1 = np.array(embedding1)
-            vec2 = np.array(embedding2)
+            vec1 = await self.embed_text_np(text1)
+            vec2 = await self.embed_text_np(text2)
             
-            similarity = np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
-            return float(similarity)
+            # 嵌入向量已L2归一化，余弦相似度即点积（空文本的零向量得到0）
+            return float(np.dot(vec1, vec2))
             
         except Exception as e:
             logger.error(f"相似度计算失败: {str(e)}")
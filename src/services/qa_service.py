@@ -2,8 +2,9 @@
 
 import logging
 import asyncio
+import re
 import time
-from typing import List, Optional, Dict, Any
+from typing import FrozenSet, List, Optional, Dict, Any, Tuple
 import json
 
 import openai
@@ -15,6 +16,19 @@ from src.models.conversation import Message, Conversation
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# 表示文档中没有答案的关键词
+_NO_ANSWER_KEYWORDS = (
+    "无法找到相关信息",
+    "没有相关信息",
+    "文档中没有",
+    "无法回答",
+    "不清楚",
+    "没有提及"
+)
+
+# 所有无答案关键词合并为一个正则，一次扫描答案即可完成匹配
+_NO_ANSWER_RE = re.compile("|".join(map(re.escape, _NO_ANSWER_KEYWORDS)))
+
 
 class QAService:
     """基于Kimi2 API的问答服务"""
@@ -87,11 +101,8 @@ class QAService:
             # 调用Kimi2 API
             response = await self._call_kimi_api(prompt)
             
-            # 提取来源引用
-            sources = self._extract_sources(response, context_chunks)
-            
-            # 验证答案来源
-            has_context = self._validate_answer_source(response, context_chunks)
+            # 一次完成答案来源验证、置信度计算和来源引用提取
+            has_context, confidence, sources = self._score_answer(response, context_chunks)
             
             processing_time = time.time() - start_time
             
@@ -99,7 +110,7 @@ class QAService:
                 question=question,
                 answer=response,
                 sources=sources,
-                confidence=self._calculate_confidence(response, context_chunks),
+                confidence=confidence,
                 processing_time=processing_time,
                 cached=False,
                 conversation_id=conversation_id,
@@ -114,7 +125,8 @@ class QAService:
             logger.error(f"问答生成失败: {str(e)}")
             processing_time = time.time() - start_time
             
-            return QAResponse(
+            # 问题已在API入口校验，回答为固定文本，跳过验证
+            return QAResponse.construct_trusted(
                 question=question,
                 answer=f"抱歉，处理您的问题时出现错误：{str(e)}",
                 sources=[],
@@ -131,11 +143,12 @@ class QAService:
         
         for i, chunk in enumerate(chunks, 1):
             context_part = f"文档片段 {i}:\n"
-            context_part += f"来源: {chunk.metadata.document_title or '未知文档'}\n"
-            if chunk.metadata.page_number:
-                context_part += f"页码: {chunk.metadata.page_number}\n"
-            if chunk.metadata.section_title:
-                context_part += f"章节: {chunk.metadata.section_title}\n"
+            metadata = chunk.metadata
+            context_part += f"来源: {metadata.get('document_title') or '未知文档'}\n"
+            if metadata.get("page_number"):
+                context_part += f"页码: {metadata['page_number']}\n"
+            if metadata.get("section_title"):
+                context_part += f"章节: {metadata['section_title']}\n"
             context_part += f"内容: {chunk.content}\n"
             context_part += "-" * 50 + "\n"
             
@@ -162,24 +175,53 @@ class QAService:
             logger.error(f"Kimi2 API调用失败: {str(e)}")
             raise
     
-    def _extract_sources(self, answer: str, chunks: List[TextChunk]) -> List[Citation]:
-        """提取答案中的来源引用"""
+    def _score_answer(
+        self,
+        answer: str,
+        chunks: List[TextChunk]
+    ) -> Tuple[bool, float, List[Citation]]:
+        """评估答案，返回(是否基于文档内容, 置信度, 来源引用)
+
+        文本块和答案的词集合只构建一次，来源引用在同一次遍历中生成，
+        置信度复用验证时计算的重叠度和来源数量。
+        """
+        chunk_word_sets = [frozenset(chunk.content.split()) for chunk in chunks]
+        answer_words = frozenset(answer.split())
+        
+        sources = self._extract_sources(answer_words, chunks, chunk_word_sets)
+        
+        # 检查是否包含"无法找到相关信息"等表示没有答案的关键词
+        if _NO_ANSWER_RE.search(answer):
+            return False, 0.0, sources
+        
+        # 简单验证：检查答案是否与文档内容有足够的重叠（至少10%）
+        all_chunk_words = frozenset().union(*chunk_word_sets)
+        overlap_ratio = len(all_chunk_words & answer_words) / len(answer_words) if answer_words else 0
+        if overlap_ratio <= 0.1:
+            return False, 0.0, sources
+        
+        return True, self._calculate_confidence(answer, overlap_ratio, len(sources)), sources
+    
+    def _extract_sources(
+        self,
+        answer_words: FrozenSet[str],
+        chunks: List[TextChunk],
+        chunk_word_sets: List[FrozenSet[str]]
+    ) -> List[Citation]:
+        """提取答案中的来源引用（词集合由调用方预先构建）"""
         sources = []
         
-        for i, chunk in enumerate(chunks):
-            # 简单的匹配策略：检查答案中是否包含文档片段的关键内容
-            chunk_words = set(chunk.content.split())
-            answer_words = set(answer.split())
-            
-            # 计算重叠度
-            overlap = len(chunk_words.intersection(answer_words))
+        for chunk, chunk_words in zip(chunks, chunk_word_sets):
+            # 简单的匹配策略：按答案与文档片段的重叠词数判断是否引用了该片段
+            overlap = len(chunk_words & answer_words)
             if overlap > 3:  # 如果有足够的重叠词汇
-                citation = Citation(
+                # 字段均来自已验证的文本块，跳过验证
+                citation = Citation.construct_trusted(
                     chunk_id=str(chunk.id),
                     document_id=chunk.document_id,
-                    document_title=chunk.metadata.document_title or "未知文档",
-                    page_number=chunk.metadata.page_number,
-                    section_title=chunk.metadata.section_title,
+                    document_title=chunk.metadata.get("document_title") or "未知文档",
+                    page_number=chunk.metadata.get("page_number"),
+                    section_title=chunk.metadata.get("section_title"),
                     quoted_text=chunk.content[:200] + "..." if len(chunk.content) > 200 else chunk.content,
                     relevance_score=min(overlap / len(chunk_words), 1.0) if chunk_words else 0.0
                 )
@@ -189,35 +231,8 @@ class QAService:
         sources.sort(key=lambda x: x.relevance_score, reverse=True)
         return sources[:5]  # 最多返回5个来源
     
-    def _validate_answer_source(self, answer: str, chunks: List[TextChunk]) -> bool:
-        """验证答案是否基于提供的文档内容"""
-        # 检查是否包含"无法找到相关信息"等表示没有答案的关键词
-        no_answer_keywords = [
-            "无法找到相关信息",
-            "没有相关信息",
-            "文档中没有",
-            "无法回答",
-            "不清楚",
-            "没有提及"
-        ]
-        
-        for keyword in no_answer_keywords:
-            if keyword in answer:
-                return False
-        
-        # 简单验证：检查答案是否与文档内容有足够的重叠
-        all_chunk_content = " ".join([chunk.content for chunk in chunks])
-        chunk_words = set(all_chunk_content.split())
-        answer_words = set(answer.split())
-        
-        overlap_ratio = len(chunk_words.intersection(answer_words)) / len(answer_words) if answer_words else 0
-        return overlap_ratio > 0.1  # 至少10%的重叠
-    
-    def _calculate_confidence(self, answer: str, chunks: List[TextChunk]) -> float:
-        """计算答案的置信度"""
-        if not self._validate_answer_source(answer, chunks):
-            return 0.0
-        
+    def _calculate_confidence(self, answer: str, overlap_ratio: float, sources_count: int) -> float:
+        """根据答案长度、与文档的重叠度和来源数量计算已通过验证的答案的置信度"""
         # 基于多个因素计算置信度
         factors = []
         
@@ -231,18 +246,9 @@ class QAService:
             factors.append(0.4)
         
         # 2. 上下文匹配因子
-        all_content = " ".join([chunk.content for chunk in chunks])
-        content_words = set(all_content.split())
-        answer_words = set(answer.split())
-        
-        if content_words and answer_words:
-            overlap_ratio = len(content_words.intersection(answer_words)) / len(answer_words)
-            factors.append(min(overlap_ratio * 2, 1.0))
-        else:
-            factors.append(0.0)
+        factors.append(min(overlap_ratio * 2, 1.0))
         
         # 3. 来源数量因子
-        sources_count = len(self._extract_sources(answer, chunks))
         if sources_count >= 2:
             factors.append(0.9)
         elif sources_count == 1:
@@ -251,11 +257,11 @@ class QAService:
             factors.append(0.3)
         
         # 计算加权平均
-        return sum(factors) / len(factors) if factors else 0.0
+        return sum(factors) / len(factors)
     
     async def handle_no_context(self, question: str, conversation_id: Optional[str] = None) -> QAResponse:
         """处理没有上下文的情况"""
-        return QAResponse(
+        return QAResponse.construct_trusted(
             question=question,
             answer="抱歉，我在您的文档库中没有找到与此问题相关的信息。请确保已上传相关文档，或尝试使用不同的关键词重新提问。",
             sources=[],
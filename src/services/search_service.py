@@ -2,6 +2,7 @@
 
 import logging
 import asyncio
+from collections import OrderedDict
 from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass
 import numpy as np
@@ -16,6 +17,12 @@ from src.utils.performance import monitor_performance, measure_time
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# 指定结果数量时，各路检索按此倍数多取候选以供RRF融合
+SEARCH_OVERSAMPLE = 3
+
+# 查询向量缓存容量：重复查询不再重新编码
+QUERY_EMBEDDING_CACHE_SIZE = 512
+
 
 @dataclass
 class SearchConfig:
@@ -35,6 +42,9 @@ class HybridSearchService:
         self.bm25_service = BM25Service()
         self.embedding_service = EmbeddingService()
         self.default_config = SearchConfig()
+        
+        # 查询文本 -> 查询向量（只读数组）的LRU缓存
+        self._query_embeddings: "OrderedDict[str, np.ndarray]" = OrderedDict()
     
     async def initialize(self):
         """初始化所有服务"""
@@ -49,20 +59,36 @@ class HybridSearchService:
         self,
         query: Query,
         config: Optional[SearchConfig] = None,
-        document_ids: Optional[List[str]] = None
+        document_ids: Optional[List[str]] = None,
+        limit: Optional[int] = None
     ) -> QueryResult:
         """执行混合检索"""
         if config is None:
             config = self.default_config
         
+        # 将结果数量限制下推到各路检索
+        if limit is None:
+            max_results = config.max_results
+            probe_limit = config.max_results
+        else:
+            # 不超过配置的上限，避免超大limit放大各路检索和重排序的开销
+            max_results = max(1, min(limit, config.max_results))
+            probe_limit = max_results * SEARCH_OVERSAMPLE
+        
         try:
             start_time = asyncio.get_event_loop().time()
 
+            # 查询向量只生成一次，向量检索和重排序共用；编码期间BM25检索并行执行
+            embedding_task = asyncio.create_task(self._embed_query(query.text))
+            
+            async def vector_search_after_embedding() -> List[Dict]:
+                return await self._vector_search(await embedding_task, probe_limit, document_ids)
+            
             # 并行执行向量检索和BM25检索
             async with measure_time("vector_search"):
-                vector_task = self._vector_search(query.text, config.max_results, document_ids)
+                vector_task = vector_search_after_embedding()
             async with measure_time("bm25_search"):
-                bm25_task = self._bm25_search(query.text, config.max_results, document_ids)
+                bm25_task = self._bm25_search(query.text, probe_limit, document_ids)
             
             vector_results, bm25_results = await asyncio.gather(
                 vector_task, bm25_task, return_exceptions=True
@@ -85,12 +111,12 @@ class HybridSearchService:
             # 重排序（如果启用）
             if config.enable_rerank:
                 fused_results = await self._rerank_results(
-                    query.text, fused_results
+                    embedding_task, fused_results
                 )
             
             # 过滤和限制结果
             final_results = self._filter_and_limit_results(
-                fused_results, config
+                fused_results, config, max_results
             )
             
             search_time = asyncio.get_event_loop().time() - start_time
@@ -116,17 +142,31 @@ class HybridSearchService:
             logger.error(f"混合检索失败: {str(e)}")
             raise
     
+    async def _embed_query(self, query_text: str) -> np.ndarray:
+        """生成查询向量，重复的查询文本直接复用缓存的结果"""
+        cached = self._query_embeddings.get(query_text)
+        if cached is not None:
+            self._query_embeddings.move_to_end(query_text)
+            return cached
+        
+        embedding = await self.embedding_service.embed_text_np(query_text)
+        # 编码失败时返回零向量，不缓存
+        if embedding.any():
+            # 缓存的数组被多个请求共享，设为只读
+            embedding.setflags(write=False)
+            self._query_embeddings[query_text] = embedding
+            while len(self._query_embeddings) > QUERY_EMBEDDING_CACHE_SIZE:
+                self._query_embeddings.popitem(last=False)
+        return embedding
+    
     async def _vector_search(
         self,
-        query_text: str,
+        query_embedding: np.ndarray,
         limit: int,
         document_ids: Optional[List[str]] = None
     ) -> List[Dict]:
         """执行向量检索"""
         try:
-            # 生成查询向量
-            query_embedding = await self.embedding_service.embed_text(query_text)
-            
             # 向量搜索
             results = await self.vector_service.search_similar(
                 query_vector=query_embedding,
@@ -241,38 +281,33 @@ class HybridSearchService:
     
     async def _rerank_results(
         self,
-        query_text: str,
+        query_embedding: "asyncio.Future[np.ndarray]",
         results: List[Dict]
     ) -> List[Dict]:
-        """重排序结果"""
+        """重排序结果（query_embedding为查询向量任务，与向量检索共用）"""
         try:
             if not results:
                 return results
             
-            # 生成查询嵌入
-            query_embedding = await self.embedding_service.embed_text(query_text)
-            
-            # 为每个结果计算语义相似度
-            reranked_results = []
-            for result in results:
-                content = result.get("content", "")
-                if content:
-                    # 生成内容嵌入
-                    content_embedding = await self.embedding_service.embed_text(content)
-                    
-                    # 计算相似度
-                    similarity = await self.embedding_service.calculate_similarity(
-                        query_embedding, content_embedding
-                    )
-                    
+            # 有内容的结果一次批量编码
+            rows = [i for i, result in enumerate(results) if result.get("content", "")]
+            if rows:
+                query_vector = await query_embedding
+                content_embeddings = await self.embedding_service.embed_texts_np(
+                    [results[i]["content"] for i in rows]
+                )
+                
+                # 嵌入向量已L2归一化，一次矩阵向量乘得到全部余弦相似度
+                similarities = (content_embeddings @ query_vector).tolist()
+                
+                for i, similarity in zip(rows, similarities):
+                    result = results[i]
                     # 结合原始分数和语义相似度
                     original_score = result.get("fusion_score", 0.0)
-                    rerank_score = 0.7 * original_score + 0.3 * similarity
-                    
-                    result["rerank_score"] = rerank_score
+                    result["rerank_score"] = 0.7 * original_score + 0.3 * similarity
                     result["semantic_similarity"] = similarity
-                    
-                reranked_results.append(result)
+            
+            reranked_results = list(results)
             
             # 按重排序分数排序
             reranked_results.sort(key=lambda x: x.get("rerank_score", 0), reverse=True)
@@ -286,7 +321,8 @@ class HybridSearchService:
     def _filter_and_limit_results(
         self,
         results: List[Dict],
-        config: SearchConfig
+        config: SearchConfig,
+        max_results: Optional[int] = None
     ) -> List[Dict]:
         """过滤和限制结果"""
         # 过滤低分结果
@@ -296,7 +332,9 @@ class HybridSearchService:
         ]
         
         # 限制结果数量
-        return filtered_results[:config.max_results]
+        if max_results is None:
+            max_results = config.max_results
+        return filtered_results[:max_results]
     
     async def search_vector_only(
         self,
@@ -308,7 +346,8 @@ class HybridSearchService:
         try:
             start_time = asyncio.get_event_loop().time()
             
-            results = await self._vector_search(query.text, limit, document_ids)
+            query_embedding = await self._embed_query(query.text)
+            results = await self._vector_search(query_embedding, limit, document_ids)
             
             search_time = asyncio.get_event_loop().time() - start_time
             
@@ -16,6 +16,21 @@ from src.config.settings import get_settings
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# int8标量量化：向量内存占用降为FP32的1/4，量化副本常驻内存；
+# 按0.99分位数截断离群值以保留精度
+_QUANTIZATION_CONFIG = models.ScalarQuantization(
+    scalar=models.ScalarQuantizationConfig(
+        type=models.ScalarType.INT8,
+        quantile=0.99,
+        always_ram=True
+    )
+)
+
+# 启用量化时先用int8向量召回，再用原始FP32向量对候选结果重新打分
+_QUANTIZED_SEARCH_PARAMS = models.SearchParams(
+    quantization=models.QuantizationSearchParams(rescore=True)
+)
+
 
 class VectorService:
     """向量数据库服务"""
@@ -31,21 +46,23 @@ class VectorService:
             async with self._client_lock:
                 if self.client is None:
                     try:
-                        self.client = QdrantClient(
+                        # 客户端创建和集合检查均为阻塞网络调用，放到线程中执行
+                        self.client = await asyncio.to_thread(
+                            QdrantClient,
                             host=settings.qdrant_host,
                             port=settings.qdrant_port,
                             timeout=30
                         )
                         
                         # 创建集合
-                        await self._create_collection()
+                        await asyncio.to_thread(self._create_collection_sync)
                         logger.info("Qdrant客户端初始化完成")
                         
                     except Exception as e:
                         logger.error(f"Qdrant初始化失败: {str(e)}")
                         raise
     
-    async def _create_collection(self):
+    def _create_collection_sync(self):
         """创建向量集合"""
         try:
             # 检查集合是否存在
@@ -58,6 +75,9 @@ class VectorService:
                     vectors_config=VectorParams(
                         size=settings.embedding_dimension,
                         distance=Distance.COSINE
+                    ),
+                    quantization_config=(
+                        _QUANTIZATION_CONFIG if settings.vector_quantization_enabled else None
                     )
                 )
                 logger.info(f"创建向量集合: {self.collection_name}")
@@ -81,17 +101,17 @@ class VectorService:
                 
                 point = PointStruct(
                     id=str(chunk.id),
-                    vector=chunk.embedding,
+                    vector=chunk.embedding.tolist(),
                     payload={
                         "document_id": str(chunk.document_id),
                         "content": chunk.content,
-                        "content_length": chunk.content_length,
-                        "chunk_index": chunk.metadata.chunk_index,
-                        "total_chunks": chunk.metadata.total_chunks,
-                        "page_number": chunk.metadata.page_number,
-                        "section_title": chunk.metadata.section_title,
-                        "language": chunk.metadata.language,
-                        "confidence_score": chunk.metadata.confidence_score,
+                        "content_length": len(chunk.content),
+                        "chunk_index": chunk.metadata.get("chunk_index"),
+                        "total_chunks": chunk.metadata.get("total_chunks"),
+                        "page_number": chunk.metadata.get("page_number"),
+                        "section_title": chunk.metadata.get("section_title"),
+                        "language": chunk.metadata.get("language"),
+                        "confidence_score": chunk.metadata.get("confidence_score"),
                         "created_at": chunk.created_at.isoformat()
                     }
                 )
@@ -142,6 +162,9 @@ class VectorService:
                 query_filter=query_filter,
                 limit=limit,
                 score_threshold=score_threshold,
+                search_params=(
+                    _QUANTIZED_SEARCH_PARAMS if settings.vector_quantization_enabled else None
+                ),
                 with_payload=True,
                 with_vectors=False
             )
@@ -199,17 +222,17 @@ class VectorService:
             
             point = PointStruct(
                 id=str(chunk.id),
-                vector=chunk.embedding,
+                vector=chunk.embedding.tolist(),
                 payload={
                     "document_id": str(chunk.document_id),
                     "content": chunk.content,
-                    "content_length": chunk.content_length,
-                    "chunk_index": chunk.metadata.chunk_index,
-                    "total_chunks": chunk.metadata.total_chunks,
-                    "page_number": chunk.metadata.page_number,
-                    "section_title": chunk.metadata.section_title,
-                    "language": chunk.metadata.language,
-                    "confidence_score": chunk.metadata.confidence_score,
+                    "content_length": len(chunk.content),
+                    "chunk_index": chunk.metadata.get("chunk_index"),
+                    "total_chunks": chunk.metadata.get("total_chunks"),
+                    "page_number": chunk.metadata.get("page_number"),
+                    "section_title": chunk.metadata.get("section_title"),
+                    "language": chunk.metadata.get("language"),
+                    "confidence_score": chunk.metadata.get("confidence_score"),
                     "created_at": chunk.created_at.isoformat()
                 }
             )
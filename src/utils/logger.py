@@ -2,13 +2,19 @@
 Structured logging configuration for the Kimi Knowledge Base system.
 """
 import logging
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 from typing import Any, Dict, Optional
 import structlog
 from structlog.stdlib import LoggerFactory
 from src.config.settings import settings
 
+# Background listener that drains the log queue into the real handlers
+_queue_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
 
 def setup_logging() -> None:
     """Configure structured logging for the application."""
@@ -37,12 +43,9 @@ def setup_logging() -> None:
         cache_logger_on_first_use=True,
     )
     
-    # Configure standard library logging
-    logging.basicConfig(
-        format="%(message)s",
-        stream=sys.stdout,
-        level=getattr(logging, settings.log_level.upper()),
-    )
+    # Console handler
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(logging.Formatter("%(message)s"))
     
     # File handler for persistent logging
     file_handler = logging.FileHandler(log_dir / "app.log")
@@ -57,10 +60,40 @@ def setup_logging() -> None:
     error_handler.setLevel(logging.ERROR)
     error_handler.setFormatter(file_formatter)
     
-    # Add handlers to root logger
+    # Replace any previous queue setup so repeated calls don't stack handlers
+    shutdown_logging()
+    
+    # The request path only enqueues records; a background thread does the I/O
+    global _queue_listener, _queue_handler
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _queue_handler = QueueHandler(log_queue)
+    _queue_listener = QueueListener(
+        log_queue,
+        console_handler,
+        file_handler,
+        error_handler,
+        respect_handler_level=True
+    )
+    
     root_logger = logging.getLogger()
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(error_handler)
+    root_logger.setLevel(getattr(logging, settings.log_level.upper()))
+    root_logger.addHandler(_queue_handler)
+    _queue_listener.start()
+
+
+def shutdown_logging() -> None:
+    """Stop the background log listener, flushing any queued records."""
+    global _queue_listener, _queue_handler
+    
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        for handler in _queue_listener.handlers:
+            handler.close()
+        _queue_listener = None
+    
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
 
 
 def get_logger(name: str) -> structlog.stdlib.BoundLogger:
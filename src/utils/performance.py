@@ -3,6 +3,8 @@
 import time
 import asyncio
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, Any, Optional, Callable
 from functools import wraps
 from contextlib import asynccontextmanager
@@ -12,6 +14,27 @@ import threading
 
 logger = logging.getLogger(__name__)
 
+# 进程池的启动方式：在多线程进程中fork会复制其他线程持有的锁（日志、jieba等），
+# 子进程可能因此死锁；优先使用forkserver，平台不支持时（Windows）使用spawn
+PROCESS_START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+def create_process_pool(
+    max_workers: Optional[int] = None,
+    initializer: Optional[Callable[[], None]] = None
+) -> ProcessPoolExecutor:
+    """创建不通过fork启动子进程的进程池
+
+    子进程在首次提交任务时才启动，之后常驻复用，由创建方负责关闭。
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context(PROCESS_START_METHOD),
+        initializer=initializer
+    )
+
 
 @dataclass
 class PerformanceMetrics:
@@ -47,4 +47,65 @@ def test_404_endpoint(client):
     """Test non-existent endpoint returns 404."""
     response = client.get("/nonexistent")
     
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+def test_security_headers_added(client):
+    """Test that the API middleware injects security and timing headers."""
+    response = client.get("/")
+    
+    assert response.headers["x-content-type-options"] == "nosniff"
+    assert response.headers["x-frame-options"] == "DENY"
+    assert response.headers["x-api-version"] == "1.0"
+    assert "x-process-time" in response.headers
+
+
+def test_search_request_limit_bounds():
+    """Test that the search limit is bounded."""
+    from pydantic import ValidationError
+    from src.api.routes import SearchRequest
+
+    assert SearchRequest(query="test").limit == 10
+    for limit in (0, -5, 101):
+        with pytest.raises(ValidationError):
+            SearchRequest(query="test", limit=limit)
+
+
+def test_rate_limited_response_has_headers(client, monkeypatch):
+    """Test that 429 responses carry the same headers as normal responses."""
+    import time
+    from collections import deque
+    from src.api import middleware
+
+    full_window = deque([time.time()] * middleware.RATE_LIMIT_MAX_REQUESTS)
+    monkeypatch.setitem(middleware._rate_limit_requests, "testclient", full_window)
+    response = client.get("/")
+    
+    assert response.status_code == 429
+    assert "x-request-id" in response.headers
+    assert "x-process-time" in response.headers
+    assert response.headers["x-api-version"] == "1.0"
+    assert response.headers["x-content-type-options"] == "nosniff"
+
+
+def test_unhandled_error_response_has_headers():
+    """Test that 500 responses for unhandled errors carry the middleware headers."""
+    from fastapi import FastAPI
+    from src.api.middleware import APIMiddleware
+
+    error_app = FastAPI()
+    error_app.add_middleware(APIMiddleware)
+
+    @error_app.get("/boom")
+    async def boom():
+        raise RuntimeError("boom")
+
+    response = TestClient(error_app, raise_server_exceptions=False).get(
+        "/boom", headers={"X-Request-ID": "req-500"}
+    )
+    
+    assert response.status_code == 500
+    assert response.headers["x-request-id"] == "req-500"
+    assert response.json()["request_id"] == "req-500"
+    assert "x-process-time" in response.headers
+    assert response.headers["x-api-version"] == "1.0"
+    assert response.headers["x-content-type-options"] == "nosniff"
@@ -3,6 +3,7 @@
 Unit tests for data models
 """
 
+import numpy as np
 import pytest
 from datetime import datetime, timedelta, timezone
 from typing import Dict, Any
@@ -35,6 +36,10 @@ class TestBaseDataModel:
         original_time = model.updated_at
         model.update_timestamp()
         assert model.updated_at > original_time
+        
+        ts = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        model.update_timestamp(ts)
+        assert model.updated_at == ts
     
     def test_id_validation(self):
         """测试ID验证"""
@@ -42,6 +47,16 @@ class TestBaseDataModel:
             BaseDataModel(id="")
         with pytest.raises(ValueError):
             BaseDataModel(id="   ")
+    
+    def test_bulk_create(self):
+        """测试批量创建"""
+        models = BaseDataModel.bulk_create([{}, {}, {"id": "fixed"}])
+        assert len(models) == 3
+        assert models[0].id != models[1].id
+        assert models[2].id == "fixed"
+        assert models[0].created_at == models[1].created_at
+        assert models[0].created_at == models[0].updated_at
+        assert BaseDataModel.bulk_create([]) == []
 
 
 class TestDocument:
@@ -177,6 +192,19 @@ class TestTextChunk:
         chunk.set_embedding(embedding)
         assert chunk.has_embedding()
         assert len(chunk.embedding) == 768
+        
+        # float32数组直接持有，不复制；不支持的维度被拒绝
+        arr = np.zeros(384, dtype=np.float32)
+        chunk.set_embedding(arr)
+        assert chunk.embedding is arr
+        with pytest.raises(ValueError):
+            chunk.set_embedding([0.1] * 100)
+        
+        # 批量设置时每个文本块持有矩阵行的视图
+        matrix = np.ones((2, 384), dtype=np.float32)
+        chunks = [chunk, chunk.model_copy()]
+        TextChunk.set_embeddings(chunks, matrix)
+        assert all(np.shares_memory(c.embedding, matrix) for c in chunks)
     
     def test_similarity_calculation(self):
         """测试相似度计算"""
@@ -224,6 +252,15 @@ class TestEntity:
         entity.add_mention(mention)
         assert len(entity.mentions) == 1
         assert entity.get_mention_count() == 1
+        
+        # 相同位置的提及只记录一次
+        entity.add_mention(mention.model_copy(update={"confidence": 0.5}))
+        assert entity.get_mention_count() == 1
+        
+        # 从可信数据重建时同样维护去重索引
+        restored = Entity.construct_trusted(**dict(entity))
+        restored.add_mention(mention)
+        assert restored.get_mention_count() == 1
     
     def test_alias_operations(self):
         """测试别名操作"""
@@ -234,6 +271,36 @@ class TestEntity:
         
         entity.add_alias("张三")  # 不应该添加与名称相同的别名
         assert "张三" not in entity.aliases
+    
+    def test_knowledge_graph_relations(self):
+        """测试知识图谱关系索引"""
+        graph = KnowledgeGraph()
+        a = Entity(name="张三", entity_type=EntityType.PERSON)
+        b = Entity(name="李四", entity_type=EntityType.PERSON)
+        c = Entity(name="王五", entity_type=EntityType.PERSON)
+        for entity in (a, b, c):
+            graph.add_entity(entity)
+        
+        graph.add_relation(Relation(
+            source_entity_id=a.id, target_entity_id=b.id,
+            relation_type="colleague_of", confidence=0.9
+        ))
+        graph.add_relation(Relation(
+            source_entity_id=c.id, target_entity_id=a.id,
+            relation_type="related_to", confidence=0.8
+        ))
+        
+        assert len(graph.get_entity_relations(a.id)) == 2
+        assert set(graph.get_related_entities(a.id)) == {b.id, c.id}
+        assert len(graph.filter_relations(0.85)) == 1
+        sources, targets, confidences = graph.get_relation_arrays()
+        assert graph.get_entity_id_by_code(int(sources[0])) == a.id
+        assert graph.get_entity_id_by_code(int(targets[1])) == a.id
+        
+        graph.remove_entity(b.id)
+        assert graph.get_relation_count() == 1
+        assert graph.get_related_entities(a.id) == [c.id]
+        assert graph.get_entity_relations(b.id) == []
 
 
 class TestSearchModels:
@@ -249,6 +316,18 @@ class TestSearchModels:
         )
         assert result.chunk_id == "chunk1"
         assert result.score == 0.85
+        
+        # 搜索结果创建后不可修改，且拒绝额外字段
+        with pytest.raises(ValueError):
+            result.score = 0.5
+        with pytest.raises(ValueError):
+            SearchResult(
+                chunk_id="chunk1",
+                document_id="doc1",
+                content="测试内容",
+                score=0.85,
+                unknown_field=1
+            )
     
     def test_search_query_validation(self):
         """测试搜索查询验证"""
@@ -320,6 +399,14 @@ class TestConversationModels:
         conv.add_message(message)
         assert conv.get_message_count() == 1
         assert conv.get_last_message() == message
+        
+        for doc_id in ("doc1", "doc2", "doc3"):
+            conv.add_context_document(doc_id)
+        conv.add_context_document("doc1")
+        conv.remove_context_document("doc1")
+        assert sorted(conv.context_documents) == ["doc2", "doc3"]
+        conv.remove_context_document("doc3")
+        assert conv.context_documents == ["doc2"]
     
     def test_conversation_title_generation(self):
         """测试对话标题生成"""
@@ -334,6 +421,28 @@ class TestConversationModels:
         conv.add_message(message)
         title = conv.generate_title()
         assert len(title) <= 33  # 30个字符 + "..."
+    
+    def test_conversation_many_messages(self):
+        """测试大量添加消息时下标增量维护"""
+        import time
+        
+        conv = Conversation()
+        start = time.perf_counter()
+        for i in range(4000):
+            conv.add_message(Message(
+                conversation_id=conv.id,
+                role="user" if i % 2 == 0 else "assistant",
+                content=f"消息{i}"
+            ))
+        elapsed = time.perf_counter() - start
+        
+        assert conv.get_message_count() == 4000
+        assert len(conv.get_user_messages()) == 2000
+        assert len(conv.get_assistant_messages()) == 2000
+        assert conv.get_recent_messages(2)[-1].content == "消息3999"
+        assert conv.last_activity == conv.updated_at
+        # 每次添加都重建下标时为O(n²)，耗时在十秒以上
+        assert elapsed < 5.0
 
 
 class TestCacheModels:
@@ -348,6 +457,8 @@ class TestCacheModels:
         )
         assert entry.key == "test_key"
         assert entry.ttl == 3600
+        assert entry.value == {"data": "test"}
+        assert entry.size_bytes == len(entry.value_packed)
         assert not entry.is_expired()
     
     def test_cache_entry_expiration(self):
@@ -377,6 +488,22 @@ class TestCacheModels:
         )
         assert cache.query_hash == "a" * 64
         assert cache.hit_count == 0
+        
+        with pytest.raises(ValueError):
+            QueryCache(query_hash="g" * 64, query_text="test query", response=response)
+    
+    def test_query_cache_document_validity(self):
+        """测试查询缓存的文档集合比较"""
+        response = QAResponse(question="test", answer="test answer")
+        cache = QueryCache(
+            query_hash="a" * 64,
+            query_text="test query",
+            response=response,
+            document_ids=["doc1", "doc2"]
+        )
+        assert cache.is_valid_for_documents(["doc2", "doc1"])
+        assert cache.is_valid_for_documents(frozenset({"doc1", "doc2"}))
+        assert not cache.is_valid_for_documents(["doc1"])
     
     def test_cache_stats_operations(self):
         """测试缓存统计操作"""
@@ -388,6 +515,10 @@ class TestCacheModels:
         assert stats.hit_count == 1
         assert stats.miss_count == 1
         assert abs(stats.get_hit_rate() - 0.5) < 1e-6
+        
+        original_time = stats.updated_at
+        assert stats.snapshot() is stats
+        assert stats.updated_at >= original_time
     
     def test_cache_config_validation(self):
         """测试缓存配置验证"""
@@ -0,0 +1,239 @@
+"""
+Tests for service-layer integration.
+"""
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.models.document import DocumentInfo
+from src.services.bm25_service import BM25Service, SparseBM25
+from src.services.document_service import DocumentService
+
+
+def test_split_text_chunks_indexed_by_bm25(tmp_path):
+    """Test that split_text output can be added to the BM25 index."""
+    doc_info = DocumentInfo(
+        filename="notes.txt",
+        original_filename="notes.txt",
+        file_size=0,
+        mime_type="text/plain"
+    )
+    content = " ".join(f"knowledge base word{i}" for i in range(400))
+
+    # split_text only depends on settings; skip model and vector store setup
+    document_service = DocumentService.__new__(DocumentService)
+    chunks = asyncio.run(document_service.split_text(content, doc_info))
+    assert chunks
+
+    bm25_service = BM25Service()
+    bm25_service.index_dir = tmp_path
+    bm25_service.manifest_file = tmp_path / "manifest.json"
+    asyncio.run(bm25_service.add_documents(chunks))
+
+    assert len(bm25_service.documents) == len(chunks)
+    first = bm25_service.documents[0]
+    assert first["document_id"] == str(doc_info.id)
+    assert first["metadata"]["chunk_index"] == 0
+    assert first["metadata"]["language"] == "zh"
+
+
+def test_sparse_bm25_incremental_matches_rebuild():
+    """Test that incremental add/remove scores equal a full rebuild."""
+    docs = [["a", "b"], ["a", "c"], ["a", "d", "e", "f"], ["a", "k"]]
+    extra = [["b", "g", "g"], ["a", "d"]]
+    queries = [["a", "b"], ["d"], ["g", "g", "k"], ["missing"]]
+
+    index = SparseBM25.from_tokenized(docs[:2])
+    index = index.append_documents(docs[2:])
+    index = index.keep_documents(np.array([True, True, False, True]))
+    index = index.append_documents(extra)
+    remaining = [docs[0], docs[1], docs[3]] + extra
+    rebuilt = SparseBM25.from_tokenized(remaining)
+
+    # 删除后不再出现的词项被移出词表
+    assert set(index.vocab) == set(rebuilt.vocab)
+    for query in queries:
+        np.testing.assert_allclose(index.get_scores(query), rebuilt.get_scores(query))
+
+
+BM25_CORPUS = [
+    ["knowledge", "base", "search"],
+    ["knowledge", "graph", "graph", "entity"],
+    ["vector", "search", "knowledge"],
+    ["knowledge", "base", "document", "upload", "document"],
+    ["answer", "knowledge", "question"],
+]
+
+
+@pytest.mark.parametrize("query", [
+    ["knowledge"],                      # 出现在所有文档中，IDF为负
+    ["search", "base"],
+    ["graph", "graph", "entity"],       # 重复的查询词
+    ["knowledge", "knowledge", "upload"],
+    ["missing", "vector"],
+])
+def test_sparse_bm25_matches_bm25okapi(query):
+    """Test that SparseBM25 scores equal rank_bm25.BM25Okapi."""
+    rank_bm25 = pytest.importorskip("rank_bm25")
+
+    expected = rank_bm25.BM25Okapi(BM25_CORPUS).get_scores(query)
+    actual = SparseBM25.from_tokenized(BM25_CORPUS).get_scores(query)
+    np.testing.assert_allclose(actual, expected)
+
+
+@pytest.mark.parametrize("compute_weights", [False, True])
+def test_sparse_bm25_arrays_round_trip(tmp_path, compute_weights):
+    """Test that to_arrays/from_arrays round-trips through np.save and mmap np.load."""
+    index = SparseBM25.from_tokenized(BM25_CORPUS)
+    query = ["knowledge", "document", "graph"]
+    if compute_weights:
+        index.get_scores(query)
+
+    arrays = index.to_arrays()
+    for name, array in arrays.items():
+        np.save(tmp_path / f"{name}.npy", array)
+    loaded_arrays = {
+        name: np.load(tmp_path / f"{name}.npy", mmap_mode="r", allow_pickle=False)
+        for name in arrays
+    }
+    loaded = SparseBM25.from_arrays(loaded_arrays, index.get_params())
+
+    assert loaded.vocab == index.vocab
+    np.testing.assert_allclose(loaded.get_scores(query), index.get_scores(query))
+    assert loaded.get_matched_terms(np.array([1, 3]), query) == [["knowledge", "graph"], ["knowledge", "document"]]
+
+
+@pytest.fixture
+def cache_service(tmp_path, monkeypatch):
+    """Cache service backed by a temporary SQLite file."""
+    from src.services import cache_service as cache_module
+
+    monkeypatch.setattr(cache_module.settings, "cache_db_path", str(tmp_path / "cache.db"))
+    return cache_module.CacheService()
+
+
+def _qa_response(question: str):
+    from src.models.search import QAResponse
+
+    return QAResponse(question=question, answer=f"answer to {question}")
+
+
+def _query_db(service, sql: str):
+    import sqlite3
+    from contextlib import closing
+
+    with closing(sqlite3.connect(service.db_path)) as conn:
+        rows = conn.execute(sql).fetchall()
+        conn.commit()
+        return rows
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_served_from_memory(cache_service):
+    """Test that a cached result is served from the in-process tier."""
+    try:
+        assert await cache_service.cache_result("q1", _qa_response("q1"), ["d1"])
+        # 删除SQLite中的条目后仍能命中，说明结果来自进程内缓存层
+        _query_db(cache_service, "DELETE FROM query_cache")
+
+        response = await cache_service.get_cached_result("q1", ["d1"])
+        assert response is not None
+        assert response.cached
+        assert response.answer == "answer to q1"
+    finally:
+        await cache_service.close()
+
+
+@pytest.mark.asyncio
+async def test_cache_invalidation_drops_matching_entries(cache_service):
+    """Test that invalidating a document drops only the entries referencing it."""
+    try:
+        await cache_service.cache_result("q1", _qa_response("q1"), ["d1"])
+        await cache_service.cache_result("q2", _qa_response("q2"), ["d2"])
+
+        assert await cache_service.invalidate_cache("d1")
+
+        assert await cache_service.get_cached_result("q1", ["d1"]) is None
+        assert await cache_service.get_cached_result("q2", ["d2"]) is not None
+        assert _query_db(cache_service, "SELECT document_id FROM query_cache_docs") == [("d2",)]
+    finally:
+        await cache_service.close()
+
+
+@pytest.mark.asyncio
+async def test_cache_fill_racing_invalidation_is_skipped(cache_service):
+    """Test that a memory fill started before an invalidation is discarded."""
+    try:
+        await cache_service.cache_result("q1", _qa_response("q1"), ["d1"])
+        cache_service._memory.clear()
+        query_hash = cache_service._generate_query_hash("q1", ["d1"])
+
+        original_run_read = cache_service._run_read
+
+        async def racing_read(func):
+            row = await original_run_read(func)
+            # SQLite读取完成后、回填进程内缓存层之前发生一次失效
+            await cache_service.invalidate_cache("other")
+            return row
+
+        cache_service._run_read = racing_read
+        assert await cache_service.get_cached_result("q1", ["d1"]) is not None
+        assert query_hash not in cache_service._memory
+    finally:
+        await cache_service.close()
+
+
+@pytest.mark.asyncio
+async def test_cache_stats_flushed_in_batches(cache_service):
+    """Test that hit/miss counters are accumulated and written in one flush."""
+    try:
+        for i in range(3):
+            assert await cache_service.get_cached_result(f"missing{i}") is None
+        assert _query_db(cache_service, "SELECT miss_count FROM cache_stats") == [(0,)]
+
+        await cache_service.flush_stats()
+        assert _query_db(cache_service, "SELECT miss_count FROM cache_stats") == [(3,)]
+    finally:
+        await cache_service.close()
+
+
+@pytest.mark.asyncio
+async def test_cache_close_drains_pending_writes(cache_service):
+    """Test that close() waits for in-flight writes and flushes pending stats."""
+    await cache_service.initialize()
+    assert await cache_service.get_cached_result("missing") is None
+    write = asyncio.create_task(cache_service.cache_result("q1", _qa_response("q1")))
+    await asyncio.sleep(0)
+
+    await cache_service.close()
+
+    assert write.done() and write.result() is True
+    assert _query_db(cache_service, "SELECT query_text FROM query_cache") == [("q1",)]
+    assert _query_db(cache_service, "SELECT miss_count FROM cache_stats") == [(1,)]
+    # 关闭后不再接受新的数据库操作
+    assert await cache_service.cache_result("q2", _qa_response("q2")) is False
+
+
+@pytest.mark.asyncio
+async def test_cache_schema_upgrade_recreates_tables(cache_service):
+    """Test that an older cache schema is dropped and recreated at the current version."""
+    from src.services.cache_service import CACHE_SCHEMA_VERSION
+
+    _query_db(cache_service, "PRAGMA user_version = 4")
+    _query_db(cache_service, """
+        CREATE TABLE query_cache (
+            query_hash TEXT PRIMARY KEY, query_text TEXT, response_data BLOB, document_ids TEXT
+        )
+    """)
+    _query_db(cache_service, "INSERT INTO query_cache VALUES ('h', 'old', x'00', '[]')")
+    try:
+        await cache_service.initialize()
+
+        columns = [row[1] for row in _query_db(cache_service, "PRAGMA table_info(query_cache)")]
+        assert "document_ids" not in columns
+        assert "expires_at" in columns
+        assert _query_db(cache_service, "SELECT COUNT(*) FROM query_cache") == [(0,)]
+        assert _query_db(cache_service, "PRAGMA user_version") == [(CACHE_SCHEMA_VERSION,)]
+    finally:
+        await cache_service.close()